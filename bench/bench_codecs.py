@@ -0,0 +1,62 @@
+"""
+Benchmark for the gradebook model codecs (see src/gradebook.py)
+Licensed under the Unlicense (P.D.)
+2026-10-16
+
+Run with `python3 bench/bench_codecs.py`. This compares the hand written
+`from_dict` / `to_dict` codecs against `dacite.from_dict` / `dataclasses.asdict` on
+a 2,000 assignment gradebook, and checks that both give the same JSON. dacite is no
+longer a requirement, so its half is skipped if it isn't installed.
+"""
+
+### Setup ###
+from dataclasses import asdict
+from json import dumps
+from timeit import timeit
+from sample_gradebook import sample_gradebook
+
+# pylint:disable=wrong-import-order
+from gradebook import GradebookInformation
+
+try:
+    from dacite import from_dict as dataclass_from_dict
+except ImportError:
+    dataclass_from_dict = None
+
+ROUNDS: int = 20
+
+
+def _report(name: str, seconds: float):
+    print(f"{name:>24}: {seconds / ROUNDS * 1000:7.2f} ms")
+
+
+def main():
+    """Run the benchmark"""
+
+    gradebook: GradebookInformation = sample_gradebook(assignment_count=2000)
+    gradebook_dict: dict = gradebook.to_dict()
+    assert dumps(gradebook_dict) == dumps(asdict(gradebook)), "Codecs differ"
+    assert GradebookInformation.from_dict(gradebook_dict) == gradebook
+
+    _report("to_dict", timeit(gradebook.to_dict, number=ROUNDS))
+    _report("asdict", timeit(lambda: asdict(gradebook), number=ROUNDS))
+    _report(
+        "from_dict",
+        timeit(lambda: GradebookInformation.from_dict(gradebook_dict), number=ROUNDS),
+    )
+    if dataclass_from_dict is None:
+        print("dacite is not installed, skipping dacite.from_dict")
+        return
+    _report(
+        "dacite.from_dict",
+        timeit(
+            lambda: dataclass_from_dict(
+                data_class=GradebookInformation, data=gradebook_dict
+            ),
+            number=ROUNDS,
+        ),
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+"""
+Benchmark for the compression of the versioning store (see src/compression.py)
+Licensed under the Unlicense (P.D.)
+2026-10-16
+
+Run with `python3 bench/bench_compression.py`. For every codec, this prints the bytes
+stored for a snapshot and a versioning item, and the time to save (serialize,
+compress, and encrypt) and load (decrypt, decompress, and parse) a snapshot.
+"""
+
+### Setup ###
+from json import dumps, loads
+from timeit import timeit
+from cryptography.fernet import Fernet
+from sample_gradebook import sample_gradebook
+
+# pylint:disable=wrong-import-order
+from compression import Codec, compress, decompress
+from versioning import VersioningCourseItem, VersioningItem
+
+ROUNDS: int = 20
+
+
+def main():
+    """Run the benchmark"""
+
+    fernet: Fernet = Fernet(Fernet.generate_key())
+    gradebook = sample_gradebook()
+    versioning_item: VersioningItem = VersioningItem(
+        courses=[
+            VersioningCourseItem(course.name, course.grade)
+            for course in gradebook.courses
+        ],
+        timestamp=gradebook.last_updated,
+        content_hash=gradebook.content_hash(),
+    )
+    snapshot: bytes = bytes(dumps(gradebook.to_dict()), "utf-8")
+    item: bytes = bytes(dumps(versioning_item.to_dict()), "utf-8")
+    print(f"Plain JSON: snapshot {len(snapshot):>9} B, item {len(item):>5} B")
+
+    for name, codec in Codec.NAMES.items():
+        stored_snapshot: bytes = fernet.encrypt(compress(snapshot, codec))
+        stored_item: bytes = fernet.encrypt(compress(item, codec))
+        save_time: float = timeit(
+            lambda codec=codec: fernet.encrypt(
+                compress(bytes(dumps(gradebook.to_dict()), "utf-8"), codec)
+            ),
+            number=ROUNDS,
+        )
+        load_time: float = timeit(
+            lambda stored=stored_snapshot: loads(decompress(fernet.decrypt(stored))),
+            number=ROUNDS,
+        )
+        print(
+            f"{name:>10}: snapshot {len(stored_snapshot):>9} B, "
+            f"item {len(stored_item):>5} B, "
+            f"save {save_time / ROUNDS * 1000:7.2f} ms, "
+            f"load {load_time / ROUNDS * 1000:7.2f} ms"
+        )
+
+
+if __name__ == "__main__":
+    main()
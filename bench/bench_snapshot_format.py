@@ -0,0 +1,46 @@
+"""
+Benchmark for the binary snapshot format (see src/snapshot_format.py)
+Licensed under the Unlicense (P.D.)
+2026-10-16
+
+Run with `python3 bench/bench_snapshot_format.py`. This compares the size of a
+2,000 assignment snapshot as JSON and in the binary format (before and after
+compression), and the time to encode and decode it.
+"""
+
+### Setup ###
+from json import dumps, loads
+from timeit import timeit
+from sample_gradebook import sample_gradebook
+
+# pylint:disable=wrong-import-order
+from compression import compress
+from snapshot_format import encode, decode
+
+ROUNDS: int = 20
+
+
+def main():
+    """Run the benchmark"""
+
+    gradebook_dict: dict = sample_gradebook(assignment_count=2000).to_dict()
+    formats: dict = {
+        "JSON": (lambda: bytes(dumps(gradebook_dict), "utf-8"), loads),
+        "binary": (lambda: encode(gradebook_dict), decode),
+    }
+    for name, (encoder, decoder) in formats.items():
+        stored: bytes = encoder()
+        assert decoder(stored) == gradebook_dict
+        encode_time: float = timeit(encoder, number=ROUNDS)
+        decode_time: float = timeit(
+            lambda decoder=decoder, stored=stored: decoder(stored), number=ROUNDS
+        )
+        print(
+            f"{name:>8}: {len(stored):>7} B ({len(compress(stored)):>6} B compressed), "
+            f"encode {encode_time / ROUNDS * 1000:6.2f} ms, "
+            f"decode {decode_time / ROUNDS * 1000:6.2f} ms"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,57 @@
+"""
+Sample gradebooks for the StudentVue Data Viewer benchmarks
+Licensed under the Unlicense (P.D.)
+2026-10-16
+"""
+
+### Setup ###
+import sys
+from pathlib import Path
+from random import Random
+
+# The benchmarks import the modules in src/ the same way they import each other
+sys.path.insert(0, str(Path(__file__).parent.parent / "src"))
+
+# pylint:disable=wrong-import-position
+from gradebook import Assignment, Course, GradebookInformation
+
+WEIGHTS: list[str] = ["Homework", "Classwork", "Assessment", "Final Exam", "Quiz"]
+
+
+def sample_gradebook(
+    course_count: int = 8, assignment_count: int = 2000, seed: int = 0
+) -> GradebookInformation:
+    """Return a made up gradebook with assignments spread over the courses"""
+
+    random: Random = Random(seed)
+    courses: list[Course] = []
+    for course_idx in range(course_count):
+        assignments: list[Assignment] = []
+        for assignment_idx in range(assignment_count // course_count):
+            possible: int = random.choice((1, 5, 10, 20, 100))
+            earned: float = round(random.uniform(0, possible), 2)
+            month, day = random.randint(1, 12), random.randint(1, 28)
+            assignments.append(
+                Assignment(
+                    name=f"Assignment {assignment_idx} of unit {assignment_idx // 10}",
+                    assigned_date=f"{month}/{day}/2023",
+                    due_date=f"{month}/{min(day + 2, 28)}/2023",
+                    weight=random.choice(WEIGHTS),
+                    grade=str(round(earned / possible * 100)),
+                    points=f"{earned:.2f} / {possible:.4f}",
+                    earned=earned,
+                    possible=float(possible),
+                )
+            )
+        courses.append(
+            Course(
+                name=f"Course number {course_idx}",
+                grade=random.randint(50, 100),
+                teacher=f"Teacher {course_idx}",
+                period=course_idx + 1,
+                assignments=assignments,
+                room=str(100 + course_idx),
+                weights={weight: 1 / len(WEIGHTS) for weight in WEIGHTS},
+            )
+        )
+    return GradebookInformation(last_updated=1690000000, courses=courses)
@@ -0,0 +1,103 @@
+"""
+Caching for StudentVue Data Viewer
+Licensed under the Unlicense (P.D.)
+2026-10-16
+"""
+
+### Setup ###
+from collections import OrderedDict
+from dataclasses import dataclass
+from threading import Lock
+from time import monotonic
+from typing import Any, Callable, Hashable
+
+
+### Dataclasses ###
+@dataclass
+class CacheStats:
+    """Counters for a :class:`LRUCache`"""
+
+    hits: int
+    misses: int
+    size: int
+    max_size: int
+
+
+### Cache ###
+class LRUCache:
+    """A bounded, thread-safe least-recently-used cache.
+
+    Entries older than `ttl` seconds (if given) are treated as missing and dropped
+    when they are next looked up. A `max_size` of 0 disables the cache entirely.
+    """
+
+    def __init__(self, max_size: int, ttl: float | None = None):
+        self.max_size: int = max_size
+        self.ttl: float | None = ttl
+        self.hits: int = 0
+        self.misses: int = 0
+        self._entries: OrderedDict[Hashable, tuple[float, Any]] = OrderedDict()
+        self._lock: Lock = Lock()
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """Return the value for a key (marking it as recently used), or the default"""
+
+        with self._lock:
+            entry: tuple[float, Any] | None = self._entries.get(key)
+            if entry is not None and self._is_expired(entry[0]):
+                del self._entries[key]
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return default
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, key: Hashable, value: Any):
+        """Insert or replace a value, evicting the least recently used entries"""
+
+        if self.max_size <= 0:
+            return
+
+        with self._lock:
+            self._entries[key] = (monotonic(), value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def discard(self, key: Hashable):
+        """Remove a key if it is present"""
+
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def discard_matching(self, predicate: Callable[[Hashable], bool]):
+        """Remove every key the predicate returns true for"""
+
+        with self._lock:
+            for key in [key for key in self._entries if predicate(key)]:
+                del self._entries[key]
+
+    def clear(self):
+        """Remove every entry (the counters are kept)"""
+
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> CacheStats:
+        """Return the hit / miss counters"""
+
+        with self._lock:
+            return CacheStats(
+                hits=self.hits,
+                misses=self.misses,
+                size=len(self._entries),
+                max_size=self.max_size,
+            )
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _is_expired(self, inserted_at: float) -> bool:
+        return self.ttl is not None and monotonic() - inserted_at > self.ttl
@@ -13,5 +13,9 @@ ROOT_PATH = Path(__file__).parent.parent
 DEFAULT_CONFIG_PATH = Path(ROOT_PATH / "config.jsonc")
 VERSIONING_PATH = Path(ROOT_PATH / "versioning")
 Logger.log(f"Current working directory: {ROOT_PATH}")
-VERSIONS_FILENAME = "VERSIONS.json"
+VERSIONS_FILENAME = "VERSIONS.json"  # Before the history log, migrated on open
+HISTORY_LOG_FILENAME = "VERSIONS.log"
+HISTORY_INDEX_FILENAME = "VERSIONS.idx"  # Rebuilt from the history log if stale
+GRADE_SERIES_FILENAME = "GRADES.series"
+CHANGES_FILENAME = "CHANGES.json"  # What changed in the newest snapshot
 HASH_FILENAME = "HASH.txt"
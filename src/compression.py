@@ -0,0 +1,71 @@
+"""
+Compression for StudentVue Data Viewer
+Licensed under the Unlicense (P.D.)
+2026-10-16
+"""
+
+### Setup ###
+from lzma import compress as lzma_compress, decompress as lzma_decompress
+from zlib import compressobj, decompressobj, DEFLATED, MAX_WBITS
+
+# Preset dictionary for zlib, made from what a serialized gradebook (and a versioning
+# item and snapshot delta) looks like. zlib favors the end of the dictionary, so the
+# most repeated strings are last. NEVER modify this, make a new version instead, as
+# data compressed with it can only be decompressed with the exact same bytes.
+ZLIB_DICTIONARY_V1: bytes = (
+    b'{"format": "delta", "base": 1690000000, "depth": 1, "delta": '
+    b'{"content_hash": "", "last_seen": null, "timestamp": 1690000000}'
+    b'"UNKNOWN", "Not Graded", "Not Due", "Final Exam", "Assessment", "Classwork", '
+    b'"Homework", "Participation", "Project", "Quiz", "Test", "Lab", "AKS Progress"'
+    b'{"base": 0, "fields": {"grade": 0}, "assignments": [[0, 1], {"course": '
+    b'"room": "101", "weights": {"Homework": 0.2, "Assessment": 0.8}}, '
+    b'{"last_updated": 1690000000, "courses": [{"name": "", "grade": 100, '
+    b'"teacher": "", "period": 1, "assignments": [{"name": "", '
+    b'"assigned_date": "8/9/2022", "due_date": "8/9/2022", "weight": "Homework", '
+    b'"grade": "100", "points": "10.00 / 10.0000"}, {"name": "'
+)
+
+
+### Codecs ###
+class Codec:  # pylint:disable=too-few-public-methods
+    """The header byte of compressed data. Data from before compression was added is
+    JSON, which starts with "{" or "[" and is read as is.
+    """
+
+    NONE: int = 0x00
+    ZLIB: int = 0x01  # With `ZLIB_DICTIONARY_V1`
+    LZMA: int = 0x02
+
+    NAMES: dict[str, int] = {"none": NONE, "zlib": ZLIB, "lzma": LZMA}
+
+
+def compress(data: bytes, codec: int = Codec.ZLIB) -> bytes:
+    """Compress data with a codec, prepending the codec's header byte"""
+
+    if codec == Codec.ZLIB:
+        compressor = compressobj(
+            level=6, method=DEFLATED, wbits=MAX_WBITS, zdict=ZLIB_DICTIONARY_V1
+        )
+        compressed: bytes = compressor.compress(data) + compressor.flush()
+    elif codec == Codec.LZMA:
+        compressed: bytes = lzma_compress(data)
+    else:
+        compressed: bytes = data
+    return bytes((codec,)) + compressed
+
+
+def decompress(data: bytes) -> bytes:
+    """Decompress data made by :func:`compress` (or return uncompressed data as is)"""
+
+    if not data or data[0] in b"{[":
+        return data
+
+    codec, compressed = data[0], data[1:]
+    if codec == Codec.ZLIB:
+        decompressor = decompressobj(wbits=MAX_WBITS, zdict=ZLIB_DICTIONARY_V1)
+        return decompressor.decompress(compressed) + decompressor.flush()
+    if codec == Codec.LZMA:
+        return lzma_decompress(compressed)
+    if codec == Codec.NONE:
+        return compressed
+    raise ValueError(f"Unknown compression codec {codec}")
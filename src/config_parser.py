@@ -64,6 +64,47 @@ def check_config(config: dict) -> bool:
         ), "Encryption master password is not a string"
         assert isinstance(config.get("port"), int), "Port was not an integer"
         assert config["port"] <= 65535, "Port was too high"
+        assert (
+            isinstance(config.get("keyframe_interval", 1), int)
+            and config.get("keyframe_interval", 1) >= 1
+        ), "Keyframe interval (optional) was not a positive integer"
+        assert config.get("compression", "zlib") in (
+            "none",
+            "zlib",
+            "lzma",
+        ), "Compression (optional) was not one of none, zlib, or lzma"
+        assert config.get("state_store", "memory") in (
+            "memory",
+            "sqlite",
+        ), "State store (optional) was not one of memory or sqlite"
+        assert isinstance(
+            config.get("state_store_path", ""), str
+        ), "State store path (optional) was not a string"
+        assert config.get("storage_engine", "directory") in (
+            "directory",
+            "sqlite",
+        ), "Storage engine (optional) was not one of directory or sqlite"
+        assert isinstance(
+            config.get("storage_path", ""), str
+        ), "Storage path (optional) was not a string"
+        assert isinstance(config.get("retention", []), list) and all(
+            isinstance(tier, dict)
+            and isinstance(tier.get("after_days"), int)
+            and tier["after_days"] >= 0
+            and isinstance(tier.get("keep_one_per_days"), int)
+            and tier["keep_one_per_days"] >= 1
+            for tier in config.get("retention", [])
+        ), (
+            "Retention (optional) was not a list of tiers with a non-negative "
+            '"after_days" and positive "keep_one_per_days"'
+        )
+        assert isinstance(
+            config.get("profile_token", ""), str
+        ), "Profile token (optional) was not a string"
+        assert (
+            isinstance(config.get("profile_sample_rate", 0), (int, float))
+            and 0 <= config.get("profile_sample_rate", 0) <= 1
+        ), "Profile sample rate (optional) was not a number from 0 to 1"
     except AssertionError as exc:
         err = exc
     else:
@@ -0,0 +1,106 @@
+"""
+Course grade time series for StudentVue Data Viewer
+Licensed under the Unlicense (P.D.)
+2026-10-16
+"""
+
+### Setup ###
+from array import array
+from bisect import bisect_left
+from dataclasses import dataclass, field
+from struct import Struct
+from sys import byteorder
+
+# Layout, all integers little-endian:
+#   MAGIC, COUNT (number of courses), then each course:
+#   NAME_LENGTH, the UTF-8 name, COUNT (number of points), then the timestamps and
+#   the grades each packed as 8 byte integers
+MAGIC: bytes = b"SSVG\x01"
+COUNT: Struct = Struct("<I")
+NAME_LENGTH: Struct = Struct("<H")
+TYPECODE: str = "q"
+
+
+### Dataclasses ###
+@dataclass(slots=True)
+class GradeSeries:
+    """The grade of a course at every snapshot it is in, oldest first"""
+
+    timestamps: array = field(default_factory=lambda: array(TYPECODE))
+    grades: array = field(default_factory=lambda: array(TYPECODE))
+
+    def put(self, timestamp: int, grade: int):
+        """Add (or replace) the grade at a timestamp, keeping the series sorted"""
+
+        idx: int = bisect_left(self.timestamps, timestamp)
+        if idx < len(self.timestamps) and self.timestamps[idx] == timestamp:
+            self.grades[idx] = grade
+            return
+        self.timestamps.insert(idx, timestamp)
+        self.grades.insert(idx, grade)
+
+    def remove(self, timestamp: int):
+        """Remove the grade at a timestamp, if there is one"""
+
+        idx: int = bisect_left(self.timestamps, timestamp)
+        if idx < len(self.timestamps) and self.timestamps[idx] == timestamp:
+            del self.timestamps[idx]
+            del self.grades[idx]
+
+
+### Encoding ###
+def _pack(values: array) -> bytes:
+    if byteorder == "big":
+        values = array(TYPECODE, values)
+        values.byteswap()
+    return values.tobytes()
+
+
+def _unpack(data: bytes) -> array:
+    values: array = array(TYPECODE)
+    values.frombytes(data)
+    if byteorder == "big":
+        values.byteswap()
+    return values
+
+
+def encode(series: dict[str, GradeSeries]) -> bytes:
+    """Encode the series of every course (by course name)"""
+
+    parts: list[bytes] = [MAGIC, COUNT.pack(len(series))]
+    for name, course_series in series.items():
+        encoded_name: bytes = bytes(name, "utf-8")
+        parts += [
+            NAME_LENGTH.pack(len(encoded_name)),
+            encoded_name,
+            COUNT.pack(len(course_series.timestamps)),
+            _pack(course_series.timestamps),
+            _pack(course_series.grades),
+        ]
+    return b"".join(parts)
+
+
+def decode(data: bytes) -> dict[str, GradeSeries]:
+    """Decode what :func:`encode` made"""
+
+    if not data.startswith(MAGIC):
+        raise ValueError("Not a grade series file")
+
+    series: dict[str, GradeSeries] = {}
+    offset: int = len(MAGIC)
+    (course_count,) = COUNT.unpack_from(data, offset)
+    offset += COUNT.size
+    for _ in range(course_count):
+        (name_length,) = NAME_LENGTH.unpack_from(data, offset)
+        offset += NAME_LENGTH.size
+        name: str = str(data[offset : offset + name_length], "utf-8")
+        offset += name_length
+        (point_count,) = COUNT.unpack_from(data, offset)
+        offset += COUNT.size
+        array_size: int = point_count * array(TYPECODE).itemsize
+        timestamps: array = _unpack(data[offset : offset + array_size])
+        offset += array_size
+        grades: array = _unpack(data[offset : offset + array_size])
+        offset += array_size
+        series[name] = GradeSeries(timestamps, grades)
+    return series
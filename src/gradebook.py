@@ -8,17 +8,30 @@ Licensed under the Unlicense (P.D.)
 from time import time
 from typing import Any, Callable
 from dataclasses import dataclass
-from collections import OrderedDict
-from json import loads, dumps
+from io import BytesIO
+from json import dumps
+from hashlib import sha256
 from html import unescape
+from xml.etree.ElementTree import iterparse, tostring, ParseError
 from studentvue import StudentVue
+from xmljson import BadgerFish
 from common import Logger
+from metrics import FETCH_SECONDS, SAVE_SECONDS, SERIALIZE_SECONDS, UPSTREAM_ERRORS
 from versioning import Versioning
-from tools import FetchGradesException, VersioningAlreadyInitialized
+from snapshot_format import parse_points
+from tools import (
+    FetchGradesException,
+    SerializeGradesException,
+    VersioningAlreadyInitialized,
+)
 
 # Constants (decided against config options for these)
 SENTINEL_UNKNOWN_STR: str = "UNKNOWN"
 SENTINEL_UNKNOWN_INT: int = -100
+# Converts StudentVue's XML into dicts and back without turning values into numbers,
+# so a gradebook from the public API is turned back into the XML it was (see
+# `Gradebook._grab_info`)
+GRADEBOOK_SERIALIZER: BadgerFish = BadgerFish(xml_fromstring=False)
 
 
 ### Auxiliary functions ###
@@ -37,7 +50,35 @@ def _and(maybe_sentinel: Any, not_sentinel: Callable) -> None | Any:
     return not_sentinel(maybe_sentinel)
 
 
-@dataclass
+def _from_xml_string(value: str | None) -> None | bool | int | float | str:
+    """Convert an XML attribute value like StudentVue.py's serializer (xmljson's
+    BadgerFish) does, so that serialized values are the same as they were when
+    gradebooks were read through it.
+    """
+
+    if value is None:
+        return None
+    if value.lower() in ("true", "false"):
+        return value.lower() == "true"
+    try:
+        return int(value)
+    except ValueError:
+        pass
+    try:
+        if float("-inf") < float(value) < float("inf"):
+            return float(value)
+    except ValueError:
+        pass
+    return value
+
+
+# The model classes are slotted and have hand written codecs (`from_dict` and
+# `to_dict`), as there can be thousands of assignments in a gradebook. The codecs
+# must give the same dictionaries as `dataclasses.asdict`, in the same key order,
+# since that is what's stored in the versioning history.
+
+
+@dataclass(slots=True)
 class Assignment:
     """An assignment for a :class:`Course`"""
 
@@ -47,9 +88,40 @@ class Assignment:
     weight: str  # E.g. "Final Exam" (the trailing "*" is stripped)
     grade: str
     points: str  # E.g. "0.39 / 1.0000"
+    earned: None | float  # E.g. 0.39, parsed from the points (None if not graded)
+    possible: None | float  # E.g. 1.0
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "Assignment":
+        """Decode from the serialized form"""
+
+        return cls(
+            data["name"],
+            data["assigned_date"],
+            data["due_date"],
+            data["weight"],
+            data["grade"],
+            data["points"],
+            data["earned"],
+            data["possible"],
+        )
 
+    def to_dict(self) -> dict:
+        """Encode into the serialized form"""
 
-@dataclass
+        return {
+            "name": self.name,
+            "assigned_date": self.assigned_date,
+            "due_date": self.due_date,
+            "weight": self.weight,
+            "grade": self.grade,
+            "points": self.points,
+            "earned": self.earned,
+            "possible": self.possible,
+        }
+
+
+@dataclass(slots=True)
 class Course:
     """A course for :class:`GradebookItem`"""
 
@@ -61,16 +133,45 @@ class Course:
     room: str
     weights: dict[str, float]  # E.g. "Final Exam": 0.10 (the trailing "*" is stripped)
 
+    @classmethod
+    def from_dict(cls, data: dict) -> "Course":
+        """Decode from the serialized form"""
+
+        assignment_from_dict: Callable = Assignment.from_dict
+        return cls(
+            data["name"],
+            data["grade"],
+            data["teacher"],
+            data["period"],
+            [assignment_from_dict(assignment) for assignment in data["assignments"]],
+            data["room"],
+            dict(data["weights"]),
+        )
+
+    def to_dict(self) -> dict:
+        """Encode into the serialized form"""
+
+        return {
+            "name": self.name,
+            "grade": self.grade,
+            "teacher": self.teacher,
+            "period": self.period,
+            "assignments": [assignment.to_dict() for assignment in self.assignments],
+            "room": self.room,
+            "weights": dict(self.weights),
+        }
 
-@dataclass
+
+@dataclass(slots=True)
 class GradebookInformation:
     """Information about a gradebook.
 
     All sentinel values are "UNKNOWN" or `0` for integers.
 
-    Note for maintainers: Changing the spec here would mean versioned / past
-    grades would potentially become invalidated, as the serialized variant is
-    stored there.
+    Note for maintainers: Changing the spec here means the serialized variant
+    stored in the versioning history changes shape. Bump the schema version in
+    `snapshot_format` and add a reader and an upgrade there, so that past grades
+    are still readable.
 
     Example tree:
     GradebookInformation(
@@ -89,6 +190,8 @@ class GradebookInformation:
                         type="AKS Progress*",
                         grade=39,
                         points="0.39 / 1.0000",
+                        earned=0.39,
+                        possible=1.0,
                     )
                 ],
             ),
@@ -99,6 +202,36 @@ class GradebookInformation:
     last_updated: int  # Unix timestamp (seconds)
     courses: list[Course]
 
+    @classmethod
+    def from_dict(cls, data: dict) -> "GradebookInformation":
+        """Decode from the serialized form"""
+
+        return cls(
+            data["last_updated"],
+            [Course.from_dict(course) for course in data["courses"]],
+        )
+
+    def to_dict(self) -> dict:
+        """Encode into the serialized form"""
+
+        return {
+            "last_updated": self.last_updated,
+            "courses": [course.to_dict() for course in self.courses],
+        }
+
+    def content_hash(self) -> str:
+        """Returns a hash of the grades. `last_updated` is not a part of the hash, so
+        two gradebooks fetched at different times with the same grades are equal.
+        """
+
+        courses: list[dict] = [course.to_dict() for course in self.courses]
+        # The points earned and possible are parsed from the points, and are left out
+        # so that hashes stay the same as they were before they were added
+        for course in courses:
+            for assignment in course["assignments"]:
+                del assignment["earned"], assignment["possible"]
+        return sha256(bytes(dumps(courses, sort_keys=True), "utf-8")).hexdigest()
+
 
 class Gradebook:
     """A gradebook for a student. Contains the username, password, and grades for
@@ -106,14 +239,29 @@ class Gradebook:
     """
 
     def __init__(self, username: str, password: str, domain: str) -> None:
-        self.student_vue: StudentVue = StudentVue(username, password, domain)
         self.username: str = username
         self.password: str = password
         self.domain: str = domain
 
         self.versioning: None | Versioning = None
-        self.unserialized_grades: None | dict = None
+        self.unserialized_grades: None | str = None  # Gradebook XML
         self.grades: None | dict = None
+        self._student_vue: None | StudentVue = None  # See `student_vue`
+
+    @property
+    def student_vue(self) -> StudentVue:
+        """The StudentVue client, only made when grades are fetched, as making one
+        downloads StudentVue's WSDL
+        """
+
+        if self._student_vue is None:
+            self._student_vue: StudentVue = StudentVue(
+                self.username,
+                self.password,
+                self.domain,
+                xmljson_serializer=GRADEBOOK_SERIALIZER,
+            )
+        return self._student_vue
 
     def init_versioning(self):
         """Initialize versioning"""
@@ -133,35 +281,49 @@ class Gradebook:
         if self.grades:
             return
 
-        self.unserialized_grades: dict = self._grab_info()
-        self.grades: GradebookInformation = self._serialize()
+        try:
+            with FETCH_SECONDS.time():
+                self.unserialized_grades: str = self._grab_info()
+            with SERIALIZE_SECONDS.time():
+                self.grades: GradebookInformation = self._serialize()
+        except Exception as err:
+            UPSTREAM_ERRORS.inc(type(err).__name__)
+            raise
 
     def save(self) -> None:
         """Save the current grades to a file."""
 
-        self.versioning.path.mkdir(parents=True, exist_ok=True)
-        self.versioning.save()
-
-    def _grab_info(self) -> dict:
-        """Grab and serialize info from StudentVue"""
-
-        info: list[OrderedDict] = self.student_vue.get_gradebook()
+        with SAVE_SECONDS.time():
+            self.versioning.mkdir()
+            self.versioning.save()
 
-        # Convert to list of normal dictionaries (currently is OrderedDict)
-        info = loads(dumps(info))
+    def _grab_info(self) -> str:
+        """Grab the gradebook XML from StudentVue"""
 
-        # Assert that the gradebook isn't just an error
-        if "RT_ERROR" in info:
-            raise FetchGradesException(
-                "Failed to get grades from StudentVue! "
-                f"Error: {info['RT_ERROR']['@ERROR_MESSAGE']} (UNRECOVERABLE)"
-            )
+        # `StudentVue.get_gradebook` would convert the XML into a tree of
+        # OrderedDicts, which `_serialize` would only pick apart again. That's only
+        # done if a version of studentvue doesn't have the (private) request method.
+        make_request: Callable[[str], str] | None = getattr(
+            self.student_vue, "_make_service_request", None
+        )
+        info: str
+        if make_request is not None:
+            info: str = make_request("Gradebook")
+        else:
+            (root,) = GRADEBOOK_SERIALIZER.etree(self.student_vue.get_gradebook())
+            info: str = tostring(root, encoding="unicode")
 
         Logger.log("Got grades from StudentVue")
         return info
 
     def _serialize(self) -> GradebookInformation:
-        """Serialize the raw data into :class:`GradebookInformation`"""
+        """Serialize the gradebook XML into :class:`GradebookInformation`.
+
+        The XML is read in one pass as a stream of elements, which are thrown away
+        (removed from their parent) once read, so only the elements being read are
+        kept. Every course, weight, and assignment is an element no matter how
+        many there are, so there are no single item versus list cases to handle.
+        """
 
         serialized = GradebookInformation(last_updated=int(time()), courses=[])
 
@@ -172,86 +334,94 @@ class Gradebook:
 
             return course.split(" (")[0]
 
-        courses: dict = self.unserialized_grades["Gradebook"]["Courses"]["Course"]
-        for course_idx, course in enumerate(courses):
-            grade: str = course["Marks"]["Mark"]["@CalculatedScoreString"]
-            assignments: dict = courses[course_idx]["Marks"]["Mark"]
-
-            weights: dict[str, float] = {}
-            weights_available: bool = True
-            assignments_weights: None | list[dict] = assignments.get(
-                "GradeCalculationSummary"
-            )
-            if assignments_weights is None or assignments_weights == {}:
-                weights_available: bool = False
-            else:
-                assignments_weights: dict = assignments_weights["AssignmentGradeCalc"]
-            if weights_available and (
-                not isinstance(assignments_weights, list)
-                and isinstance(assignments_weights, dict)
+        course: Course | None = None
+        marks_seen: int = 0  # Only the first mark of a course is read
+        open_elements: list = []  # Started but not ended, innermost last
+        try:
+            for event, element in iterparse(
+                BytesIO(bytes(self.unserialized_grades, "utf-8")),
+                events=("start", "end"),
             ):
-                assignments_weights: list[dict] = [assignments_weights]
-            if weights_available:
-                for weight in assignments_weights:
-                    if weight == {}:
-                        continue
-                    percent: str = weight["@Weight"].rstrip("%")
-                    weights[weight["@Type"].rstrip("*")] = _and(
+                tag: str = element.tag
+                if event == "start":
+                    open_elements.append(element)
+                    # Assert that the gradebook isn't just an error
+                    if tag == "RT_ERROR":
+                        raise FetchGradesException(
+                            "Failed to get grades from StudentVue! "
+                            f"Error: {element.get('ERROR_MESSAGE')} (UNRECOVERABLE)"
+                        )
+                    if tag == "Course":
+                        course: Course = Course(
+                            name=unescape(_remove_course_id(element.get("Title", ""))),
+                            period=_from_xml_string(
+                                element.get("Period", str(SENTINEL_UNKNOWN_INT))
+                            ),
+                            teacher=unescape(
+                                element.get("Staff", SENTINEL_UNKNOWN_STR)
+                            ),
+                            grade=SENTINEL_UNKNOWN_INT,
+                            assignments=[],
+                            room=unescape(
+                                str(
+                                    _from_xml_string(
+                                        element.get("Room", SENTINEL_UNKNOWN_STR)
+                                    )
+                                )
+                            ),
+                            weights={},
+                        )
+                        marks_seen: int = 0
+                    elif tag == "Mark" and course is not None:
+                        marks_seen += 1
+                        if marks_seen == 1:
+                            course.grade = _try_cast(
+                                int,
+                                _from_xml_string(element.get("CalculatedScoreString")),
+                            )
+                    continue
+
+                open_elements.pop()
+                if course is None or marks_seen != 1:
+                    pass
+                elif tag == "AssignmentGradeCalc" and element.attrib:
+                    percent: str = element.get("Weight", "").rstrip("%")
+                    course.weights[element.get("Type", "").rstrip("*")] = _and(
                         _try_cast(float, percent), lambda p: p / 100
                     )
+                elif tag == "Assignment":
+                    course.assignments.append(self._serialize_assignment(element))
+                if tag == "Course" and course is not None:
+                    serialized.courses.append(course)
+                    course = None
+                element.clear()
+                if open_elements:
+                    open_elements[-1].remove(element)
+        except ParseError as err:
+            raise SerializeGradesException(
+                f"StudentVue sent an invalid gradebook: {err}"
+            ) from err
 
-            course: Course = Course(
-                name=unescape(_remove_course_id(course["@Title"])),
-                period=course["@Period"],
-                teacher=unescape(course["@Staff"]),
-                grade=_try_cast(int, grade),
-                assignments=[],
-                room=unescape(str(course.get("@Room", SENTINEL_UNKNOWN_STR))),
-                weights=weights,
-            )
+        return serialized
 
-            assignments_assignment: None | list[dict] | dict = assignments[
-                "Assignments"
-            ].get("Assignment", None)
-            if assignments_assignment is None:
-                # No assignments, could be the start of the year or no courses...
-                # either way, just don't bother (empty course)
-                serialized.courses.append(course)
-                continue
-
-            # If it's not already a list, put it in one. This happens if there's
-            # only one assignment. I should also mention that this StudentVue API
-            # is stupid.
-            if (
-                not isinstance(assignments_assignment, list)
-                or isinstance(assignments_assignment, dict),
-            )[0]:
-                assignments_assignment: list[dict] = [assignments_assignment]
-
-            # Add assignment information
-            for assignment in assignments_assignment:
-                # Not an assignment
-                if isinstance(assignment, str):
-                    continue
-                grade: str = unescape(
-                    str(assignment.get("@Score", SENTINEL_UNKNOWN_STR))
-                )
-                if grade in ("Not Due", "Not Graded"):
-                    grade: str = str(SENTINEL_UNKNOWN_STR)
-                assignment_information = Assignment(
-                    name=unescape(assignment.get("@Measure", SENTINEL_UNKNOWN_STR)),
-                    assigned_date=unescape(
-                        assignment.get("@DropStartDate", SENTINEL_UNKNOWN_STR)
-                    ),
-                    due_date=unescape(
-                        assignment.get("@DropEndDate", SENTINEL_UNKNOWN_STR)
-                    ),
-                    weight=unescape(assignment.get("@Type")).rstrip("*"),
-                    grade=grade,
-                    points=unescape(assignment.get("@Points", SENTINEL_UNKNOWN_STR)),
-                )
-                course.assignments.append(assignment_information)
-
-            serialized.courses.append(course)
+    @staticmethod
+    def _serialize_assignment(element) -> Assignment:
+        """Serialize an "Assignment" element into an :class:`Assignment`"""
 
-        return serialized
+        grade: str = unescape(
+            str(_from_xml_string(element.get("Score", SENTINEL_UNKNOWN_STR)))
+        )
+        if grade in ("Not Due", "Not Graded"):
+            grade: str = str(SENTINEL_UNKNOWN_STR)
+        points: str = unescape(element.get("Points", SENTINEL_UNKNOWN_STR))
+        earned, possible = parse_points(points)
+        return Assignment(
+            name=unescape(element.get("Measure", SENTINEL_UNKNOWN_STR)),
+            assigned_date=unescape(element.get("DropStartDate", SENTINEL_UNKNOWN_STR)),
+            due_date=unescape(element.get("DropEndDate", SENTINEL_UNKNOWN_STR)),
+            weight=unescape(element.get("Type", "")).rstrip("*"),
+            grade=grade,
+            points=points,
+            earned=earned,
+            possible=possible,
+        )
@@ -0,0 +1,105 @@
+"""
+History export for StudentVue Data Viewer
+Licensed under the Unlicense (P.D.)
+2026-10-16
+"""
+
+### Setup ###
+from json import dumps
+from time import localtime
+from typing import Iterator
+from zipfile import ZipFile, ZipInfo, ZIP_DEFLATED
+from versioning import Versioning, VersioningItem
+
+FORMATS: dict[str, str] = {  # Export format to MIME type
+    "ndjson": "application/x-ndjson",
+    "zip": "application/zip",
+}
+ZIP_MIN_TIMESTAMP: int = 315532800  # ZIP files can't hold dates before 1980
+
+
+### Auxiliary functions ###
+class _ChunkBuffer:
+    """A write-only, unseekable file that hands out what was written to it, so a ZIP
+    file can be streamed as it's made
+    """
+
+    def __init__(self):
+        self.chunks: list[bytes] = []
+
+    def write(self, data: bytes) -> int:
+        """Keep the data until :meth:`drain`"""
+
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        """Nothing to flush, what's written is only kept until :meth:`drain`"""
+
+    def drain(self) -> bytes:
+        """Return (and forget) everything written since the last drain"""
+
+        data: bytes = b"".join(self.chunks)
+        self.chunks.clear()
+        return data
+
+
+def _history_entries(
+    versioning: Versioning, history: list[VersioningItem]
+) -> Iterator[tuple[VersioningItem, dict]]:
+    """Yield every version item (oldest first) with its serialized gradebook. Only one
+    gradebook is decrypted at a time.
+    """
+
+    for versioning_item in sorted(
+        history, key=lambda versioning_item: versioning_item.timestamp
+    ):
+        yield versioning_item, {
+            "timestamp": versioning_item.timestamp,
+            "last_seen": versioning_item.last_seen,
+            "grades": versioning.load(versioning_item.timestamp).to_dict(),
+        }
+
+
+### Exports ###
+def export_ndjson(
+    versioning: Versioning, history: list[VersioningItem]
+) -> Iterator[bytes]:
+    """Yield the user's history as newline-delimited JSON, one gradebook per line"""
+
+    for _, entry in _history_entries(versioning, history):
+        yield bytes(dumps(entry), "utf-8") + b"\n"
+
+
+def export_zip(
+    versioning: Versioning, history: list[VersioningItem]
+) -> Iterator[bytes]:
+    """Yield the user's history as a ZIP file with a JSON file per gradebook"""
+
+    buffer: _ChunkBuffer = _ChunkBuffer()
+    with ZipFile(buffer, "w", compression=ZIP_DEFLATED) as zip_file:
+        for versioning_item, entry in _history_entries(versioning, history):
+            modified: int = max(versioning_item.timestamp, ZIP_MIN_TIMESTAMP)
+            member: ZipInfo = ZipInfo(
+                f"{versioning_item.timestamp}.json", date_time=localtime(modified)[:6]
+            )
+            member.compress_type = ZIP_DEFLATED
+            zip_file.writestr(member, dumps(entry))
+            yield buffer.drain()
+    # The central directory is written when the file is closed
+    yield buffer.drain()
+
+
+def export_history(
+    versioning: Versioning, history: list[VersioningItem], export_format: str
+) -> Iterator[bytes]:
+    """Yield the gradebooks of the version items (from
+    :meth:`Versioning.list_history`, which is where bad credentials are found before
+    anything is sent) in a format of :data:`FORMATS`
+    """
+
+    if export_format == "ndjson":
+        return export_ndjson(versioning, history)
+    if export_format == "zip":
+        return export_zip(versioning, history)
+    raise ValueError(f"Unknown export format {export_format}")
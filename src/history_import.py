@@ -0,0 +1,166 @@
+"""
+History import for StudentVue Data Viewer
+Licensed under the Unlicense (P.D.)
+2026-10-16
+
+Adds gradebooks to a user's versioning history from newline-delimited JSON, one
+gradebook per line, e.g. a backup exported from "/past/export" (see
+`history_export`):
+    python3 src/history_import.py USERNAME grade-history.ndjson
+The password is asked for, and must be the one the history is encrypted with.
+"""
+
+### Setup ###
+from argparse import ArgumentParser, FileType, Namespace
+from getpass import getpass
+from json import dumps, loads, JSONDecodeError
+from tempfile import SpooledTemporaryFile
+from typing import IO, Any, Iterable, Iterator
+from gradebook import GradebookInformation
+from snapshot_format import upgrade
+from versioning import Versioning
+from tools import ImportGradesException
+from common import Logger
+
+STAGING_MAX_MEMORY: int = 16 * 1024 * 1024  # Bytes, larger uploads are staged on disk
+
+# Expected types of every field of a serialized gradebook (see `gradebook`)
+GRADEBOOK_FIELDS: dict[str, type | tuple[type, ...]] = {
+    "last_updated": int,
+    "courses": list,
+}
+COURSE_FIELDS: dict[str, type | tuple[type, ...]] = {
+    "name": str,
+    "grade": int,
+    "teacher": str,
+    "period": (int, float, str),  # Not an int if StudentVue sent something else
+    "assignments": list,
+    "room": str,
+    "weights": dict,
+}
+ASSIGNMENT_FIELDS: dict[str, type | tuple[type, ...]] = {
+    "name": str,
+    "assigned_date": str,
+    "due_date": str,
+    "weight": str,
+    "grade": str,
+    "points": str,
+}
+# Fields that are filled in by upgrading the gradebook if they're missing
+UPGRADED_ASSIGNMENT_FIELDS: dict[str, type | tuple[type, ...]] = {
+    "earned": (int, float, type(None)),
+    "possible": (int, float, type(None)),
+}
+
+
+### Validation ###
+def _validate_fields(data: Any, fields: dict[str, type | tuple[type, ...]], kind: str):
+    if not isinstance(data, dict):
+        raise ImportGradesException(f"Expected {kind} to be an object")
+    for name, expected_type in fields.items():
+        # bool is an int, but never a valid one here
+        if not isinstance(data.get(name), expected_type) or isinstance(
+            data.get(name), bool
+        ):
+            raise ImportGradesException(f'Invalid or missing {kind} field "{name}"')
+
+
+def validate_gradebook(data: Any) -> GradebookInformation:
+    """Return the gradebook of a serialized gradebook, raising
+    :class:`ImportGradesException` if it's not one. Gradebooks of an older schema
+    (e.g. exported before a field was added) are upgraded.
+    """
+
+    _validate_fields(data, GRADEBOOK_FIELDS, "gradebook")
+    for course in data["courses"]:
+        _validate_fields(course, COURSE_FIELDS, "course")
+        for assignment in course["assignments"]:
+            _validate_fields(assignment, ASSIGNMENT_FIELDS, "assignment")
+            if any(name in assignment for name in UPGRADED_ASSIGNMENT_FIELDS):
+                _validate_fields(assignment, UPGRADED_ASSIGNMENT_FIELDS, "assignment")
+        for weight in course["weights"].values():
+            # None if StudentVue didn't send a percent
+            if not isinstance(weight, (int, float, type(None))) or isinstance(
+                weight, bool
+            ):
+                raise ImportGradesException("Invalid course weight")
+    return GradebookInformation.from_dict(upgrade(data, 0))
+
+
+def parse_gradebooks(lines: Iterable[bytes | str]) -> Iterator[GradebookInformation]:
+    """Yield the gradebooks of newline-delimited JSON as they are read. A line is a
+    serialized gradebook, or an entry of an export (with the gradebook as "grades").
+    An export entry's "last_seen" is yielded as the same gradebook at that time.
+    """
+
+    for line_number, line in enumerate(lines, start=1):
+        if not line.strip():
+            continue
+        try:
+            data: Any = loads(line)
+        except (JSONDecodeError, UnicodeDecodeError) as err:
+            raise ImportGradesException(f"Line {line_number}: Invalid JSON") from err
+
+        try:
+            if isinstance(data, dict) and "grades" in data:
+                gradebook: GradebookInformation = validate_gradebook(data["grades"])
+                yield gradebook
+                if isinstance(last_seen := data.get("last_seen"), int) and (
+                    last_seen > gradebook.last_updated
+                ):
+                    yield GradebookInformation(last_seen, gradebook.courses)
+            else:
+                yield validate_gradebook(data)
+        except ImportGradesException as err:
+            raise ImportGradesException(f"Line {line_number}: {err}") from err
+
+
+### Import ###
+def _read_staged(staged: IO[bytes]) -> Iterator[GradebookInformation]:
+    with staged:
+        for line in staged:
+            yield GradebookInformation.from_dict(loads(line))
+
+
+def stage_gradebooks(lines: Iterable[bytes | str]) -> Iterator[GradebookInformation]:
+    """Validate every line (see :func:`parse_gradebooks`) before returning anything,
+    raising :class:`ImportGradesException` if one is invalid. The gradebooks are
+    staged in a temporary file (in memory while it's small), so that an import
+    either has every gradebook or writes nothing.
+    """
+
+    staged: IO[bytes] = SpooledTemporaryFile(  # pylint:disable=consider-using-with
+        max_size=STAGING_MAX_MEMORY, mode="w+b"
+    )
+    try:
+        for gradebook in parse_gradebooks(lines):
+            staged.write(bytes(dumps(gradebook.to_dict()), "utf-8") + b"\n")
+    except BaseException:
+        staged.close()
+        raise
+    staged.seek(0)
+    return _read_staged(staged)
+
+
+def main():
+    """Import a file from the command line"""
+
+    parser: ArgumentParser = ArgumentParser(
+        description="Add gradebooks (NDJSON) to a user's versioning history"
+    )
+    parser.add_argument("username")
+    parser.add_argument(
+        "file", type=FileType("rb"), help='Newline-delimited JSON, or "-" for stdin'
+    )
+    args: Namespace = parser.parse_args()
+
+    versioning: Versioning = Versioning(args.username, getpass())
+    with args.file:
+        gradebooks: Iterator[GradebookInformation] = stage_gradebooks(args.file)
+    imported: int = versioning.import_history(gradebooks)
+    Logger.log(f"Imported {imported} snapshots")
+
+
+### Run ###
+if __name__ == "__main__":
+    main()
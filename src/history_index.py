@@ -0,0 +1,230 @@
+"""
+History index for StudentVue Data Viewer
+Licensed under the Unlicense (P.D.)
+2026-10-16
+"""
+
+### Setup ###
+from dataclasses import dataclass
+from pathlib import Path
+from os import replace
+from struct import Struct, error as StructError
+from typing import BinaryIO
+
+# File layout: MAGIC, HEADER (size of the history log the index was made for), then
+# fixed size ROWs sorted by timestamp, so that rows can be binary searched on disk.
+MAGIC: bytes = b"SSVI\x01"
+HEADER: Struct = Struct(">Q")
+ROW: Struct = Struct(
+    ">QQQ8s"
+)  # Timestamp, log offset, last seen (0 if none), signature
+ROWS_START: int = len(MAGIC) + HEADER.size
+
+
+### Dataclasses ###
+@dataclass(slots=True)
+class IndexRow:
+    """A versioning item in the history index"""
+
+    timestamp: int
+    offset: int  # Where the item's record is in the history log
+    last_seen: int | None
+    signature: bytes  # Identifies the list of course names of the item
+
+    def pack(self) -> bytes:
+        """Return the on-disk form of the row"""
+
+        return ROW.pack(
+            self.timestamp, self.offset, self.last_seen or 0, self.signature
+        )
+
+    @classmethod
+    def unpack(cls, data: bytes) -> "IndexRow":
+        """Read a row from its on-disk form"""
+
+        timestamp, offset, last_seen, signature = ROW.unpack(data)
+        return cls(timestamp, offset, last_seen or None, signature)
+
+
+### Index ###
+class HistoryIndex:
+    """A sorted, seekable index of the live items in the history log.
+
+    The index remembers the size of the log it was made for. Every method that
+    updates the index takes the size the log had before the update, and returns
+    `False` (without changing anything) if the index is missing or stale, in which
+    case it must be rebuilt from the log with :meth:`rewrite`.
+    """
+
+    def __init__(self, path: Path):
+        self.path: Path = path
+
+    def log_size(self) -> int | None:
+        """Return the size of the log the index was made for, or None if there is no
+        (valid) index
+        """
+
+        try:
+            with open(self.path, "rb") as index_file:
+                return self._log_size(index_file)
+        except FileNotFoundError:
+            return None
+
+    def rewrite(self, rows: list[IndexRow], log_size: int):
+        """Atomically replace the index with the rows (in any order)"""
+
+        temporary_path: Path = self.path.with_name(f"{self.path.name}.tmp")
+        with open(temporary_path, "wb") as index_file:
+            index_file.write(MAGIC + HEADER.pack(log_size))
+            index_file.write(
+                b"".join(
+                    row.pack() for row in sorted(rows, key=lambda row: row.timestamp)
+                )
+            )
+        replace(temporary_path, self.path)
+
+    def rows(self) -> list[IndexRow]:
+        """Return every row, oldest first"""
+
+        try:
+            with open(self.path, "rb") as index_file:
+                index_file.seek(ROWS_START)
+                data: bytes = index_file.read()
+        except FileNotFoundError:
+            return []
+        return [
+            IndexRow.unpack(data[offset : offset + ROW.size])
+            for offset in range(0, len(data) - len(data) % ROW.size, ROW.size)
+        ]
+
+    def page(self, before: int | None, limit: int) -> tuple[list[IndexRow], bool]:
+        """Return up to `limit` rows older than `before` (or the newest rows if it's
+        None), newest first, and if there are any older rows left
+        """
+
+        try:
+            with open(self.path, "rb") as index_file:
+                row_count: int = self._row_count(index_file)
+                end: int = (
+                    row_count
+                    if before is None
+                    else self._bisect(index_file, row_count, before)
+                )
+                start: int = max(end - limit, 0)
+                index_file.seek(ROWS_START + start * ROW.size)
+                data: bytes = index_file.read((end - start) * ROW.size)
+        except FileNotFoundError:
+            return [], False
+
+        rows: list[IndexRow] = [
+            IndexRow.unpack(data[offset : offset + ROW.size])
+            for offset in range(0, len(data), ROW.size)
+        ]
+        rows.reverse()
+        return rows, start > 0
+
+    def put(self, row: IndexRow, log_size: int, new_log_size: int) -> bool:
+        """Add (or replace) a row. A row newer than all others is appended in place,
+        otherwise the index is rewritten.
+        """
+
+        try:
+            index_file: BinaryIO = open(  # pylint:disable=consider-using-with
+                self.path, "r+b"
+            )
+        except FileNotFoundError:
+            return False
+        with index_file:
+            if self._log_size(index_file) != log_size:
+                return False
+            row_count: int = self._row_count(index_file)
+            if row_count == 0 or self._read_row(index_file, row_count - 1).timestamp < (
+                row.timestamp
+            ):
+                index_file.seek(ROWS_START + row_count * ROW.size)
+                index_file.write(row.pack())
+                index_file.truncate()
+                self._write_log_size(index_file, new_log_size)
+                return True
+
+        rows: list[IndexRow] = [
+            existing_row
+            for existing_row in self.rows()
+            if existing_row.timestamp != row.timestamp
+        ]
+        self.rewrite(rows + [row], new_log_size)
+        return True
+
+    def set_last_seen(
+        self, timestamp: int, last_seen: int, log_size: int, new_log_size: int
+    ) -> bool:
+        """Update the last seen time of a row in place"""
+
+        try:
+            index_file: BinaryIO = open(  # pylint:disable=consider-using-with
+                self.path, "r+b"
+            )
+        except FileNotFoundError:
+            return False
+        with index_file:
+            if self._log_size(index_file) != log_size:
+                return False
+            row_count: int = self._row_count(index_file)
+            position: int = self._bisect(index_file, row_count, timestamp)
+            if position < row_count:
+                row: IndexRow = self._read_row(index_file, position)
+                if row.timestamp == timestamp:
+                    row.last_seen = last_seen
+                    index_file.seek(ROWS_START + position * ROW.size)
+                    index_file.write(row.pack())
+            self._write_log_size(index_file, new_log_size)
+            return True
+
+    def remove(self, timestamp: int, log_size: int, new_log_size: int) -> bool:
+        """Remove a row, rewriting the index"""
+
+        if self.log_size() != log_size:
+            return False
+        self.rewrite(
+            [row for row in self.rows() if row.timestamp != timestamp], new_log_size
+        )
+        return True
+
+    @staticmethod
+    def _log_size(index_file: BinaryIO) -> int | None:
+        index_file.seek(0)
+        header: bytes = index_file.read(ROWS_START)
+        if not header.startswith(MAGIC):
+            return None
+        try:
+            return HEADER.unpack_from(header, len(MAGIC))[0]
+        except StructError:
+            return None
+
+    @staticmethod
+    def _write_log_size(index_file: BinaryIO, log_size: int):
+        index_file.seek(len(MAGIC))
+        index_file.write(HEADER.pack(log_size))
+
+    @staticmethod
+    def _row_count(index_file: BinaryIO) -> int:
+        return max(index_file.seek(0, 2) - ROWS_START, 0) // ROW.size
+
+    @staticmethod
+    def _read_row(index_file: BinaryIO, position: int) -> IndexRow:
+        index_file.seek(ROWS_START + position * ROW.size)
+        return IndexRow.unpack(index_file.read(ROW.size))
+
+    def _bisect(self, index_file: BinaryIO, row_count: int, timestamp: int) -> int:
+        """Return the position of the first row with a timestamp of at least
+        `timestamp`, reading only the rows on the way
+        """
+
+        low, high = 0, row_count
+        while low < high:
+            middle: int = (low + high) // 2
+            if self._read_row(index_file, middle).timestamp < timestamp:
+                low = middle + 1
+            else:
+                high = middle
+        return low
@@ -0,0 +1,203 @@
+"""
+Append-only history log for StudentVue Data Viewer
+Licensed under the Unlicense (P.D.)
+2026-10-16
+"""
+
+### Setup ###
+from dataclasses import dataclass
+from pathlib import Path
+from os import replace, SEEK_END
+from struct import Struct, error as StructError
+from typing import BinaryIO, Iterator
+
+# File layout: MAGIC, then records of
+#   RECORD_HEADER (kind, timestamp, payload length) | payload | RECORD_TRAILER
+# The trailer repeats the full record length so the log can be read backwards.
+MAGIC: bytes = b"SSVH\x01"
+RECORD_HEADER: Struct = Struct(">BQI")
+RECORD_TRAILER: Struct = Struct(">I")
+SEEN_PAYLOAD: Struct = Struct(">Q")  # Payload of a `RecordKind.SEEN` record
+
+
+### Dataclasses ###
+class RecordKind:  # pylint:disable=too-few-public-methods
+    """The kind of a :class:`LogRecord`"""
+
+    PUT: int = 1  # The payload is an encrypted versioning item
+    DELETE: int = 2  # Tombstone, no payload
+    SEEN: int = 3  # The item is still current as of the time in the payload
+
+
+@dataclass
+class LogRecord:
+    """A record in the history log. The payload is opaque (already encrypted)."""
+
+    kind: int
+    timestamp: int
+    payload: bytes = b""
+    offset: int = -1  # Where the record starts in the log, if it was read from it
+
+    def pack(self) -> bytes:
+        """Return the on-disk form of the record"""
+
+        body: bytes = (
+            RECORD_HEADER.pack(self.kind, self.timestamp, len(self.payload))
+            + self.payload
+        )
+        return body + RECORD_TRAILER.pack(len(body) + RECORD_TRAILER.size)
+
+
+### Log ###
+class HistoryLog:
+    """An append-only log of versioning items. Saving an item appends one record and
+    deleting an item appends a tombstone, so neither rewrites the log. Superseded
+    records are dropped by :meth:`rewrite` (compaction).
+    """
+
+    def __init__(self, path: Path):
+        self.path: Path = path
+
+    def exists(self) -> bool:
+        """Returns if the log file exists"""
+
+        return self.path.exists()
+
+    def append(self, records: list[LogRecord]) -> int:
+        """Append records to the end of the log, creating it if needed. A torn record
+        at the end of the log (from an interrupted append) is cut off first.
+
+        The records' offsets are set, and the new size of the log is returned.
+        """
+
+        with open(self.path, "a+b") as log_file:
+            end: int = log_file.seek(0, SEEK_END)
+            if (valid_end := self._valid_end(log_file, end)) != end:
+                log_file.truncate(valid_end)
+            if valid_end == 0:
+                log_file.write(MAGIC)
+            return self._write_records(log_file, records, max(valid_end, len(MAGIC)))
+
+    def read(self) -> Iterator[LogRecord]:
+        """Yield every record from oldest to newest. A torn record at the end of the
+        log is ignored.
+        """
+
+        try:
+            with open(self.path, "rb") as log_file:
+                data: bytes = log_file.read()
+        except FileNotFoundError:
+            return
+
+        yield from self._scan(data)[0]
+
+    def read_at(self, offset: int) -> LogRecord:
+        """Read the record at an offset"""
+
+        with open(self.path, "rb") as log_file:
+            log_file.seek(offset)
+            kind, timestamp, length = RECORD_HEADER.unpack(
+                log_file.read(RECORD_HEADER.size)
+            )
+            return LogRecord(kind, timestamp, log_file.read(length), offset)
+
+    def size(self) -> int:
+        """Return the size of the log in bytes (0 if it doesn't exist)"""
+
+        try:
+            return self.path.stat().st_size
+        except FileNotFoundError:
+            return 0
+
+    def read_reverse(self) -> Iterator[LogRecord]:
+        """Yield every record from newest to oldest. Records are read one at a time
+        from the end, so stopping early only costs the records that were read.
+        """
+
+        if not self.path.exists():
+            return
+
+        with open(self.path, "rb") as log_file:
+            offset: int = self._valid_end(log_file, log_file.seek(0, SEEK_END))
+            while offset > len(MAGIC):
+                log_file.seek(offset - RECORD_TRAILER.size)
+                (record_length,) = RECORD_TRAILER.unpack(
+                    log_file.read(RECORD_TRAILER.size)
+                )
+                offset -= record_length
+                log_file.seek(offset)
+                kind, timestamp, length = RECORD_HEADER.unpack(
+                    log_file.read(RECORD_HEADER.size)
+                )
+                yield LogRecord(kind, timestamp, log_file.read(length), offset)
+
+    @staticmethod
+    def _scan(data: bytes) -> tuple[list[LogRecord], int]:
+        """Parse a whole log, returning the records and where the valid data ends"""
+
+        records: list[LogRecord] = []
+        if not data.startswith(MAGIC):
+            return records, 0
+        offset: int = len(MAGIC)
+        while offset < len(data):
+            try:
+                kind, timestamp, length = RECORD_HEADER.unpack_from(data, offset)
+            except StructError:
+                break
+            payload_start: int = offset + RECORD_HEADER.size
+            next_offset: int = payload_start + length + RECORD_TRAILER.size
+            if next_offset > len(data):
+                break
+            records.append(
+                LogRecord(
+                    kind,
+                    timestamp,
+                    data[payload_start : payload_start + length],
+                    offset,
+                )
+            )
+            offset: int = next_offset
+        return records, offset
+
+    def _valid_end(self, log_file: BinaryIO, end: int) -> int:
+        """Return where the valid data in the log ends. Only the last record is
+        checked through its trailer, unless it turns out to be torn.
+        """
+
+        if end >= len(MAGIC) + RECORD_HEADER.size + RECORD_TRAILER.size:
+            log_file.seek(end - RECORD_TRAILER.size)
+            (record_length,) = RECORD_TRAILER.unpack(log_file.read(RECORD_TRAILER.size))
+            if len(MAGIC) <= end - record_length <= end - RECORD_HEADER.size:
+                log_file.seek(end - record_length)
+                _, _, length = RECORD_HEADER.unpack(log_file.read(RECORD_HEADER.size))
+                if RECORD_HEADER.size + length + RECORD_TRAILER.size == record_length:
+                    return end
+
+        log_file.seek(0)
+        return self._scan(log_file.read())[1]
+
+    def rewrite(self, records: list[LogRecord]) -> int:
+        """Atomically replace the log with the given records. The records' offsets are
+        set, and the new size of the log is returned.
+        """
+
+        temporary_path: Path = self.path.with_name(f"{self.path.name}.tmp")
+        with open(temporary_path, "wb") as log_file:
+            log_file.write(MAGIC)
+            size: int = self._write_records(log_file, records, len(MAGIC))
+        replace(temporary_path, self.path)
+        return size
+
+    @staticmethod
+    def _write_records(
+        log_file: BinaryIO, records: list[LogRecord], offset: int
+    ) -> int:
+        """Write records starting at an offset, returning where they end"""
+
+        packed_records: list[bytes] = []
+        for record in records:
+            record.offset = offset
+            packed_records.append(record.pack())
+            offset += len(packed_records[-1])
+        log_file.write(b"".join(packed_records))
+        return offset
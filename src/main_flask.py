@@ -6,15 +6,23 @@ Licensed under the Unlicense (P.D.)
 
 ### Setup ###
 from traceback import format_exc
+from threading import Thread
 from dataclasses import asdict, dataclass
-from typing import TypeAlias
+from typing import Any, Iterator, TypeAlias
+from hashlib import sha256
 from datetime import datetime
+from math import isnan
+from time import perf_counter
 from pathlib import Path
+from types import MappingProxyType
 from flask_limiter import Limiter
 from flask_limiter.util import get_remote_address
 from flask import (
     Flask,
     Response,
+    before_render_template,
+    template_rendered,
+    g,
     render_template,
     request,
     make_response,
@@ -22,7 +30,9 @@ from flask import (
     redirect,
     session,
     url_for,
+    jsonify,
 )
+from jinja2 import Template
 from tzlocal import get_localzone
 from gradebook import (
     Gradebook,
@@ -30,12 +40,53 @@ from gradebook import (
     SENTINEL_UNKNOWN_INT,
     SENTINEL_UNKNOWN_STR,
 )
-from versioning import Versioning, VersioningItem
+from versioning import (
+    Versioning,
+    VersioningItem,
+    HistoryPage,
+    ChangeRecord,
+    DERIVED_KEY_CACHE,
+    SNAPSHOT_CACHE,
+)
+from history_export import FORMATS as EXPORT_FORMATS, export_history
+from history_import import stage_gradebooks
+from retention import Compactor, retention_policy
+from grade_series import GradeSeries
+from snapshot_diff import SnapshotDiff
+from what_if import (
+    AssignmentColumns,
+    HypotheticalScore,
+    assignment_columns,
+    required_scores,
+    scenario_grades,
+)
+from state_store import StateStore, create_state_store
 from tools import VersioningMismatchedCredentialsException
 from config_parser import parse
 from common import ROOT_PATH, VERSIONING_PATH, HASH_FILENAME, Logger
+from cache import LRUCache
+from metrics import (
+    CONTENT_TYPE as METRICS_CONTENT_TYPE,
+    RENDER_SECONDS,
+    render as render_metrics,
+    start_phases,
+    stop_phases,
+    watch_cache,
+)
+from profiling import (
+    PROFILE_TOKEN_HEADER,
+    is_profile_authorized,
+    is_sampled,
+    start_profile,
+    stop_profile,
+)
+from source_files import SourceFile, index_source_files
+from response_compression import compress_response, etag_matches
 from tools import (
     InvalidCredentialsException,
+    FetchGradesException,
+    SerializeGradesException,
+    ImportGradesException,
     VersioningAlreadyInitialized,
     SourceDirectory,
 )
@@ -47,6 +98,7 @@ GRADE_VIEWER_PAGE: str = "grade-viewer.html"
 PASSWORD_MISMATCH_PAGE: str = "password-mismatch.html"
 CONFIRM_VERSION_HISTORY_DELETION_PAGE: str = "confirm-version-history-deletion.html"
 MIGRATE_PASSWORD_PAGE: str = "migrate-password.html"
+MIGRATE_PASSWORD_PROGRESS_PAGE: str = "migrate-password-progress.html"
 VERSIONING_HISTORY_PAGE: str = "view-versioning-history.html"
 ABOUT_PAGE: str = "about.html"
 SOURCE_PAGE: str = "source.html"
@@ -54,6 +106,31 @@ SOURCE_PAGE: str = "source.html"
 INPUT_CREDENTIALS_MESSAGE: str = "Please input your credentials and login."
 INVALID_CREDENTIALS_MESSAGE: str = "Invalid credentials."
 INVALID_PATH_MESSAGE: str = "Invalid path."
+NO_HISTORY_MESSAGE: str = "No past grades."
+# The API has nothing to check credentials against without a history
+INVALID_CREDENTIALS_OR_NO_HISTORY_MESSAGE: str = (
+    f"{INVALID_CREDENTIALS_MESSAGE.strip('.')} or no versioning history."
+)
+FETCH_FAILED_MESSAGE: str = "Failed to get the grades from StudentVue."
+SAVE_FAILED_MESSAGE: str = "Failed to save the grades to the versioning history."
+PASSWORD_MISMATCH_MESSAGE: str = (
+    "The versioning history is encrypted with another password. Log in to resolve it."
+)
+# ---
+HISTORY_PAGE_SIZE: int = 50  # Past grades shown per page by default
+HISTORY_PAGE_MAX_SIZE: int = 500
+# ---
+PASSWORD_MISMATCH_TTL: int = 60 * 60  # Seconds to resolve a password mismatch in
+GRADEBOOK_TTL: int = 60 * 60  # Seconds grades are kept while a mismatch is resolved
+MIGRATION_PROGRESS_TTL: int = 60 * 60  # Seconds the progress of a migration is kept
+# ---
+RENDERED_PAGE_CACHE_MAX_SIZE: int = 256  # Rendered grade viewer pages held at once
+WHAT_IF_CACHE_MAX_SIZE: int = 64  # Gradebooks held as assignment columns at once
+WHAT_IF_MAX_SCENARIOS: int = 1000
+WHAT_IF_MAX_TARGETS: int = 1000
+STATIC_MAX_AGE: int = 365 * 24 * 60 * 60  # Seconds, for static files with a hash
+# Pages that echo credentials, which are never compressed (see `compress_response`)
+CREDENTIAL_PAGES: frozenset[str] = frozenset((LOGIN_PAGE,))
 # ---
 SOURCE_FILES = [
     SourceDirectory(
@@ -90,6 +167,10 @@ SOURCE_FILES = [
         ],
     ),
 ]
+# Read once, so serving a source file never touches the disk
+SOURCE_INDEX: MappingProxyType[str, SourceFile] = index_source_files(
+    ROOT_PATH, SOURCE_FILES
+)
 
 
 ### Data structures ###
@@ -125,9 +206,32 @@ class PasswordMismatchInformation:
 
 
 ### Session data ###
-# Keys are usernames.
-PASSWORD_MISMATCH_USERS: dict[str, PasswordMismatchInformation] = {}
-GRADEBOOKS: dict[str, Gradebook] = {}
+# Keys are usernames. Shared by every process when the state store is SQLite (see
+# `state_store`), so values are stored as dicts: `PasswordMismatchInformation` as is,
+# and a gradebook as its serialized grades ({"grades": {...}}).
+PASSWORD_MISMATCH_USERS: StateStore = create_state_store(
+    "password_mismatch_users", ttl=PASSWORD_MISMATCH_TTL
+)
+GRADEBOOKS: StateStore = create_state_store("gradebooks", ttl=GRADEBOOK_TTL)
+# Password migrations running in the background (see `run_migration`), as
+# {"done": int, "total": int, "finished": bool, "error": str | None}
+MIGRATION_PROGRESS: StateStore = create_state_store(
+    "migration_progress", ttl=MIGRATION_PROGRESS_TTL
+)
+# Thins out old snapshots by the retention policy (see `retention`) after logins
+COMPACTOR: Compactor = Compactor(retention_policy())
+# Rendered grade viewer pages by ETag (see `render_grade_viewer`)
+RENDERED_PAGES: LRUCache = LRUCache(max_size=RENDERED_PAGE_CACHE_MAX_SIZE)
+# The newest snapshots of users as (timestamp, assignment columns) for the what-if
+# calculator, by the history ETag (see `get_history_etag`)
+WHAT_IF_COLUMNS: LRUCache = LRUCache(max_size=WHAT_IF_CACHE_MAX_SIZE)
+for cache_name, cache in (
+    ("derived_key", DERIVED_KEY_CACHE),
+    ("snapshot", SNAPSHOT_CACHE),
+    ("rendered_page", RENDERED_PAGES),
+    ("what_if", WHAT_IF_COLUMNS),
+):
+    watch_cache(cache_name, cache)
 
 
 @dataclass
@@ -146,22 +250,260 @@ app = Flask(
 )
 app.secret_key = CONFIG["master_key"]
 limiter = Limiter(app)
+# Content hashes of the static files by filename (as in `url_for`), which are added
+# to their URLs so they can be cached forever
+STATIC_HASHES: MappingProxyType[str, str] = MappingProxyType(
+    {
+        path.relative_to(app.static_folder)
+        .as_posix(): sha256(path.read_bytes())
+        .hexdigest()[:16]
+        for path in Path(app.static_folder).rglob("*")
+        if path.is_file()
+    }
+)
+# Changes when the grade viewer's templates or the static files they link to (by
+# their hash, see `add_static_hash`) do, so pages rendered with old templates or
+# links are neither served from the cache nor matched by ETags
+GRADE_VIEWER_VERSION: str = sha256(
+    b"".join(
+        (ROOT_PATH / "template" / name).read_bytes()
+        for name in (GRADE_VIEWER_PAGE, "base.html")
+    )
+    + bytes(
+        "".join(f"{name}\0{STATIC_HASHES[name]}\0" for name in sorted(STATIC_HASHES)),
+        "utf-8",
+    )
+).hexdigest()
 
 
 ### Functions ###
 def get_gradebook(username: str, password: str) -> Gradebook:
     """Gets a gradebook for a student (no error handling)"""
 
-    # Session gradebook
-    if gradebook := GRADEBOOKS.get(username):
-        # Synchronize credentials. They may be out of sync if a password mismatch occurs.
-        gradebook.password = password
-        gradebook.versioning.password = password
-        del GRADEBOOKS[username]
-        return gradebook
-
     # Construct a new gradebook
-    return Gradebook(username, password, CONFIG["domain"])
+    gradebook: Gradebook = Gradebook(username, password, CONFIG["domain"])
+
+    # Session gradebook. Its grades are reused (instead of fetched again), while
+    # versioning is set up again with the current credentials, which may be different
+    # if a password mismatch occurred.
+    if (stored_gradebook := GRADEBOOKS.get(username)) is not None:
+        gradebook.grades = GradebookInformation.from_dict(stored_gradebook["grades"])
+        GRADEBOOKS.delete(username)
+
+    return gradebook
+
+
+def get_password_mismatch_information(
+    username: str,
+) -> PasswordMismatchInformation | None:
+    """Get the password mismatch information of a user out of the state store"""
+
+    if (information := PASSWORD_MISMATCH_USERS.get(username)) is None:
+        return None
+    return PasswordMismatchInformation(**information)
+
+
+def run_migration(username: str, old_password: str, new_password: str):
+    """Migrate the versioning encryption password for a user, keeping the progress in
+    `MIGRATION_PROGRESS`. This is run in a background thread.
+    """
+
+    def _set_progress(
+        done: int, total: int, finished: bool = False, error: str | None = None
+    ):
+        MIGRATION_PROGRESS.set(
+            username,
+            {"done": done, "total": total, "finished": finished, "error": error},
+        )
+
+    def _progress(done: int, total: int):
+        # Only every percent, as the state store may be a database
+        if done == total or done * 100 // total != (done - 1) * 100 // total:
+            _set_progress(done, total)
+
+    try:
+        Versioning(username, new_password).migrate(
+            old_password, new_password, progress=_progress
+        )
+    except (
+        VersioningMismatchedCredentialsException,
+        InvalidCredentialsException,
+    ):
+        _set_progress(0, 0, finished=True, error="Invalid old password.")
+        return
+    except Exception:  # pylint:disable=broad-exception-caught
+        Logger.fatal(format_exc())
+        _set_progress(
+            0, 0, finished=True, error="Failed to migrate the versioning history."
+        )
+        return
+    _set_progress(0, 0, finished=True)
+
+
+def get_viewer_changes(change_record: ChangeRecord | None) -> dict | None:
+    """Return the changes of a change record in a form the grade viewer can look up
+    assignments (by course name, name, and due date) and courses in
+    """
+
+    if change_record is None or not change_record.diff:
+        return None
+    return {
+        "since": change_record.from_timestamp,
+        "added": {
+            (change.course, change.name, change.due_date)
+            for change in change_record.diff.added
+        },
+        "regraded": {
+            (change.course, change.name, change.due_date): change.old_grade
+            for change in change_record.diff.regraded
+        },
+        "grades": {
+            change.course: change.old_grade for change in change_record.diff.grades
+        },
+    }
+
+
+def render_grade_viewer(
+    username: str,
+    grades: GradebookInformation,
+    past: bool,
+    is_versioning_available: bool,
+    change_record: ChangeRecord | None = None,
+) -> Response:
+    """Render the grade viewer, reusing the page if the same grades were rendered
+    for the same user before. The page gets a strong ETag, so a browser that already
+    has it gets a 304 instead. Pages with flashed messages are always rendered, and
+    never cached. Changes since the previous snapshot (see
+    `Versioning.latest_changes`) are highlighted.
+    """
+
+    def _render() -> str:
+        return render_template(
+            GRADE_VIEWER_PAGE,
+            content=grades.to_dict(),
+            past=past,
+            is_versioning_available=is_versioning_available,
+            changes=get_viewer_changes(change_record),
+            datetime=datetime,
+            local_timezone=get_localzone(),
+            SENTINEL_UNKNOWN_INT=SENTINEL_UNKNOWN_INT,
+            SENTINEL_UNKNOWN_STR=SENTINEL_UNKNOWN_STR,
+        )
+
+    if session.get("_flashes"):
+        response: Response = make_response(_render())
+        response.cache_control.no_store = True
+        return response
+
+    # `last_updated` isn't shown, so it isn't a part of the ETag. A change record is
+    # only ever made once for a pair of snapshots. The user is, as pages are cached
+    # by ETag and the same grades of two users aren't the same page.
+    etag: str = sha256(
+        bytes(
+            f"{GRADE_VIEWER_VERSION}\0{username}\0{grades.content_hash()}\0"
+            f"{past}\0{is_versioning_available}\0"
+            + (
+                f"{change_record.from_timestamp}-{change_record.to_timestamp}"
+                if change_record is not None
+                else ""
+            ),
+            "utf-8",
+        )
+    ).hexdigest()
+    if etag_matches(request, etag):
+        response: Response = make_response("", 304)
+    elif (page := RENDERED_PAGES.get(etag)) is not None:
+        response: Response = make_response(page)
+    else:
+        page: str = _render()
+        RENDERED_PAGES.put(etag, page)
+        response: Response = make_response(page)
+    response.set_etag(etag)
+    # Grades are private, and must be checked for changes on every view
+    response.cache_control.private = True
+    response.cache_control.no_cache = True
+    return response
+
+
+def get_api_credentials() -> tuple[str, str] | None:
+    """Return the username and password from HTTP Basic authentication, if given"""
+
+    if (
+        request.authorization is None
+        or request.authorization.type != "basic"
+        or not request.authorization.username
+        or not request.authorization.password
+    ):
+        return None
+    return request.authorization.username, request.authorization.password
+
+
+def api_error(message: str, status: int) -> Response:
+    """Return a JSON error response for the API"""
+
+    response: Response = jsonify(error=message)
+    response.status_code = status
+    if status == 401:
+        response.headers["WWW-Authenticate"] = 'Basic realm="SheepStudentVue"'
+    return response
+
+
+def get_api_versioning(username: str, password: str) -> Versioning | None:
+    """Return the versioning for a user of the API, or None if they have no history
+    or the password isn't the one on record. As responses may be answered with a 304
+    without decrypting anything, the password is checked against the hash on record
+    first. Both are answered alike, so the API doesn't reveal who has a history.
+    """
+
+    try:
+        if Versioning.hash_for_user(username) != Versioning.hash_generic(
+            username, password, CONFIG["master_key"]
+        ):
+            return None
+    except FileNotFoundError:
+        return None
+    return Versioning(username=username, password=password, serialized=None)
+
+
+def get_history_etag(versioning: Versioning, *parts: Any) -> str:
+    """Return an ETag for a response made from the history of a user, which changes
+    whenever anything is written to the history log
+    """
+
+    return sha256(
+        bytes(
+            "\0".join(
+                str(part)
+                for part in (
+                    versioning.storage.user_hash,
+                    versioning.history_log.size(),
+                    *parts,
+                )
+            ),
+            "utf-8",
+        )
+    ).hexdigest()
+
+
+def get_what_if_columns(
+    versioning: Versioning,
+) -> tuple[int, AssignmentColumns] | None:
+    """Return the timestamp and assignment columns of the newest snapshot of a user,
+    or None if there are none. They're cached until the history changes, so a
+    calculation with the same grades decrypts nothing.
+    """
+
+    cache_key: str = get_history_etag(versioning, "what-if")
+    if (cached := WHAT_IF_COLUMNS.get(cache_key)) is not None:
+        return cached
+    if (latest := versioning.latest_history_item()) is None:
+        return None
+    cached: tuple[int, AssignmentColumns] = (
+        latest.timestamp,
+        assignment_columns(versioning.load(latest.timestamp)),
+    )
+    WHAT_IF_COLUMNS.put(cache_key, cached)
+    return cached
 
 
 def get_credentials() -> tuple[str, str, bool]:
@@ -207,6 +549,134 @@ def update_previous_page(route: str):
     session["temp_route"] = route
 
 
+### Hooks ###
+@app.url_defaults
+def add_static_hash(endpoint: str, values: dict):
+    """Add the content hash to URLs of static files (`url_for("static", ...)`)"""
+
+    if endpoint == "static" and (
+        static_hash := STATIC_HASHES.get(values.get("filename"))
+    ):
+        values.setdefault("v", static_hash)
+
+
+@app.after_request
+def add_caching(response: Response) -> Response:
+    """Cache static files requested with their current hash forever, and compress
+    responses (see `response_compression`)
+    """
+
+    if (
+        request.endpoint == "static"
+        and request.args.get("v")
+        and request.args["v"] == STATIC_HASHES.get(request.view_args.get("filename"))
+    ):
+        response.cache_control.no_cache = None
+        response.cache_control.public = True
+        response.cache_control.max_age = STATIC_MAX_AGE
+        response.cache_control.immutable = True
+    return compress_response(
+        request, response, is_allowed=not g.get("has_credentials", False)
+    )
+
+
+@app.before_request
+def start_request_timing() -> Response | None:
+    """Start timing the phases of a request (see `add_server_timing`), and profile
+    it if it was asked to be (with "?profile=1" and the profile token) or is sampled.
+    "?profile=1" without a token is served as usual, as it may be in a shared link.
+    """
+
+    start_phases()
+    g.request_start = perf_counter()
+    token: str | None = request.headers.get(PROFILE_TOKEN_HEADER)
+    g.is_profile_requested = request.args.get("profile") == "1" and token is not None
+    if g.is_profile_requested and not is_profile_authorized(token):
+        response: Response = make_response("Profiling is not allowed.", 403)
+        response.content_type = "text/plain; charset=utf-8"
+        return response
+    if g.is_profile_requested or is_sampled():
+        g.profile = start_profile()
+        if g.profile is None and g.is_profile_requested:
+            response: Response = make_response("Another request is profiled.", 503)
+            response.content_type = "text/plain; charset=utf-8"
+            return response
+    return None
+
+
+@app.after_request
+def add_server_timing(response: Response) -> Response:
+    """Add how long each phase of the request took (see `metrics.start_phases`) as a
+    "Server-Timing" header. A profiled request is answered with its profile if it
+    was asked for, otherwise the profile is logged.
+    """
+
+    timings: dict[str, float] = stop_phases()
+    if "request_start" in g:
+        timings["total"] = perf_counter() - g.request_start
+    if timings:
+        response.headers["Server-Timing"] = ", ".join(
+            f"{phase};dur={seconds * 1000:.1f}" for phase, seconds in timings.items()
+        )
+
+    if (profile := g.pop("profile", None)) is None:
+        return response
+    report: str = stop_profile(profile)
+    if not g.get("is_profile_requested"):
+        Logger.log(f"Profile of {request.method} {request.path}:\n{report}")
+        return response
+    profile_response: Response = make_response(report)
+    profile_response.content_type = "text/plain; charset=utf-8"
+    profile_response.cache_control.no_store = True
+    profile_response.headers["Server-Timing"] = response.headers.get(
+        "Server-Timing", ""
+    )
+    return profile_response
+
+
+@app.teardown_request
+def stop_request_profile(_: BaseException | None):
+    """Stop profiling a request which failed before its response was made"""
+
+    if (profile := g.pop("profile", None)) is not None:
+        stop_profile(profile)
+
+
+@template_rendered.connect_via(app)
+def note_credential_pages(_, template: Template, **__):
+    """Note that the response has credentials in it if the page echoes them"""
+
+    if template.name in CREDENTIAL_PAGES:
+        g.has_credentials = True
+
+
+### Metrics ###
+@before_render_template.connect_via(app)
+def start_render_timer(*_, **__):
+    """Note when a template starts rendering (see `record_render_time`)"""
+
+    g.render_start = perf_counter()
+
+
+@template_rendered.connect_via(app)
+def record_render_time(_, template: Template, **__):
+    """Record how long a template took to render in the metrics"""
+
+    if (start := g.pop("render_start", None)) is not None:
+        RENDER_SECONDS.observe(perf_counter() - start, template.name or "")
+
+
+@limiter.limit("1 per 1 second")
+@app.route("/metrics", methods=["GET"])
+def metrics_route():
+    """Return the metrics (see `metrics`) in the Prometheus text format"""
+
+    response: Response = make_response(render_metrics())
+    response.content_type = METRICS_CONTENT_TYPE
+    response.cache_control.no_store = True
+    return response
+
+
 ### Error handler ###
 @app.errorhandler(500)
 def error_handler(_: Exception):
@@ -264,6 +734,7 @@ def index_route():
     # be cached to prevent hitting StudentVue again.
     gradebook: Gradebook
     is_versioning_available: bool = False
+    change_record: ChangeRecord | None = None
     try:
         gradebook: Gradebook = get_gradebook(username, password)
         gradebook.grab_info()
@@ -275,43 +746,43 @@ def index_route():
             ...
         gradebook.save()
         is_versioning_available: bool = True
+        change_record: ChangeRecord | None = gradebook.versioning.latest_changes()
+        COMPACTOR.schedule(username, password)
     except InvalidCredentialsException:
         flash(INVALID_CREDENTIALS_MESSAGE)
         return redirect("/clear-cookies")
     except VersioningMismatchedCredentialsException:
         # Has the user already been through this screen but chosen to continue?
         if (
-            PASSWORD_MISMATCH_USERS.get(username) is not None
-            and PASSWORD_MISMATCH_USERS[username].choice
-            == PasswordMismatchChoice.CONTINUE
-        ):
+            information := get_password_mismatch_information(username)
+        ) is not None and information.choice == PasswordMismatchChoice.CONTINUE:
             # Allow them to continue to the login page, just without versioning
             is_versioning_available: bool = False
-            del PASSWORD_MISMATCH_USERS[username]
+            PASSWORD_MISMATCH_USERS.delete(username)
         else:
             # Show user some options
-            PASSWORD_MISMATCH_USERS[username]: PasswordMismatchChoice = (
-                PasswordMismatchInformation(
-                    old_password=None,
-                    new_password=password,
-                    choice=PasswordMismatchChoice.UNDECIDED,
+            PASSWORD_MISMATCH_USERS.set(
+                username,
+                asdict(
+                    PasswordMismatchInformation(
+                        old_password=None,
+                        new_password=password,
+                        choice=PasswordMismatchChoice.UNDECIDED,
+                    )
                 ),
-            )[0]
-            GRADEBOOKS[username] = gradebook
+            )
+            GRADEBOOKS.set(username, {"grades": gradebook.grades.to_dict()})
             return redirect("/password-mismatch")
 
     if not is_versioning_available:
         flash("Versioning is currently disabled.")
 
-    response: Response = make_response(
-        render_template(
-            GRADE_VIEWER_PAGE,
-            content=asdict(gradebook.grades),
-            past=False,
-            is_versioning_available=is_versioning_available,
-            SENTINEL_UNKNOWN_INT=SENTINEL_UNKNOWN_INT,
-            SENTINEL_UNKNOWN_STR=SENTINEL_UNKNOWN_STR,
-        )
+    response: Response = render_grade_viewer(
+        username,
+        gradebook.grades,
+        past=False,
+        is_versioning_available=is_versioning_available,
+        change_record=change_record,
     )
     response.set_cookie("username", username)
     response.set_cookie("password", password)
@@ -330,35 +801,55 @@ def past_grades_route():
         flash(INPUT_CREDENTIALS_MESSAGE)
         return redirect("/?login=true&redirect=past_grades_route")
 
-    # Get the list of passwords
     versioning: Versioning
-    versioning_list: list[VersioningItem]
     try:
         versioning: Versioning = Versioning(
             username=username, password=password, serialized=None
         )
-        versioning_list: list[VersioningItem] = versioning.list_history()
     except InvalidCredentialsException:
         flash(INVALID_CREDENTIALS_MESSAGE)
         return redirect("/?login=true")
 
-    # Show versioning list
+    # Show a page of the versioning list
     if request.method.lower() == "get":
-        # A quick function to get the course names
-        course_names: callable = lambda list_item: [
-            course["name"] for course in list_item["courses"]
-        ]
+        before: int | None
+        limit: int
+        try:
+            before: int | None = (
+                int(request.args["before"]) if "before" in request.args else None
+            )
+            limit: int = min(
+                int(request.args.get("limit", HISTORY_PAGE_SIZE)),
+                HISTORY_PAGE_MAX_SIZE,
+            )
+        except ValueError:
+            flash("Invalid page provided.")
+            return redirect("/past")
+        if limit < 1:
+            flash("Invalid page provided.")
+            return redirect("/past")
+
+        history_page: HistoryPage
+        try:
+            history_page: HistoryPage = versioning.page_history(before, limit)
+        except InvalidCredentialsException:
+            flash(INVALID_CREDENTIALS_MESSAGE)
+            return redirect("/?login=true")
+
         return render_template(
             VERSIONING_HISTORY_PAGE,
             entries=[
-                asdict(versioning_item) for versioning_item in reversed(versioning_list)
+                versioning_item.to_dict() | {"signature": signature}
+                for versioning_item, signature in zip(
+                    history_page.items, history_page.signatures
+                )
             ],
+            next_before=history_page.next_before,
+            is_first_page=before is None,
+            limit=limit,
             datetime=datetime,
             local_timezone=get_localzone(),
             SENTINEL_UNKNOWN_INT=SENTINEL_UNKNOWN_INT,
-            range=range,
-            len=len,
-            course_names=course_names,
         )
 
     # Load version
@@ -376,16 +867,146 @@ def past_grades_route():
         flash(INVALID_CREDENTIALS_MESSAGE)
         return redirect("/?login=true")
 
-    return render_template(
-        GRADE_VIEWER_PAGE,
-        content=asdict(past_grades),
-        past=True,
-        is_versioning_available=True,
-        SENTINEL_UNKNOWN_INT=SENTINEL_UNKNOWN_INT,
-        SENTINEL_UNKNOWN_STR=SENTINEL_UNKNOWN_STR,
+    return render_grade_viewer(
+        username, past_grades, past=True, is_versioning_available=True
+    )
+
+
+@limiter.limit("1 per 1 second")
+@app.route("/past/course", methods=["GET"])
+def past_course_grades_route():
+    """Return the grade of a course at every past snapshot as JSON, with unknown
+    grades as null
+    """
+
+    username, password, obtained_creds = get_credentials()
+    if not obtained_creds:
+        return jsonify(error=INPUT_CREDENTIALS_MESSAGE), 401
+    if not (course_name := request.args.get("name")):
+        return jsonify(error="No course name provided."), 400
+
+    try:
+        grade_series: GradeSeries | None = Versioning(
+            username=username, password=password, serialized=None
+        ).course_history(course_name)
+    except InvalidCredentialsException:
+        return jsonify(error=INVALID_CREDENTIALS_MESSAGE), 401
+    if grade_series is None:
+        return jsonify(error="No past grades for that course."), 404
+
+    return jsonify(
+        name=course_name,
+        timestamps=grade_series.timestamps.tolist(),
+        grades=[
+            None if grade == SENTINEL_UNKNOWN_INT else grade
+            for grade in grade_series.grades
+        ],
+    )
+
+
+@limiter.limit("1 per 1 second")
+@app.route("/past/diff", methods=["GET"])
+def past_grades_diff_route():
+    """Return what changed between the past grades at two timestamps (`?from=&to=`)
+    as JSON: added, removed, and regraded assignments, and course grade changes
+    """
+
+    username, password, obtained_creds = get_credentials()
+    if not obtained_creds:
+        return jsonify(error=INPUT_CREDENTIALS_MESSAGE), 401
+    try:
+        from_timestamp: int = int(request.args["from"])
+        to_timestamp: int = int(request.args["to"])
+    except (KeyError, ValueError):
+        return jsonify(error="Invalid timestamps provided."), 400
+
+    snapshot_diff: SnapshotDiff
+    try:
+        snapshot_diff: SnapshotDiff = Versioning(
+            username=username, password=password, serialized=None
+        ).diff(from_timestamp, to_timestamp)
+    except InvalidCredentialsException:
+        return jsonify(error=INVALID_CREDENTIALS_MESSAGE), 401
+    except FileNotFoundError:
+        return jsonify(error="No past grades at one of those times."), 404
+
+    return jsonify(
+        snapshot_diff.to_dict() | {"from": from_timestamp, "to": to_timestamp}
+    )
+
+
+@limiter.limit("1 per 3 second")
+@app.route("/past/export", methods=["GET"])
+def export_past_grades_route():
+    """Download every past gradebook, as NDJSON (`?format=ndjson`, the default) or a
+    ZIP file (`?format=zip`). The response is streamed, decrypting one gradebook at a
+    time.
+    """
+
+    username, password, obtained_creds = get_credentials()
+    if not obtained_creds:
+        flash(INPUT_CREDENTIALS_MESSAGE)
+        return redirect("/?login=true&redirect=past_grades_route")
+
+    if (export_format := request.args.get("format", "ndjson")) not in EXPORT_FORMATS:
+        flash("Invalid export format provided.")
+        return redirect("/past")
+
+    versioning: Versioning
+    history: list[VersioningItem]
+    try:
+        versioning: Versioning = Versioning(
+            username=username, password=password, serialized=None
+        )
+        history: list[VersioningItem] = versioning.list_history()
+    except InvalidCredentialsException:
+        flash(INVALID_CREDENTIALS_MESSAGE)
+        return redirect("/?login=true")
+
+    return Response(
+        export_history(versioning, history, export_format),
+        mimetype=EXPORT_FORMATS[export_format],
+        headers={
+            "Content-Disposition": "attachment; "
+            f'filename="grade-history.{export_format}"'
+        },
     )
 
 
+@limiter.limit("1 per 3 second")
+@app.route("/past/import", methods=["POST"])
+def import_past_grades_route():
+    """Add past gradebooks from an uploaded NDJSON file, such as an export"""
+
+    username, password, obtained_creds = get_credentials()
+    if not obtained_creds:
+        flash(INPUT_CREDENTIALS_MESSAGE)
+        return redirect("/?login=true&redirect=past_grades_route")
+
+    if (uploaded_file := request.files.get("file")) is None:
+        flash("No file provided.")
+        return redirect("/past")
+
+    imported: int
+    try:
+        # Nothing is written unless the whole file is valid
+        gradebooks: Iterator[GradebookInformation] = stage_gradebooks(
+            uploaded_file.stream
+        )
+        imported: int = Versioning(
+            username=username, password=password, serialized=None
+        ).import_history(gradebooks)
+    except (InvalidCredentialsException, VersioningMismatchedCredentialsException):
+        flash(INVALID_CREDENTIALS_MESSAGE)
+        return redirect("/?login=true")
+    except ImportGradesException as err:
+        flash(f"Failed to import past grades. {err}.")
+        return redirect("/past")
+
+    flash(f"Imported {imported} past grades.")
+    return redirect("/past")
+
+
 @limiter.limit("1 per 3 second")
 @app.route("/password-mismatch", methods=["GET", "POST"])
 def password_mismatch_route():
@@ -398,7 +1019,10 @@ def password_mismatch_route():
         return redirect("/?login=true&redirect=password_mismatch_route")
 
     # Validate user
-    if username not in PASSWORD_MISMATCH_USERS:
+    information: PasswordMismatchInformation | None = get_password_mismatch_information(
+        username
+    )
+    if information is None:
         flash(f"User {username} does not need to update a versioning crypt password.")
         response = make_response(redirect("/clear-cookies"))
         return response
@@ -408,13 +1032,14 @@ def password_mismatch_route():
         return render_template(PASSWORD_MISMATCH_PAGE)
 
     # Validate password
-    if password != PASSWORD_MISMATCH_USERS[username].new_password:
+    if password != information.new_password:
         flash(INVALID_CREDENTIALS_MESSAGE)
         return redirect("/?login=true")
 
     # Handle choice
     choice_made = int(request.form.get("option", 0))
-    PASSWORD_MISMATCH_USERS[username].choice = int(choice_made)
+    information.choice = int(choice_made)
+    PASSWORD_MISMATCH_USERS.set(username, asdict(information))
     if choice_made == PasswordMismatchChoice.CONTINUE:
         return redirect("/")
     if choice_made == PasswordMismatchChoice.DELETE:
@@ -437,7 +1062,10 @@ def migrate_password_route():
         return redirect("/?login=true&redirect=migrate_password_route")
 
     # Validate user
-    if username not in PASSWORD_MISMATCH_USERS:
+    information: PasswordMismatchInformation | None = get_password_mismatch_information(
+        username
+    )
+    if information is None:
         flash(f"User {username} does not need to update a versioning crypt password.")
         response = make_response(redirect("/clear-cookies"))
         return response
@@ -447,22 +1075,73 @@ def migrate_password_route():
         return render_template(MIGRATE_PASSWORD_PAGE)
 
     # Ensure the old password isn't the new password
-    new_password = PASSWORD_MISMATCH_USERS[username].new_password
+    new_password = information.new_password
     if old_password == new_password:
         flash("The new password cannot be the same as the old password")
         return redirect("/migrate-password")
 
-    # Attempt to change the user password
+    # Validate the old password before starting, as the migration runs in the
+    # background
     try:
-        GRADEBOOKS[username].versioning.migrate(old_password, new_password)
-    except (
-        VersioningMismatchedCredentialsException,
-        InvalidCredentialsException,
-    ):
+        is_old_password_valid: bool = Versioning.hash_for_user(
+            username
+        ) == Versioning.hash_generic(username, old_password, CONFIG["master_key"])
+    except FileNotFoundError:
+        is_old_password_valid: bool = False
+    if not is_old_password_valid:
         flash("Invalid old password.")
         return redirect("/migrate-password")
 
-    return redirect("/")
+    # Attempt to change the user password (unless it's already being changed)
+    if (progress := MIGRATION_PROGRESS.get(username)) is None or progress["finished"]:
+        MIGRATION_PROGRESS.set(
+            username, {"done": 0, "total": 0, "finished": False, "error": None}
+        )
+        Thread(
+            target=run_migration,
+            args=(username, old_password, new_password),
+            daemon=True,
+        ).start()
+
+    return redirect("/migrate-password/progress")
+
+
+@limiter.limit("2 per 1 second")
+@app.route("/migrate-password/progress", methods=["GET"])
+def migrate_password_progress_route():
+    """Show the progress of a password migration. With `?format=json`, the progress
+    is returned as JSON for the page to poll, with where to go once it's finished.
+    """
+
+    username, _, obtained_creds = get_credentials()
+    if not obtained_creds:
+        flash(INPUT_CREDENTIALS_MESSAGE)
+        return redirect("/?login=true")
+
+    progress: dict | None = MIGRATION_PROGRESS.get(username)
+    next_route: str | None = None
+    if progress is None:
+        next_route: str = "/"
+    elif progress["finished"]:
+        MIGRATION_PROGRESS.delete(username)
+        if progress["error"] is not None:
+            flash(progress["error"])
+            next_route: str = "/migrate-password"
+        else:
+            flash("Migrated the versioning history to the new password.")
+            next_route: str = "/"
+
+    if request.args.get("format") == "json":
+        return jsonify(
+            done=progress["done"] if progress else 0,
+            total=progress["total"] if progress else 0,
+            redirect=next_route,
+        )
+    if next_route is not None:
+        return redirect(next_route)
+    return render_template(
+        MIGRATE_PASSWORD_PROGRESS_PAGE, done=progress["done"], total=progress["total"]
+    )
 
 
 @limiter.limit("1 per 3 second")
@@ -491,10 +1170,8 @@ def delete_versioning_history_route():
     # Validate password. If the user is currently trying to fix a version history
     # crypt password mismatch, then we need to use the new password stored there.
     is_password_valid: bool | None = None
-    if username in PASSWORD_MISMATCH_USERS:
-        is_password_valid: bool = (
-            PASSWORD_MISMATCH_USERS[username].new_password == password
-        )
+    if (information := get_password_mismatch_information(username)) is not None:
+        is_password_valid: bool = information.new_password == password
     # Otherwise, we just need to compare the password hash.
     if is_password_valid is None:
         try:
@@ -511,11 +1188,7 @@ def delete_versioning_history_route():
 
     # Delete data
     Versioning.remove_user_data(username)
-    if username in PASSWORD_MISMATCH_USERS:
-        del PASSWORD_MISMATCH_USERS[username]
-    if username in GRADEBOOKS:
-        GRADEBOOKS[username].versioning = None
-        GRADEBOOKS[username].init_versioning()
+    PASSWORD_MISMATCH_USERS.delete(username)
     flash("Version history removed.")
 
     return redirect(get_previous_page())
@@ -625,30 +1298,253 @@ def source_file_route(path: str):
     """Return a file from the source code"""
 
     # Ensure path validity
-    path: Path = Path(path)
-    if (not path.exists()) or (path <= ROOT_PATH):
+    if (source_file := SOURCE_INDEX.get(path.strip("/"))) is None:
         flash(INVALID_PATH_MESSAGE)
         return redirect("/source-list")
 
-    for valid_path in SOURCE_FILES:
-        try:
-            if path.relative_to(Path(valid_path.name)) in valid_path.files:
-                break
-        except ValueError as _:  # Paths aren't relative to each other
-            continue
-    else:
-        flash(INVALID_PATH_MESSAGE)
-        return redirect("/source-list")
-
-    # Load file
+    # Send the file compressed if the browser accepts it
+    is_gzipped: bool = (
+        source_file.gzipped is not None and request.accept_encodings["gzip"] > 0
+    )
+    etag: str = source_file.gzip_etag if is_gzipped else source_file.etag
     resp: Response
-    with open(path, "r", encoding="utf-8") as source_file:
+    if etag_matches(request, etag):
+        resp: Response = Response(status=304)
+    else:
         resp: Response = Response(
-            response=source_file.read(), status=200, content_type="text/plain"
+            response=source_file.gzipped if is_gzipped else source_file.content,
+            status=200,
+            content_type="text/plain; charset=utf-8",
         )
+        if is_gzipped:
+            resp.content_encoding = "gzip"
+    resp.set_etag(etag)
+    resp.vary.add("Accept-Encoding")
+    resp.cache_control.no_cache = True
     return resp
 
 
+@limiter.limit("1 per 1 second")
+@app.route("/api/v1/grades", methods=["GET"])
+def api_grades_route():
+    """Return the current grades (see `GradebookInformation`), fetched from StudentVue
+    and saved to the versioning history like the grade viewer does
+    """
+
+    if (credentials := get_api_credentials()) is None:
+        return api_error(INPUT_CREDENTIALS_MESSAGE, 401)
+    username, password = credentials
+
+    gradebook: Gradebook = Gradebook(username, password, CONFIG["domain"])
+    try:
+        gradebook.grab_info()
+    except InvalidCredentialsException:
+        return api_error(INVALID_CREDENTIALS_MESSAGE, 401)
+    except (FetchGradesException, SerializeGradesException) as err:
+        return api_error(str(err), 502)
+    except Exception:  # pylint:disable=broad-exception-caught
+        Logger.fatal(format_exc())
+        return api_error(FETCH_FAILED_MESSAGE, 502)
+
+    # StudentVue took the password, but the history is encrypted with another one,
+    # which is resolved by logging in
+    try:
+        gradebook.init_versioning()
+        gradebook.save()
+        COMPACTOR.schedule(username, password)
+    except (InvalidCredentialsException, VersioningMismatchedCredentialsException):
+        return api_error(PASSWORD_MISMATCH_MESSAGE, 409)
+    except Exception:  # pylint:disable=broad-exception-caught
+        Logger.fatal(format_exc())
+        return api_error(SAVE_FAILED_MESSAGE, 500)
+
+    # Weak, as `last_updated` (the time the grades were fetched) isn't in the hash
+    etag: str = gradebook.grades.content_hash()
+    if etag_matches(request, etag, is_weak=True):
+        response: Response = make_response("", 304)
+    else:
+        response: Response = jsonify(gradebook.grades.to_dict())
+    response.set_etag(etag, weak=True)
+    response.cache_control.private = True
+    response.cache_control.no_cache = True
+    return response
+
+
+@limiter.limit("2 per 1 second")
+@app.route("/api/v1/history", methods=["GET"])
+def api_history_route():
+    """Return a page of version items (see `VersioningItem`), newest first, like
+    "/past" with `?before=&limit=`
+    """
+
+    if (credentials := get_api_credentials()) is None:
+        return api_error(INPUT_CREDENTIALS_MESSAGE, 401)
+    username, password = credentials
+
+    before: int | None
+    limit: int
+    try:
+        before: int | None = (
+            int(request.args["before"]) if "before" in request.args else None
+        )
+        limit: int = min(
+            int(request.args.get("limit", HISTORY_PAGE_SIZE)), HISTORY_PAGE_MAX_SIZE
+        )
+    except ValueError:
+        return api_error("Invalid page provided.", 400)
+    if limit < 1:
+        return api_error("Invalid page provided.", 400)
+
+    try:
+        if (versioning := get_api_versioning(username, password)) is None:
+            return api_error(INVALID_CREDENTIALS_OR_NO_HISTORY_MESSAGE, 401)
+        etag: str = get_history_etag(versioning, "history", before, limit)
+        if etag_matches(request, etag):
+            response: Response = make_response("", 304)
+        else:
+            history_page: HistoryPage = versioning.page_history(before, limit)
+            response: Response = jsonify(
+                items=[
+                    versioning_item.to_dict() for versioning_item in history_page.items
+                ],
+                next_before=history_page.next_before,
+            )
+    except (InvalidCredentialsException, VersioningMismatchedCredentialsException):
+        return api_error(INVALID_CREDENTIALS_MESSAGE, 401)
+
+    response.set_etag(etag)
+    response.cache_control.private = True
+    response.cache_control.no_cache = True
+    return response
+
+
+@limiter.limit("2 per 1 second")
+@app.route("/api/v1/history/<int:timestamp>", methods=["GET"])
+def api_history_item_route(timestamp: int):
+    """Return the grades (see `GradebookInformation`) at a past timestamp"""
+
+    if (credentials := get_api_credentials()) is None:
+        return api_error(INPUT_CREDENTIALS_MESSAGE, 401)
+    username, password = credentials
+
+    try:
+        if (versioning := get_api_versioning(username, password)) is None:
+            return api_error(INVALID_CREDENTIALS_OR_NO_HISTORY_MESSAGE, 401)
+        etag: str = get_history_etag(versioning, "history-item", timestamp)
+        if etag_matches(request, etag):
+            response: Response = make_response("", 304)
+        else:
+            response: Response = jsonify(versioning.load(timestamp).to_dict())
+    except (InvalidCredentialsException, VersioningMismatchedCredentialsException):
+        return api_error(INVALID_CREDENTIALS_MESSAGE, 401)
+    except FileNotFoundError:
+        return api_error("No past grades at that time.", 404)
+
+    response.set_etag(etag)
+    response.cache_control.private = True
+    response.cache_control.no_cache = True
+    return response
+
+
+@limiter.limit("2 per 1 second")
+@app.route("/api/v1/what-if", methods=["POST"])
+def api_what_if_route():
+    """Return the course grades of the newest past grades with hypothetical scores,
+    given a JSON body like
+        {
+            "scenarios": [[{"course": ..., "name": ..., "earned": 9, "possible": 10}]],
+            "required": {
+                "course": ..., "category": "Final Exam", "possible": 100,
+                "targets": [90, 80]
+            }
+        }
+    (see `HypotheticalScore`). "scenarios" are lists of scores, and their grades are
+    listed by course in the order of "courses". "required" gives the points a new
+    assignment needs for the course to get to each target grade. Grades and points
+    are null where nothing is graded or no score gets there.
+    """
+
+    if (credentials := get_api_credentials()) is None:
+        return api_error(INPUT_CREDENTIALS_MESSAGE, 401)
+    username, password = credentials
+
+    body: Any = request.get_json(silent=True)
+    if not isinstance(body, dict):
+        return api_error("Expected a JSON object.", 400)
+    scenarios: Any = body.get("scenarios", [])
+    required: Any = body.get("required")
+    try:
+        if not isinstance(scenarios, list) or not all(
+            isinstance(scores, list) for scores in scenarios
+        ):
+            raise ValueError("Expected a list of scenarios")
+        if len(scenarios) > WHAT_IF_MAX_SCENARIOS:
+            raise ValueError(f"At most {WHAT_IF_MAX_SCENARIOS} scenarios are allowed")
+        scenarios: list[list[HypotheticalScore]] = [
+            [HypotheticalScore.from_dict(score) for score in scores]
+            for scores in scenarios
+        ]
+        if required is not None:
+            if (
+                not isinstance(required, dict)
+                or not isinstance(required.get("targets"), list)
+                or len(required["targets"]) > WHAT_IF_MAX_TARGETS
+            ):
+                raise ValueError("Expected a list of target grades")
+            required_score: HypotheticalScore = HypotheticalScore.from_dict(
+                {**required, "name": None, "earned": None}
+            )
+            if required_score.possible <= 0:
+                raise ValueError("Expected points possible above 0")
+            targets: list[float] = [
+                float(target)
+                for target in required["targets"]
+                if isinstance(target, (int, float)) and not isinstance(target, bool)
+            ]
+            if len(targets) != len(required["targets"]):
+                raise ValueError("Expected a list of target grades")
+    except ValueError as err:
+        return api_error(f"{err}.", 400)
+
+    try:
+        if (versioning := get_api_versioning(username, password)) is None:
+            return api_error(INVALID_CREDENTIALS_OR_NO_HISTORY_MESSAGE, 401)
+        if (latest := get_what_if_columns(versioning)) is None:
+            return api_error(NO_HISTORY_MESSAGE, 404)
+    except (InvalidCredentialsException, VersioningMismatchedCredentialsException):
+        return api_error(INVALID_CREDENTIALS_MESSAGE, 401)
+    timestamp, columns = latest
+
+    try:
+        grades: list[list[float | None]] = [
+            [None if isnan(grade) else grade for grade in row]
+            for row in scenario_grades(columns, scenarios).tolist()
+        ]
+        points: list[float | None] | None = (
+            [
+                None if isnan(score) else score
+                for score in required_scores(
+                    columns,
+                    required_score.course,
+                    required_score.category,
+                    required_score.possible,
+                    targets,
+                ).tolist()
+            ]
+            if required is not None
+            else None
+        )
+    except KeyError as err:
+        return api_error(f"Unknown course, assignment, or category {err}.", 400)
+
+    return jsonify(
+        timestamp=timestamp,
+        courses=columns.courses,
+        scenarios=grades,
+        required=points,
+    )
+
+
 ### Run ###
 if __name__ == "__main__":
     Logger.log("Running Flask server")
@@ -0,0 +1,361 @@
+"""
+Metrics for StudentVue Data Viewer
+Licensed under the Unlicense (P.D.)
+2026-10-16
+
+Counters and latency histograms, served in the Prometheus text format on "/metrics"
+(see :func:`render`). Every thread records into its own shard of a metric, so
+recording takes no lock and doesn't contend with other threads. Shards are only
+added up when the metrics are scraped, or when their thread ends.
+
+Histograms with a phase (e.g. "fetch") also add up their time per request, for the
+"Server-Timing" header (see :func:`start_phases`). A phase's time there doesn't count
+the phases timed within it (e.g. "decrypt" within "save"), so the phases add up to
+at most the time of the request, while its histogram still has all of it.
+"""
+
+### Setup ###
+from bisect import bisect_left
+from threading import RLock, local
+from time import perf_counter
+from typing import Callable, Iterable
+from weakref import finalize
+from cache import LRUCache
+
+CONTENT_TYPE: str = "text/plain; version=0.0.4; charset=utf-8"
+# Bucket upper bounds (seconds) of latency histograms, from cache hits to StudentVue
+LATENCY_BUCKETS: tuple[float, ...] = (
+    0.0005,
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+)
+
+Labels = tuple[str, ...]
+
+# "timings" of the thread's request (see `start_phases`), and the "nested" time of
+# the phases within each phase being timed, innermost last
+_PHASES: local = local()
+
+
+### Auxiliary functions ###
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(names: Labels, values: Labels, extra: str = "") -> str:
+    """Return the label set of a sample, like `{cache="snapshot"}`"""
+
+    pairs: list[str] = [
+        f'{name}="{_escape(value)}"' for name, value in zip(names, values)
+    ]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _number(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+### Metrics ###
+class _ShardOwner:  # pylint:disable=too-few-public-methods
+    """Kept in a thread's locals, so that its shard is retired when the thread ends"""
+
+    __slots__ = ("__weakref__",)
+
+
+class _Metric:
+    """A metric whose values are kept per thread, as `{labels: value}` shards. A
+    thread's shard is merged into the retired values when the thread ends.
+    """
+
+    kind: str = ""
+
+    def __init__(self, name: str, documentation: str, label_names: Labels = ()):
+        self.name: str = name
+        self.documentation: str = documentation
+        self.label_names: Labels = label_names
+        self._local: local = local()
+        self._shards: dict[int, dict] = {}  # By id
+        self._retired: dict = {}
+        self._lock: RLock = RLock()  # Only for adding, retiring, and reading shards
+        METRICS.append(self)
+
+    def _shard(self) -> dict:
+        """Return the calling thread's shard, making it on first use"""
+
+        try:
+            return self._local.shard
+        except AttributeError:
+            shard: dict = {}
+            self._local.owner = _ShardOwner()
+            self._local.shard = shard
+            finalize(self._local.owner, self._retire, shard)
+            with self._lock:
+                self._shards[id(shard)] = shard
+            return shard
+
+    def _retire(self, shard: dict):
+        with self._lock:
+            del self._shards[id(shard)]
+            self._merge(self._retired, shard)
+
+    @staticmethod
+    def _merge(into: dict, shard: dict):
+        """Add the values of a shard to others"""
+
+        raise NotImplementedError()
+
+    def _totals(self) -> dict:
+        """Return the values of every thread added up"""
+
+        totals: dict = {}
+        with self._lock:
+            self._merge(totals, self._retired)
+            for shard in self._shards.values():
+                # Copying a dict is atomic, so its thread can keep recording into it
+                self._merge(totals, dict(shard))
+        return totals
+
+    def collect(self) -> Iterable[str]:
+        """Yield the lines of the metric in the text format"""
+
+        yield f"# HELP {self.name} {self.documentation}"
+        yield f"# TYPE {self.name} {self.kind}"
+
+
+class Counter(_Metric):
+    """A count that only goes up"""
+
+    kind: str = "counter"
+
+    def inc(self, *label_values: str, amount: float = 1):
+        """Add to the count of the label values (in the order of `label_names`)"""
+
+        shard: dict[Labels, float] = self._shard()
+        shard[label_values] = shard.get(label_values, 0) + amount
+
+    @staticmethod
+    def _merge(into: dict[Labels, float], shard: dict[Labels, float]):
+        for label_values, value in shard.items():
+            into[label_values] = into.get(label_values, 0) + value
+
+    def collect(self) -> Iterable[str]:
+        yield from super().collect()
+        for label_values, value in sorted(self._totals().items()):
+            yield f"{self.name}{_labels(self.label_names, label_values)} {_number(value)}"
+
+
+class CallbackCounter(_Metric):
+    """A count kept elsewhere (e.g. by a cache), read when the metrics are scraped"""
+
+    kind: str = "counter"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        label_names: Labels,
+        callback: Callable[[], Iterable[tuple[Labels, float]]],
+    ):
+        super().__init__(name, documentation, label_names)
+        self.callback: Callable[[], Iterable[tuple[Labels, float]]] = callback
+
+    def collect(self) -> Iterable[str]:
+        yield from super().collect()
+        for label_values, value in self.callback():
+            yield f"{self.name}{_labels(self.label_names, label_values)} {_number(value)}"
+
+
+class _Timer:
+    """Records the time spent in a `with` block into a :class:`Histogram`"""
+
+    __slots__ = ("histogram", "label_values", "start", "nested")
+
+    def __init__(self, histogram: "Histogram", label_values: Labels):
+        self.histogram: Histogram = histogram
+        self.label_values: Labels = label_values
+        self.start: float = 0.0
+        self.nested: list[float] | None = None
+
+    def __enter__(self) -> "_Timer":
+        if self.histogram.phase is not None:
+            self.nested: list[float] | None = getattr(_PHASES, "nested", None)
+            if self.nested is not None:
+                self.nested.append(0.0)
+        self.start: float = perf_counter()
+        return self
+
+    def __exit__(self, *_):
+        elapsed: float = perf_counter() - self.start
+        self.histogram.observe(
+            elapsed,
+            *self.label_values,
+            nested=self.nested.pop() if self.nested is not None else 0.0,
+        )
+
+
+class Histogram(_Metric):
+    """A distribution of values (e.g. latencies) in buckets"""
+
+    kind: str = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        label_names: Labels = (),
+        buckets: tuple[float, ...] = LATENCY_BUCKETS,
+        phase: str | None = None,
+    ):
+        super().__init__(name, documentation, label_names)
+        self.buckets: tuple[float, ...] = buckets
+        self.phase: str | None = phase  # Of requests, see `start_phases`
+
+    def observe(self, value: float, *label_values: str, nested: float = 0.0):
+        """Record a value for the label values (in the order of `label_names`). For a
+        phase, `nested` is the time of the phases within it, which isn't counted
+        towards it in the request's timings.
+        """
+
+        shard: dict[Labels, list[float]] = self._shard()
+        if (counts := shard.get(label_values)) is None:
+            # A count per bucket, then one for +Inf, then the sum
+            counts = shard[label_values] = [0] * (len(self.buckets) + 1) + [0.0]
+        counts[bisect_left(self.buckets, value)] += 1
+        counts[-1] += value
+        if (
+            self.phase is not None
+            and (timings := getattr(_PHASES, "timings", None)) is not None
+        ):
+            timings[self.phase] = timings.get(self.phase, 0.0) + value - nested
+            if _PHASES.nested:
+                _PHASES.nested[-1] += value  # Not counted towards the outer phase
+
+    def time(self, *label_values: str) -> _Timer:
+        """Return a context manager recording the time spent in it, in seconds"""
+
+        return _Timer(self, label_values)
+
+    @staticmethod
+    def _merge(into: dict[Labels, list[float]], shard: dict[Labels, list[float]]):
+        for label_values, counts in shard.items():
+            if (total := into.get(label_values)) is None:
+                into[label_values] = list(counts)
+                continue
+            for idx, count in enumerate(counts):
+                total[idx] += count
+
+    def collect(self) -> Iterable[str]:
+        yield from super().collect()
+        for label_values, counts in sorted(self._totals().items()):
+            cumulative: int = 0
+            for bound, count in zip((*self.buckets, float("inf")), counts):
+                cumulative += count
+                le: str = f'le="{"+Inf" if bound == float("inf") else bound}"'
+                labels: str = _labels(self.label_names, label_values, le)
+                yield f"{self.name}_bucket{labels} {cumulative}"
+            labels: str = _labels(self.label_names, label_values)
+            yield f"{self.name}_sum{labels} {_number(counts[-1])}"
+            yield f"{self.name}_count{labels} {cumulative}"
+
+
+### Registry ###
+METRICS: list[_Metric] = []
+CACHES: dict[str, LRUCache] = {}  # Caches counted by name (see `watch_cache`)
+
+
+def watch_cache(name: str, cache: LRUCache):
+    """Count the hits and misses of a cache, which it keeps itself"""
+
+    CACHES[name] = cache
+
+
+def start_phases():
+    """Start adding up the time of each phase in the calling thread (e.g. for a
+    request), until :func:`stop_phases`
+    """
+
+    _PHASES.timings = {}
+    _PHASES.nested = []
+
+
+def stop_phases() -> dict[str, float]:
+    """Return the seconds spent in each phase since :func:`start_phases`, in the
+    order the phases were first reached
+    """
+
+    timings: dict[str, float] = getattr(_PHASES, "timings", None) or {}
+    _PHASES.timings = None
+    _PHASES.nested = None
+    return timings
+
+
+def render() -> str:
+    """Return every metric in the Prometheus text format"""
+
+    return "\n".join(line for metric in METRICS for line in metric.collect()) + "\n"
+
+
+FETCH_SECONDS: Histogram = Histogram(
+    "studentvue_fetch_seconds",
+    "Time to get a gradebook from StudentVue",
+    phase="fetch",
+)
+SERIALIZE_SECONDS: Histogram = Histogram(
+    "gradebook_serialize_seconds",
+    "Time to serialize a gradebook's XML",
+    phase="serialize",
+)
+KDF_SECONDS: Histogram = Histogram(
+    "versioning_kdf_seconds",
+    "Time to derive a versioning key (on key cache misses)",
+    phase="kdf",
+)
+ENCRYPT_SECONDS: Histogram = Histogram(
+    "fernet_encrypt_seconds", "Time to encrypt versioning data with Fernet"
+)
+DECRYPT_SECONDS: Histogram = Histogram(
+    "fernet_decrypt_seconds",
+    "Time to decrypt versioning data with Fernet",
+    phase="decrypt",
+)
+SAVE_SECONDS: Histogram = Histogram(
+    "gradebook_save_seconds",
+    "Time to save a gradebook to the versioning history",
+    phase="save",
+)
+RENDER_SECONDS: Histogram = Histogram(
+    "template_render_seconds",
+    "Time to render a page template",
+    ("template",),
+    phase="render",
+)
+UPSTREAM_ERRORS: Counter = Counter(
+    "studentvue_errors_total",
+    "Failures getting or reading a gradebook from StudentVue",
+    ("error",),
+)
+CACHE_HITS: CallbackCounter = CallbackCounter(
+    "cache_hits_total",
+    "Lookups found in a cache",
+    ("cache",),
+    lambda: [((name,), cache.hits) for name, cache in sorted(CACHES.items())],
+)
+CACHE_MISSES: CallbackCounter = CallbackCounter(
+    "cache_misses_total",
+    "Lookups not found in a cache",
+    ("cache",),
+    lambda: [((name,), cache.misses) for name, cache in sorted(CACHES.items())],
+)
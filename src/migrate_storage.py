@@ -0,0 +1,57 @@
+"""
+Versioning storage migration for StudentVue Data Viewer
+Licensed under the Unlicense (P.D.)
+2026-10-16
+
+Copies every user's versioning data from one storage engine to another, e.g.
+    python3 src/migrate_storage.py directory sqlite
+and then set "storage_engine" in the config to the new engine. Nothing is removed
+from the old engine. The data stays encrypted, so no passwords are needed.
+"""
+
+### Setup ###
+from argparse import ArgumentParser, Namespace
+from pathlib import Path
+from storage import StorageEngine, create_storage_engine, copy_user
+from common import Logger
+
+ENGINES: tuple[str, ...] = ("directory", "sqlite")
+
+
+### Migrate ###
+def migrate_storage(source: StorageEngine, destination: StorageEngine) -> int:
+    """Copy every user from one engine to another, returning how many were copied"""
+
+    user_hashes: list[str] = source.user_hashes()
+    for idx, user_hash in enumerate(user_hashes):
+        copy_user(source.user(user_hash), destination.user(user_hash))
+        Logger.log(f"Copied user {idx + 1}/{len(user_hashes)}")
+    return len(user_hashes)
+
+
+def main():
+    """Migrate with the engines from the command line"""
+
+    parser: ArgumentParser = ArgumentParser(
+        description="Copy every user's versioning data to another storage engine"
+    )
+    parser.add_argument("source", choices=ENGINES)
+    parser.add_argument("destination", choices=ENGINES)
+    parser.add_argument(
+        "--source-path", type=Path, help="Versioning directory or SQLite database"
+    )
+    parser.add_argument(
+        "--destination-path", type=Path, help="Versioning directory or SQLite database"
+    )
+    args: Namespace = parser.parse_args()
+
+    source: StorageEngine = create_storage_engine(args.source, args.source_path)
+    destination: StorageEngine = create_storage_engine(
+        args.destination, args.destination_path
+    )
+    Logger.log(f"Migrated {migrate_storage(source, destination)} users")
+
+
+### Run ###
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+"""
+Request profiling for StudentVue Data Viewer
+Licensed under the Unlicense (P.D.)
+2026-10-16
+
+Runs requests under cProfile, either when asked to with "?profile=1" (and the
+"profile_token" from the config in an "X-Profile-Token" header), or for a sample of
+every request ("profile_sample_rate" in the config, e.g. 0.01 for 1%). Only one
+request is profiled at a time, as profiling slows the server down.
+"""
+
+### Setup ###
+from cProfile import Profile
+from hmac import compare_digest
+from io import StringIO
+from pstats import SortKey, Stats
+from random import random
+from threading import Lock
+from config_parser import parse
+
+TOP_FUNCTIONS: int = 30  # Functions listed in a profile report
+PROFILE_TOKEN_HEADER: str = "X-Profile-Token"
+
+_PROFILE_LOCK: Lock = Lock()  # Held while a request is profiled
+
+
+### Sampling ###
+def is_profile_authorized(token: str | None) -> bool:
+    """Returns if a profile token is the one in the config. Nobody is authorized if
+    there's no token in the config.
+    """
+
+    expected: str | None = parse().get("profile_token")
+    return (
+        expected is not None
+        and token is not None
+        and compare_digest(bytes(token, "utf-8"), bytes(expected, "utf-8"))
+    )
+
+
+def is_sampled() -> bool:
+    """Returns if a request should be profiled by the sample rate in the config"""
+
+    return random() < parse().get("profile_sample_rate", 0)
+
+
+### Profiling ###
+def start_profile() -> Profile | None:
+    """Start profiling the calling thread, or return None if another request is
+    being profiled
+    """
+
+    if not _PROFILE_LOCK.acquire(blocking=False):
+        return None
+    profile: Profile = Profile()
+    try:
+        profile.enable()
+    except ValueError:  # Another profiler is active (e.g. the server is profiled)
+        _PROFILE_LOCK.release()
+        return None
+    return profile
+
+
+def stop_profile(profile: Profile) -> str:
+    """Stop a profile (see :func:`start_profile`), returning a report of the
+    functions that took the most time (not counting the functions they called)
+    """
+
+    profile.disable()
+    _PROFILE_LOCK.release()
+    report: StringIO = StringIO()
+    Stats(profile, stream=report).strip_dirs().sort_stats(SortKey.TIME).print_stats(
+        TOP_FUNCTIONS
+    )
+    return report.getvalue()
@@ -0,0 +1,151 @@
+"""
+Response compression for StudentVue Data Viewer
+Licensed under the Unlicense (P.D.)
+2026-10-16
+"""
+
+### Setup ###
+from gzip import compress as gzip_compress
+from flask import Request, Response
+
+try:
+    from brotli import compress as brotli_compress  # Optional
+except ImportError:
+    brotli_compress = None
+
+MIN_COMPRESSED_SIZE: int = 512  # Bytes, smaller responses are sent as they are
+GZIP_LEVEL: int = 6
+BROTLI_QUALITY: int = 5  # Fast enough for pages rendered on every request
+COMPRESSIBLE_MIMETYPES: tuple[str, ...] = (
+    "application/javascript",
+    "application/json",
+    "application/x-ndjson",
+    "image/svg+xml",
+)
+# Headers a 304 has in common with the response it's in place of
+NOT_MODIFIED_HEADERS: tuple[str, ...] = (
+    "Cache-Control",
+    "Content-Location",
+    "Expires",
+    "Last-Modified",
+    "Vary",
+)
+
+
+### Compression ###
+def encodings() -> tuple[str, ...]:
+    """Return the content encodings responses can be compressed with, best first"""
+
+    return ("br", "gzip") if brotli_compress is not None else ("gzip",)
+
+
+def _matching_etag(request: Request, etag: str) -> str | None:
+    """Return the strong ETag in the request's If-None-Match, as it is or as it was
+    changed by :func:`compress_response`, or None if it isn't there
+    """
+
+    return next(
+        (
+            candidate
+            for candidate in (
+                etag,
+                *(f"{etag}-{encoding}" for encoding in encodings()),
+            )
+            if candidate in request.if_none_match
+        ),
+        None,
+    )
+
+
+def etag_matches(request: Request, etag: str, is_weak: bool = False) -> bool:
+    """Return if the request's If-None-Match has the ETag, as it is or as it was
+    changed by :func:`compress_response` (which leaves weak ETags as they are)
+    """
+
+    if is_weak:
+        return request.if_none_match.contains_weak(etag)
+    return _matching_etag(request, etag) is not None
+
+
+def _not_modified(response: Response, etag: str) -> Response:
+    """Return a 304 in place of a response the browser has with the ETag"""
+
+    not_modified: Response = Response(status=304)
+    for header in NOT_MODIFIED_HEADERS:
+        if header in response.headers:
+            not_modified.headers[header] = response.headers[header]
+    not_modified.set_etag(etag)
+    response.close()  # E.g. a static file being passed through
+    return not_modified
+
+
+def compress_response(
+    request: Request, response: Response, is_allowed: bool = True
+) -> Response:
+    """Compress a response with the best encoding the browser accepts, if it's text
+    and large enough. A strong ETag gets the encoding appended, as the compressed
+    body is a different representation (see :func:`etag_matches`), and a response
+    whose compressed form the browser already has becomes a 304.
+
+    Responses that echo secrets next to what a user sent (e.g. a login form filled in
+    with the password) must not be compressed (`is_allowed`), as the compressed size
+    would give the secret away (BREACH).
+
+    A 304 gets the ETag of the representation the browser has (e.g. compressed), as
+    the response it's in place of did.
+    """
+
+    etag, is_weak = response.get_etag()
+    if response.status_code == 304 and etag is not None and not is_weak:
+        response.set_etag(_matching_etag(request, etag) or etag)
+        response.vary.add("Accept-Encoding")
+        return response
+
+    if not is_allowed or not (
+        response.mimetype.startswith("text/")
+        or response.mimetype in COMPRESSIBLE_MIMETYPES
+    ):
+        return response
+    response.vary.add("Accept-Encoding")
+    # Files (e.g. static files) are passed through as streams, but are read here
+    if (
+        response.status_code != 200
+        or (response.is_streamed and not response.direct_passthrough)
+        or "Content-Encoding" in response.headers
+    ):
+        return response
+
+    encoding: str | None = next(
+        (
+            encoding
+            for encoding in encodings()
+            if request.accept_encodings[encoding] > 0
+        ),
+        None,
+    )
+    if encoding is None:
+        return response
+
+    # Files (e.g. static files) are checked against the ETag by Flask before it's
+    # changed here, so a revalidation of their compressed form is only matched here
+    if (
+        etag is not None
+        and not is_weak
+        and f"{etag}-{encoding}" in request.if_none_match
+    ):
+        return _not_modified(response, f"{etag}-{encoding}")
+
+    response.direct_passthrough = False
+    data: bytes = response.get_data()
+    if len(data) < MIN_COMPRESSED_SIZE:
+        return response
+    response.set_data(
+        brotli_compress(data, quality=BROTLI_QUALITY)
+        if encoding == "br"
+        else gzip_compress(data, compresslevel=GZIP_LEVEL)
+    )
+    response.content_encoding = encoding
+
+    if etag is not None and not is_weak:
+        response.set_etag(f"{etag}-{encoding}")
+    return response
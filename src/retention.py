@@ -0,0 +1,174 @@
+"""
+History retention for StudentVue Data Viewer
+Licensed under the Unlicense (P.D.)
+2026-10-16
+
+Thins out old snapshots by the "retention" policy in the config, a list of tiers:
+    "retention": [
+        {"after_days": 7, "keep_one_per_days": 1},
+        {"after_days": 90, "keep_one_per_days": 7}
+    ]
+keeps everything for 7 days, then one snapshot per day up to 90 days, then one per
+week. The newest snapshot of each period is kept. Since snapshots are encrypted with
+the user's password, the policy is enforced by a background :class:`Compactor` for
+users as they log in.
+"""
+
+### Setup ###
+from dataclasses import dataclass
+from queue import Queue
+from threading import Lock, Thread
+from time import time
+from config_parser import parse
+from common import Logger
+from versioning import Versioning, VersioningItem
+from tools import InvalidCredentialsException, VersioningMismatchedCredentialsException
+
+SECONDS_PER_DAY: int = 24 * 60 * 60
+COMPACTION_INTERVAL: int = SECONDS_PER_DAY  # Seconds between passes for a user
+
+
+### Dataclasses ###
+@dataclass(slots=True)
+class RetentionTier:
+    """Snapshots older than `after_days` are thinned to one per `keep_one_per_days`"""
+
+    after_days: int
+    keep_one_per_days: int
+
+
+@dataclass(slots=True)
+class RetentionResult:
+    """What a compaction pass freed"""
+
+    files: int
+    bytes: int
+
+
+### Policy ###
+def retention_policy() -> list[RetentionTier]:
+    """Return the tiers of the "retention" config option, the tier for the oldest
+    snapshots first. An empty policy keeps everything.
+    """
+
+    return sorted(
+        (
+            RetentionTier(tier["after_days"], tier["keep_one_per_days"])
+            for tier in parse().get("retention", [])
+        ),
+        key=lambda tier: tier.after_days,
+        reverse=True,
+    )
+
+
+def expired_timestamps(
+    history: list[VersioningItem], policy: list[RetentionTier], now: float
+) -> set[int]:
+    """Return the timestamps of the version items the policy (see
+    :func:`retention_policy`) does not keep. The newest item is always kept, as the
+    next snapshot is compared against it.
+    """
+
+    if not policy or not history:
+        return set()
+
+    newest_timestamp: int = max(
+        versioning_item.timestamp for versioning_item in history
+    )
+    kept_periods: set[tuple[int, int]] = set()
+    expired: set[int] = set()
+    for versioning_item in sorted(
+        history, key=lambda versioning_item: versioning_item.timestamp, reverse=True
+    ):
+        age: float = now - versioning_item.timestamp
+        for tier_idx, tier in enumerate(policy):
+            if age < tier.after_days * SECONDS_PER_DAY:
+                continue
+            period: tuple[int, int] = (
+                tier_idx,
+                versioning_item.timestamp // (tier.keep_one_per_days * SECONDS_PER_DAY),
+            )
+            if period in kept_periods and versioning_item.timestamp != newest_timestamp:
+                expired.add(versioning_item.timestamp)
+            kept_periods.add(period)
+            break
+    return expired
+
+
+def apply_retention(
+    versioning: Versioning, policy: list[RetentionTier], now: float | None = None
+) -> RetentionResult:
+    """Remove the snapshots of a user that the policy does not keep. The user's lock
+    is held throughout, so requests don't read the history while it's rewritten.
+    """
+
+    with versioning.lock:
+        files, freed_bytes = versioning.remove_gradebook_entries(
+            expired_timestamps(
+                versioning.list_history(), policy, time() if now is None else now
+            )
+        )
+    return RetentionResult(files, freed_bytes)
+
+
+### Compactor ###
+class Compactor:
+    """Applies the retention policy in a background thread, at most once every
+    :data:`COMPACTION_INTERVAL` per user. Users are queued as they log in, as their
+    snapshots can only be rebased with their key. Their passwords are only kept
+    until their pass starts.
+    """
+
+    def __init__(self, policy: list[RetentionTier]):
+        self.policy: list[RetentionTier] = policy
+        self._queue: Queue[str] = Queue()  # Usernames
+        self._passwords: dict[str, str] = {}  # Of the queued users
+        self._last_compacted: dict[str, float] = {}  # Within the interval
+        self._lock: Lock = Lock()
+        self._thread: Thread | None = None
+
+    def schedule(self, username: str, password: str):
+        """Queue a pass for a user, unless there's no policy or one ran recently"""
+
+        if not self.policy:
+            return
+        now: float = time()
+        with self._lock:
+            if now - self._last_compacted.get(username, 0) < COMPACTION_INTERVAL:
+                return
+            # Users compacted before the interval can be queued again anyway
+            self._last_compacted = {
+                other_username: compacted
+                for other_username, compacted in self._last_compacted.items()
+                if now - compacted < COMPACTION_INTERVAL
+            }
+            self._last_compacted[username] = now
+            self._passwords[username] = password
+            if self._thread is None:
+                self._thread = Thread(target=self._run, daemon=True)
+                self._thread.start()
+        self._queue.put(username)
+
+    def _run(self):
+        while True:
+            username: str = self._queue.get()
+            with self._lock:
+                password: str | None = self._passwords.pop(username, None)
+            if password is None:
+                continue
+            try:
+                result: RetentionResult = apply_retention(
+                    Versioning(username, password), self.policy
+                )
+            except (
+                InvalidCredentialsException,
+                VersioningMismatchedCredentialsException,
+            ):
+                continue  # A password mismatch is for the user to resolve
+            except Exception as err:  # pylint:disable=broad-exception-caught
+                Logger.fatal(f"Compaction failed: {Logger.log_error(err)}")
+                continue
+            if result.files:
+                Logger.log(
+                    f"Compaction freed {result.files} snapshots ({result.bytes} bytes)"
+                )
@@ -0,0 +1,123 @@
+"""
+Snapshot deltas for StudentVue Data Viewer
+Licensed under the Unlicense (P.D.)
+2026-10-16
+"""
+
+### Setup ###
+from collections import defaultdict, deque
+from json import dumps
+
+# A delta is stored as
+# {
+#     "last_updated": <int>,
+#     "courses": [
+#         <int>,  # Course at this index of the base, unchanged
+#         {"course": {...}},  # Added course
+#         {  # Changed course
+#             "base": <int>,  # Index of the course in the base
+#             "fields": {...},  # Fields (other than "assignments") that changed
+#             "assignments": [  # Only present if the assignments changed
+#                 [<start>, <stop>],  # Slice of the base course's assignments
+#                 {...},  # Added or changed assignment
+#             ],
+#         },
+#     ],
+# }
+# Courses and assignments of the base that are not referenced were removed.
+
+
+### Auxiliary functions ###
+def _assignment_key(assignment: dict) -> str:
+    return dumps(assignment, sort_keys=True)
+
+
+def _delta_assignments(old: list[dict], new: list[dict]) -> list[list[int] | dict]:
+    """Encode the new assignments as slices of the old ones and literal assignments"""
+
+    available: defaultdict[str, deque[int]] = defaultdict(deque)
+    for idx, assignment in enumerate(old):
+        available[_assignment_key(assignment)].append(idx)
+
+    operations: list[list[int] | dict] = []
+    for assignment in new:
+        old_indices: deque[int] = available[_assignment_key(assignment)]
+        if not old_indices:
+            operations.append(assignment)
+            continue
+        idx: int = old_indices.popleft()
+        # Extend the previous slice if this assignment follows it
+        if operations and isinstance(operations[-1], list) and operations[-1][1] == idx:
+            operations[-1][1] = idx + 1
+        else:
+            operations.append([idx, idx + 1])
+
+    return operations
+
+
+### Deltas ###
+def compute_delta(old: dict, new: dict) -> dict:
+    """Return the delta which turns the `old` serialized gradebook into the `new` one"""
+
+    available: defaultdict[str, deque[int]] = defaultdict(deque)
+    for idx, course in enumerate(old["courses"]):
+        available[course["name"]].append(idx)
+
+    courses: list[int | dict] = []
+    for course in new["courses"]:
+        old_indices: deque[int] = available[course["name"]]
+        if not old_indices:
+            courses.append({"course": course})
+            continue
+        idx: int = old_indices.popleft()
+        old_course: dict = old["courses"][idx]
+        if course == old_course:
+            courses.append(idx)
+            continue
+
+        changed: dict = {
+            "base": idx,
+            "fields": {
+                key: value
+                for key, value in course.items()
+                if key != "assignments"
+                and (key not in old_course or old_course[key] != value)
+            },
+        }
+        if course["assignments"] != old_course["assignments"]:
+            changed["assignments"] = _delta_assignments(
+                old_course["assignments"], course["assignments"]
+            )
+        courses.append(changed)
+
+    return {"last_updated": new["last_updated"], "courses": courses}
+
+
+def apply_delta(old: dict, delta: dict) -> dict:
+    """Return the serialized gradebook from applying the delta to the `old` one. The
+    `old` gradebook is not modified, though unchanged parts of it are shared.
+    """
+
+    courses: list[dict] = []
+    for operation in delta["courses"]:
+        if isinstance(operation, int):
+            courses.append(old["courses"][operation])
+            continue
+        if "course" in operation:
+            courses.append(operation["course"])
+            continue
+
+        course: dict = dict(old["courses"][operation["base"]])
+        course.update(operation["fields"])
+        if "assignments" in operation:
+            old_assignments: list[dict] = course["assignments"]
+            course["assignments"] = []
+            for assignment_operation in operation["assignments"]:
+                if isinstance(assignment_operation, list):
+                    start, stop = assignment_operation
+                    course["assignments"].extend(old_assignments[start:stop])
+                else:
+                    course["assignments"].append(assignment_operation)
+        courses.append(course)
+
+    return {"last_updated": delta["last_updated"], "courses": courses}
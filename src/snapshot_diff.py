@@ -0,0 +1,189 @@
+"""
+Snapshot diffs for StudentVue Data Viewer
+Licensed under the Unlicense (P.D.)
+2026-10-16
+"""
+
+### Setup ###
+from collections import defaultdict
+from dataclasses import dataclass, field
+from typing import Optional
+
+# An assignment is matched across snapshots by its course name, name, and due date
+AssignmentKey = tuple[str, str, str]
+
+
+### Dataclasses ###
+@dataclass(slots=True)
+class AssignmentChange:
+    """An assignment that was added, removed, or regraded between two snapshots"""
+
+    course: str
+    name: str
+    due_date: str
+    old_grade: Optional[str] = None  # None if added
+    new_grade: Optional[str] = None  # None if removed
+    old_points: Optional[str] = None
+    new_points: Optional[str] = None
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "AssignmentChange":
+        """Decode from the serialized form"""
+
+        return cls(
+            data["course"],
+            data["name"],
+            data["due_date"],
+            data["old_grade"],
+            data["new_grade"],
+            data["old_points"],
+            data["new_points"],
+        )
+
+    def to_dict(self) -> dict:
+        """Encode into the serialized form"""
+
+        return {
+            "course": self.course,
+            "name": self.name,
+            "due_date": self.due_date,
+            "old_grade": self.old_grade,
+            "new_grade": self.new_grade,
+            "old_points": self.old_points,
+            "new_points": self.new_points,
+        }
+
+
+@dataclass(slots=True)
+class CourseGradeChange:
+    """A course whose grade changed between two snapshots"""
+
+    course: str
+    old_grade: Optional[int]  # None if the course was added
+    new_grade: Optional[int]  # None if the course was removed
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "CourseGradeChange":
+        """Decode from the serialized form"""
+
+        return cls(data["course"], data["old_grade"], data["new_grade"])
+
+    def to_dict(self) -> dict:
+        """Encode into the serialized form"""
+
+        return {
+            "course": self.course,
+            "old_grade": self.old_grade,
+            "new_grade": self.new_grade,
+        }
+
+
+@dataclass(slots=True)
+class SnapshotDiff:
+    """What changed from one snapshot to another"""
+
+    added: list[AssignmentChange] = field(default_factory=list)
+    removed: list[AssignmentChange] = field(default_factory=list)
+    regraded: list[AssignmentChange] = field(default_factory=list)
+    grades: list[CourseGradeChange] = field(default_factory=list)
+
+    def __bool__(self) -> bool:
+        return bool(self.added or self.removed or self.regraded or self.grades)
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "SnapshotDiff":
+        """Decode from the serialized form"""
+
+        return cls(
+            [AssignmentChange.from_dict(change) for change in data["added"]],
+            [AssignmentChange.from_dict(change) for change in data["removed"]],
+            [AssignmentChange.from_dict(change) for change in data["regraded"]],
+            [CourseGradeChange.from_dict(change) for change in data["grades"]],
+        )
+
+    def to_dict(self) -> dict:
+        """Encode into the serialized form"""
+
+        return {
+            "added": [change.to_dict() for change in self.added],
+            "removed": [change.to_dict() for change in self.removed],
+            "regraded": [change.to_dict() for change in self.regraded],
+            "grades": [change.to_dict() for change in self.grades],
+        }
+
+
+### Diffs ###
+def _assignments_by_key(gradebook: dict) -> defaultdict[AssignmentKey, list[dict]]:
+    """Return the assignments of a serialized gradebook by their key, in order, as a
+    course may have more than one assignment with the same key
+    """
+
+    assignments: defaultdict[AssignmentKey, list[dict]] = defaultdict(list)
+    for course in gradebook["courses"]:
+        for assignment in course["assignments"]:
+            assignments[
+                (course["name"], assignment["name"], assignment["due_date"])
+            ].append(assignment)
+    return assignments
+
+
+def diff_snapshots(old: dict, new: dict) -> SnapshotDiff:
+    """Return what changed from the `old` serialized gradebook to the `new` one.
+    Assignments are matched by their key (see :data:`AssignmentKey`) in one pass
+    over each gradebook.
+    """
+
+    diff: SnapshotDiff = SnapshotDiff()
+    old_assignments: defaultdict[AssignmentKey, list[dict]] = _assignments_by_key(old)
+    new_assignments: defaultdict[AssignmentKey, list[dict]] = _assignments_by_key(new)
+
+    for key, assignments in new_assignments.items():
+        old_matches: list[dict] = old_assignments.get(key, [])
+        for idx, assignment in enumerate(assignments):
+            if idx >= len(old_matches):
+                diff.added.append(
+                    AssignmentChange(
+                        *key,
+                        new_grade=assignment["grade"],
+                        new_points=assignment["points"],
+                    )
+                )
+                continue
+            old_assignment: dict = old_matches[idx]
+            if (old_assignment["grade"], old_assignment["points"]) != (
+                assignment["grade"],
+                assignment["points"],
+            ):
+                diff.regraded.append(
+                    AssignmentChange(
+                        *key,
+                        old_grade=old_assignment["grade"],
+                        new_grade=assignment["grade"],
+                        old_points=old_assignment["points"],
+                        new_points=assignment["points"],
+                    )
+                )
+    for key, assignments in old_assignments.items():
+        for assignment in assignments[len(new_assignments.get(key, [])) :]:
+            diff.removed.append(
+                AssignmentChange(
+                    *key,
+                    old_grade=assignment["grade"],
+                    old_points=assignment["points"],
+                )
+            )
+
+    old_grades: dict[str, int] = {
+        course["name"]: course["grade"] for course in old["courses"]
+    }
+    new_grades: dict[str, int] = {
+        course["name"]: course["grade"] for course in new["courses"]
+    }
+    for name, grade in new_grades.items():
+        if old_grades.get(name) != grade:
+            diff.grades.append(CourseGradeChange(name, old_grades.get(name), grade))
+    for name, grade in old_grades.items():
+        if name not in new_grades:
+            diff.grades.append(CourseGradeChange(name, grade, None))
+
+    return diff
@@ -0,0 +1,382 @@
+"""
+Binary snapshot format for StudentVue Data Viewer
+Licensed under the Unlicense (P.D.)
+2026-10-16
+"""
+
+### Setup ###
+from array import array
+from json import loads
+from struct import Struct
+from sys import byteorder
+from typing import Any, Callable, Optional
+
+# Version of the serialized gradebook's shape (see `gradebook.GradebookInformation`).
+# Version 0 is the JSON of the dataclasses from before this format existed.
+#
+# To change the shape: bump this, add a reader for the new binary layout to
+# `READERS`, and add an upgrade from the previous shape to `UPGRADES`. Upgrades must
+# only fill in what's missing (be idempotent), since a snapshot delta can mix
+# courses of an older shape with courses that were already upgraded.
+SCHEMA_VERSION: int = 2
+
+# Layout (version 2), all integers little-endian:
+#   HEADER (MAGIC, schema version, flags)
+#   varint string table length, then the UTF-8 strings joined by NUL bytes
+#   value last_updated, varint course count, then each course:
+#     string name, value grade, string teacher, value period, string room,
+#     varint weight count, then each weight as string name + value weight,
+#     varint assignment count, then the assignments' string indices packed as
+#     2 byte (or 4 with `FLAG_WIDE_INDICES`) integers, `ASSIGNMENT_FIELDS` at a time,
+#     then each assignment's `ASSIGNMENT_NUMBERS` as values
+# "string" is a varint index into the strings, and "value" is a tag byte followed by
+# the value (see `Tag`). Version 1 is the same without `ASSIGNMENT_NUMBERS`.
+MAGIC: bytes = b"SSVB"
+HEADER: Struct = Struct("<4sBB")
+FLAG_WIDE_INDICES: int = 0b1
+ASSIGNMENT_FIELDS: tuple[str, ...] = (
+    "name",
+    "assigned_date",
+    "due_date",
+    "weight",
+    "grade",
+    "points",
+)
+ASSIGNMENT_NUMBERS: tuple[str, ...] = ("earned", "possible")  # Parsed from "points"
+FLOAT: Struct = Struct("<d")
+
+
+class Tag:  # pylint:disable=too-few-public-methods
+    """Tag bytes of a value"""
+
+    NONE: int = 0
+    INT: int = 1  # Zigzag varint
+    FLOAT: int = 2  # 8 byte double
+    STRING: int = 3  # Varint string index
+    FALSE: int = 4
+    TRUE: int = 5
+
+
+### Points ###
+def parse_points(points: str) -> tuple[Optional[float], Optional[float]]:
+    """Return the points earned and possible of an assignment's points, which are
+    like "0.39 / 1.0000" when graded and "1.0000 Points Possible" when not. Either is
+    None if it's not known.
+    """
+
+    earned: str
+    possible: str
+    if "/" in points:
+        earned, _, possible = points.partition("/")
+    else:
+        earned, possible = "", points.removesuffix("Points Possible")
+    return _parse_number(earned), _parse_number(possible)
+
+
+def _parse_number(value: str) -> Optional[float]:
+    try:
+        number: float = float(value.strip())
+    except ValueError:
+        return None
+    return number if float("-inf") < number < float("inf") else None
+
+
+def _upgrade_version_1(gradebook_dict: dict) -> dict:
+    """Add the points earned and possible (see :func:`parse_points`) to assignments"""
+
+    for course in gradebook_dict["courses"]:
+        for assignment in course["assignments"]:
+            if "earned" not in assignment:
+                assignment["earned"], assignment["possible"] = parse_points(
+                    assignment["points"]
+                )
+    return gradebook_dict
+
+
+### Encoding ###
+class _Writer:
+    """Writes the body of a snapshot while interning strings"""
+
+    def __init__(self):
+        self.strings: dict[str, int] = {}
+        self.body: bytearray = bytearray()
+
+    def string_index(self, value: str) -> int:
+        """Return the index of a string in the string table, adding it if needed"""
+
+        if not isinstance(value, str) or "\0" in value:
+            raise TypeError(f"Expected a string without NUL bytes, got {value!r}")
+        if (index := self.strings.get(value)) is None:
+            index = self.strings[value] = len(self.strings)
+        return index
+
+    def varint(self, value: int):
+        """Write an unsigned LEB128 integer"""
+
+        while value > 0x7F:
+            self.body.append((value & 0x7F) | 0x80)
+            value >>= 7
+        self.body.append(value)
+
+    def string(self, value: str):
+        """Write a string as its index"""
+
+        self.varint(self.string_index(value))
+
+    def value(self, value: Any):
+        """Write a tagged value"""
+
+        if value is None:
+            self.body.append(Tag.NONE)
+        elif isinstance(value, bool):
+            self.body.append(Tag.TRUE if value else Tag.FALSE)
+        elif isinstance(value, int):
+            self.body.append(Tag.INT)
+            self.varint(value * 2 if value >= 0 else -value * 2 - 1)  # Zigzag
+        elif isinstance(value, float):
+            self.body.append(Tag.FLOAT)
+            self.body += FLOAT.pack(value)
+        else:
+            self.body.append(Tag.STRING)
+            self.string(value)
+
+    def number(self, value: Optional[float]):
+        """Write a number (or None) as a value, as an integer if it's a whole number,
+        which is read back as a float
+        """
+
+        if value is None:
+            self.value(None)
+            return
+        if not isinstance(value, (int, float)) or isinstance(value, bool):
+            raise TypeError(f"Expected a number or None, got {value!r}")
+        value: float = float(value)
+        self.value(int(value) if value.is_integer() else value)
+
+
+def encode(gradebook_dict: dict) -> bytes:
+    """Encode a serialized gradebook (of the current schema). Raises `TypeError` if
+    the gradebook doesn't fit the schema.
+    """
+
+    writer: _Writer = _Writer()
+    writer.value(gradebook_dict["last_updated"])
+    writer.varint(len(gradebook_dict["courses"]))
+    assignment_blocks: list[tuple[int, list[int]]] = []  # (Offset in body, indices)
+    for course in gradebook_dict["courses"]:
+        writer.string(course["name"])
+        writer.value(course["grade"])
+        writer.string(course["teacher"])
+        writer.value(course["period"])
+        writer.string(course["room"])
+        writer.varint(len(course["weights"]))
+        for name, weight in course["weights"].items():
+            writer.string(name)
+            writer.value(weight)
+        writer.varint(len(course["assignments"]))
+        indices: list[int] = [
+            writer.string_index(assignment[field])
+            for assignment in course["assignments"]
+            for field in ASSIGNMENT_FIELDS
+        ]
+        # The width is only known once every string is interned, so the assignments
+        # are put in place afterwards
+        assignment_blocks.append((len(writer.body), indices))
+        for assignment in course["assignments"]:
+            for field in ASSIGNMENT_NUMBERS:
+                writer.number(assignment[field])
+
+    flags: int = 0
+    typecode: str = "H"
+    if len(writer.strings) > 0xFFFF:
+        flags |= FLAG_WIDE_INDICES
+        typecode = "I"
+    body: bytearray = bytearray()
+    previous_offset: int = 0
+    for offset, indices in assignment_blocks:
+        packed: array = array(typecode, indices)
+        if byteorder == "big":
+            packed.byteswap()
+        body += writer.body[previous_offset:offset]
+        body += packed.tobytes()
+        previous_offset = offset
+    body += writer.body[previous_offset:]
+
+    table: _Writer = _Writer()
+    strings: bytes = bytes("\0".join(writer.strings), "utf-8")
+    table.varint(len(strings))
+    table.body += strings
+
+    return HEADER.pack(MAGIC, SCHEMA_VERSION, flags) + table.body + body
+
+
+### Decoding ###
+class _Reader:
+    """Reads the body of a snapshot"""
+
+    def __init__(self, data: bytes, offset: int):
+        self.data: bytes = data
+        self.offset: int = offset
+        self.strings: list[str] = []
+
+    def varint(self) -> int:
+        """Read an unsigned LEB128 integer"""
+
+        result: int = 0
+        shift: int = 0
+        while True:
+            byte: int = self.data[self.offset]
+            self.offset += 1
+            result |= (byte & 0x7F) << shift
+            if byte < 0x80:
+                return result
+            shift += 7
+
+    def string(self) -> str:
+        """Read a string index"""
+
+        return self.strings[self.varint()]
+
+    def value(self) -> Any:
+        """Read a tagged value"""
+
+        tag: int = self.data[self.offset]
+        self.offset += 1
+        if tag == Tag.INT:
+            zigzag: int = self.varint()
+            return (zigzag >> 1) ^ -(zigzag & 1)
+        if tag == Tag.FLOAT:
+            (value,) = FLOAT.unpack_from(self.data, self.offset)
+            self.offset += FLOAT.size
+            return value
+        if tag == Tag.STRING:
+            return self.string()
+        return {Tag.NONE: None, Tag.FALSE: False, Tag.TRUE: True}[tag]
+
+    def number(self) -> Optional[float]:
+        """Read a value written as a float (or None)"""
+
+        value: Any = self.value()
+        return float(value) if value is not None else None
+
+    def indices(self, count: int, typecode: str) -> array:
+        """Read packed string indices"""
+
+        indices: array = array(typecode)
+        end: int = self.offset + count * indices.itemsize
+        indices.frombytes(self.data[self.offset : end])
+        if byteorder == "big":
+            indices.byteswap()
+        self.offset = end
+        return indices
+
+
+def _read(data: bytes, flags: int, has_numbers: bool) -> dict:
+    reader: _Reader = _Reader(data, HEADER.size)
+    length: int = reader.varint()
+    reader.strings = str(data[reader.offset : reader.offset + length], "utf-8").split(
+        "\0"
+    )
+    reader.offset += length
+    strings: list[str] = reader.strings
+    typecode: str = "I" if flags & FLAG_WIDE_INDICES else "H"
+
+    gradebook_dict: dict = {"last_updated": reader.value(), "courses": []}
+    for _ in range(reader.varint()):
+        name: str = reader.string()
+        grade: Any = reader.value()
+        teacher: str = reader.string()
+        period: Any = reader.value()
+        room: str = reader.string()
+        weights: dict = {
+            reader.string(): reader.value() for _ in range(reader.varint())
+        }
+        indices: array = reader.indices(
+            reader.varint() * len(ASSIGNMENT_FIELDS), typecode
+        )
+        gradebook_dict["courses"].append(
+            {
+                "name": name,
+                "grade": grade,
+                "teacher": teacher,
+                "period": period,
+                "assignments": [
+                    {
+                        "name": strings[name_idx],
+                        "assigned_date": strings[assigned_idx],
+                        "due_date": strings[due_idx],
+                        "weight": strings[weight_idx],
+                        "grade": strings[grade_idx],
+                        "points": strings[points_idx],
+                    }
+                    for (
+                        name_idx,
+                        assigned_idx,
+                        due_idx,
+                        weight_idx,
+                        grade_idx,
+                        points_idx,
+                    ) in zip(
+                        *(
+                            indices[field :: len(ASSIGNMENT_FIELDS)]
+                            for field in range(len(ASSIGNMENT_FIELDS))
+                        )
+                    )
+                ],
+                "room": room,
+                "weights": weights,
+            }
+        )
+        if has_numbers:
+            for assignment in gradebook_dict["courses"][-1]["assignments"]:
+                for field in ASSIGNMENT_NUMBERS:
+                    assignment[field] = reader.number()
+    return gradebook_dict
+
+
+def _read_version_1(data: bytes, flags: int) -> dict:
+    return _read(data, flags, has_numbers=False)
+
+
+def _read_version_2(data: bytes, flags: int) -> dict:
+    return _read(data, flags, has_numbers=True)
+
+
+# Reader for every binary schema version
+READERS: dict[int, Callable[[bytes, int], dict]] = {
+    1: _read_version_1,
+    2: _read_version_2,
+}
+# Upgrade from the shape of a schema version to the next one
+UPGRADES: dict[int, Callable[[dict], dict]] = {
+    0: lambda gradebook_dict: gradebook_dict,
+    1: _upgrade_version_1,
+}
+
+
+def is_binary(data: bytes) -> bool:
+    """Returns if the data is a binary snapshot (instead of JSON)"""
+
+    return data[: len(MAGIC)] == MAGIC
+
+
+def upgrade(gradebook_dict: dict, schema_version: int) -> dict:
+    """Upgrade a serialized gradebook from a schema version to the current one"""
+
+    for version in range(schema_version, SCHEMA_VERSION):
+        gradebook_dict = UPGRADES[version](gradebook_dict)
+    return gradebook_dict
+
+
+def decode(data: bytes) -> dict:
+    """Decode a snapshot (binary, or JSON from before this format existed) into a
+    serialized gradebook of the current schema
+    """
+
+    if not is_binary(data):
+        return upgrade(loads(data), 0)
+
+    _, schema_version, flags = HEADER.unpack_from(data)
+    if (reader := READERS.get(schema_version)) is None:
+        raise ValueError(f"Unknown snapshot schema version {schema_version}")
+    return upgrade(reader(data, flags), schema_version)
@@ -0,0 +1,53 @@
+"""
+Source files for StudentVue Data Viewer
+Licensed under the Unlicense (P.D.)
+2026-10-16
+"""
+
+### Setup ###
+from dataclasses import dataclass
+from gzip import compress as gzip_compress
+from hashlib import sha256
+from pathlib import Path
+from types import MappingProxyType
+from tools import SourceDirectory
+
+
+### Dataclasses ###
+@dataclass(frozen=True, slots=True)
+class SourceFile:
+    """A source file as it's served"""
+
+    content: bytes
+    etag: str  # Of the content, see `gzip_etag` for the compressed content
+    gzipped: bytes | None  # None if compressing doesn't make it smaller
+
+    @property
+    def gzip_etag(self) -> str:
+        """The ETag of the compressed content, which is a different representation"""
+
+        return f"{self.etag}-gzip"
+
+
+### Index ###
+def index_source_files(
+    root: Path, directories: list[SourceDirectory]
+) -> MappingProxyType[str, SourceFile]:
+    """Read every source file that exists once, returning them by their path (as in
+    "/source/<path>") in an immutable mapping
+    """
+
+    source_files: dict[str, SourceFile] = {}
+    for directory in directories:
+        for file in directory.files:
+            path: Path = root / directory.name / file
+            if not path.is_file():
+                continue
+            content: bytes = path.read_bytes()
+            gzipped: bytes = gzip_compress(content, mtime=0)
+            source_files[(Path(directory.name) / file).as_posix()] = SourceFile(
+                content,
+                sha256(content).hexdigest(),
+                gzipped if len(gzipped) < len(content) else None,
+            )
+    return MappingProxyType(source_files)
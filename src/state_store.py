@@ -0,0 +1,175 @@
+"""
+Shared state for StudentVue Data Viewer
+Licensed under the Unlicense (P.D.)
+2026-10-16
+"""
+
+### Setup ###
+from base64 import urlsafe_b64encode
+from hashlib import sha256
+from json import dumps, loads
+from os import getpid
+from pathlib import Path
+from sqlite3 import Connection, connect
+from threading import local
+from time import time
+from cryptography.fernet import Fernet, InvalidToken
+from cache import LRUCache
+from common import ROOT_PATH
+from config_parser import parse
+
+DEFAULT_STATE_STORE: str = "memory"
+DEFAULT_STATE_STORE_PATH: Path = ROOT_PATH / "state.sqlite3"
+MEMORY_STATE_STORE_MAX_SIZE: int = 4096  # Entries held at once per namespace
+SQLITE_TIMEOUT: float = 10  # Seconds to wait for another process's write lock
+
+
+### Stores ###
+class StateStore:
+    """A store for session state that outlives a request, such as a user's grades
+    while they resolve a password mismatch. Values are JSON-serializable dicts, and
+    expire `ttl` seconds after they were last set.
+
+    Values are copies: modifying a value that was read does nothing until it is
+    :meth:`set` again, so that every backend behaves the same.
+    """
+
+    def __init__(self, namespace: str, ttl: float):
+        self.namespace: str = namespace
+        self.ttl: float = ttl
+
+    def get(self, key: str) -> dict | None:
+        """Return the value for a key, or None if it is missing or expired"""
+
+        raise NotImplementedError()
+
+    def set(self, key: str, value: dict):
+        """Insert or replace the value for a key"""
+
+        raise NotImplementedError()
+
+    def delete(self, key: str):
+        """Remove a key if it is present"""
+
+        raise NotImplementedError()
+
+    def __contains__(self, key: str) -> bool:
+        return self.get(key) is not None
+
+
+class MemoryStateStore(StateStore):
+    """A state store in this process's memory. Only usable with a single process."""
+
+    def __init__(self, namespace: str, ttl: float):
+        super().__init__(namespace, ttl)
+        self._entries: LRUCache = LRUCache(
+            max_size=MEMORY_STATE_STORE_MAX_SIZE, ttl=ttl
+        )
+
+    def get(self, key: str) -> dict | None:
+        serialized: str | None = self._entries.get(key)
+        return loads(serialized) if serialized is not None else None
+
+    def set(self, key: str, value: dict):
+        self._entries.put(key, dumps(value))
+
+    def delete(self, key: str):
+        self._entries.discard(key)
+
+
+class SQLiteStateStore(StateStore):
+    """A state store in a local SQLite database (in WAL mode), which is shared by
+    every process on the machine. Values are encrypted with a key from the master key,
+    as they can hold grades.
+    """
+
+    def __init__(self, namespace: str, ttl: float, path: Path, master_key: str):
+        super().__init__(namespace, ttl)
+        self.path: Path = path
+        self.fernet: Fernet = Fernet(
+            urlsafe_b64encode(
+                sha256(bytes(f"state-store\0{master_key}", "utf-8")).digest()
+            )
+        )
+        # Connections can't be shared between threads or forked processes
+        self._local: local = local()
+
+    def get(self, key: str) -> dict | None:
+        row: tuple[bytes] | None = (
+            self._connection()
+            .execute(
+                "SELECT value FROM state "
+                "WHERE namespace = ? AND key = ? AND expires_at > ?",
+                (self.namespace, key, time()),
+            )
+            .fetchone()
+        )
+        if row is None:
+            return None
+        try:
+            return loads(self.fernet.decrypt(row[0]))
+        except InvalidToken:  # The master key changed
+            self.delete(key)
+            return None
+
+    def set(self, key: str, value: dict):
+        connection: Connection = self._connection()
+        with connection:
+            connection.execute(
+                "INSERT OR REPLACE INTO state (namespace, key, value, expires_at) "
+                "VALUES (?, ?, ?, ?)",
+                (
+                    self.namespace,
+                    key,
+                    self.fernet.encrypt(bytes(dumps(value), "utf-8")),
+                    time() + self.ttl,
+                ),
+            )
+            # Expired entries are only ever dropped here
+            connection.execute(
+                "DELETE FROM state WHERE expires_at <= ?",
+                (time(),),
+            )
+
+    def delete(self, key: str):
+        connection: Connection = self._connection()
+        with connection:
+            connection.execute(
+                "DELETE FROM state WHERE namespace = ? AND key = ?",
+                (self.namespace, key),
+            )
+
+    def _connection(self) -> Connection:
+        """Return the connection of this thread (and process), opening it if needed"""
+
+        connection: Connection | None = getattr(self._local, "connection", None)
+        if connection is not None and self._local.pid == getpid():
+            return connection
+
+        connection = connect(self.path, timeout=SQLITE_TIMEOUT)
+        connection.execute("PRAGMA journal_mode = WAL")
+        connection.execute("PRAGMA synchronous = NORMAL")
+        with connection:
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS state ("
+                "namespace TEXT NOT NULL, key TEXT NOT NULL, value BLOB NOT NULL, "
+                "expires_at REAL NOT NULL, PRIMARY KEY (namespace, key))"
+            )
+        self._local.connection, self._local.pid = connection, getpid()
+        return connection
+
+
+def create_state_store(namespace: str, ttl: float) -> StateStore:
+    """Return the state store set in the config ("state_store" and
+    "state_store_path") for a namespace
+    """
+
+    config: dict = parse()
+    if config.get("state_store", DEFAULT_STATE_STORE) == "sqlite":
+        return SQLiteStateStore(
+            namespace,
+            ttl,
+            Path(config.get("state_store_path", DEFAULT_STATE_STORE_PATH)),
+            config["master_key"],
+        )
+    return MemoryStateStore(namespace, ttl)
@@ -0,0 +1,713 @@
+"""
+Versioning storage engines for StudentVue Data Viewer
+Licensed under the Unlicense (P.D.)
+2026-10-16
+"""
+
+### Setup ###
+from contextlib import contextmanager, nullcontext
+from os import getpid, replace
+from pathlib import Path
+from shutil import rmtree
+from sqlite3 import Connection, connect
+from threading import local
+from typing import ContextManager, Iterator
+from history_log import HistoryLog, LogRecord
+from history_index import HistoryIndex, IndexRow
+from common import (
+    ROOT_PATH,
+    VERSIONING_PATH,
+    HISTORY_LOG_FILENAME,
+    HISTORY_INDEX_FILENAME,
+)
+from config_parser import parse
+
+DEFAULT_STORAGE_ENGINE: str = "directory"
+DEFAULT_SQLITE_STORAGE_PATH: Path = ROOT_PATH / "versioning.sqlite3"
+SQLITE_TIMEOUT: float = 30  # Seconds to wait for another process's write lock
+STAGING_SUFFIX: str = ".staging"  # Of the user hash of a staging storage
+REPLACED_SUFFIX: str = ".replaced"  # Of a directory being replaced
+SQLITE_TABLES: tuple[str, ...] = (
+    "blobs",
+    "snapshots",
+    "history",
+    "history_index",
+    "history_index_size",
+)
+SQLITE_SCHEMA: tuple[str, ...] = (
+    "CREATE TABLE IF NOT EXISTS blobs ("
+    "user_hash TEXT NOT NULL, name TEXT NOT NULL, data BLOB NOT NULL, "
+    "PRIMARY KEY (user_hash, name)) WITHOUT ROWID",
+    "CREATE TABLE IF NOT EXISTS snapshots ("
+    "user_hash TEXT NOT NULL, timestamp INTEGER NOT NULL, data BLOB NOT NULL, "
+    "PRIMARY KEY (user_hash, timestamp)) WITHOUT ROWID",
+    "CREATE TABLE IF NOT EXISTS history ("
+    "seq INTEGER PRIMARY KEY AUTOINCREMENT, user_hash TEXT NOT NULL, "
+    "kind INTEGER NOT NULL, timestamp INTEGER NOT NULL, payload BLOB NOT NULL)",
+    "CREATE INDEX IF NOT EXISTS history_by_user ON history (user_hash, seq)",
+    "CREATE TABLE IF NOT EXISTS history_index ("
+    "user_hash TEXT NOT NULL, timestamp INTEGER NOT NULL, seq INTEGER NOT NULL, "
+    "last_seen INTEGER, signature BLOB NOT NULL, "
+    "PRIMARY KEY (user_hash, timestamp)) WITHOUT ROWID",
+    "CREATE TABLE IF NOT EXISTS history_index_size ("
+    "user_hash TEXT PRIMARY KEY, log_size INTEGER NOT NULL) WITHOUT ROWID",
+)
+
+# The engine set in the config, see `get_storage_engine`
+STORAGE_ENGINE: "StorageEngine | None" = None
+
+
+### Interfaces ###
+class UserStorage:
+    """Where the versioning data of one user is kept. Besides the history log and
+    index, a user has snapshots (by timestamp) and named blobs (e.g. "HASH.txt").
+    Everything is stored as given, so it must already be encrypted.
+
+    Reading or deleting something that doesn't exist raises `FileNotFoundError`, like
+    the files of :class:`DirectoryStorageEngine` do.
+    """
+
+    user_hash: str
+    history_log: HistoryLog
+    history_index: HistoryIndex
+
+    def create(self):
+        """Make the user's storage if it doesn't exist"""
+
+        raise NotImplementedError()
+
+    def remove(self):
+        """Remove everything of the user"""
+
+        raise NotImplementedError()
+
+    def transaction(self) -> ContextManager:
+        """Return a context in which every change is made at once (or not at all), if
+        the engine supports it. Transactions can be nested.
+        """
+
+        raise NotImplementedError()
+
+    def replacement(self) -> ContextManager["UserStorage"]:
+        """Return a context with an empty staging storage, which replaces the user's
+        storage at once when the context exits. If the context raises, the staging
+        storage is removed and the user's storage is left as it was.
+        """
+
+        raise NotImplementedError()
+
+    def read_blob(self, name: str) -> bytes:
+        """Return the contents of a blob"""
+
+        raise NotImplementedError()
+
+    def write_blob(self, name: str, data: bytes):
+        """Create or replace a blob"""
+
+        raise NotImplementedError()
+
+    def delete_blob(self, name: str):
+        """Remove a blob"""
+
+        raise NotImplementedError()
+
+    def blob_exists(self, name: str) -> bool:
+        """Returns if a blob exists"""
+
+        raise NotImplementedError()
+
+    def blob_names(self) -> list[str]:
+        """Return the name of every blob"""
+
+        raise NotImplementedError()
+
+    def read_snapshot(self, timestamp: int) -> bytes:
+        """Return the contents of a snapshot"""
+
+        raise NotImplementedError()
+
+    def write_snapshot(self, timestamp: int, data: bytes):
+        """Create or replace a snapshot"""
+
+        raise NotImplementedError()
+
+    def delete_snapshot(self, timestamp: int):
+        """Remove a snapshot"""
+
+        raise NotImplementedError()
+
+    def snapshot_timestamps(self) -> list[int]:
+        """Return the timestamp of every snapshot, oldest first"""
+
+        raise NotImplementedError()
+
+
+class StorageEngine:
+    """Where the versioning data of every user is kept"""
+
+    def user(self, user_hash: str) -> UserStorage:
+        """Return the storage of a user (which may not exist yet)"""
+
+        raise NotImplementedError()
+
+    def user_hashes(self) -> list[str]:
+        """Return the hash of every user with storage"""
+
+        raise NotImplementedError()
+
+
+### Directory engine ###
+class DirectoryUserStorage(UserStorage):
+    """A user directory, with a file for every snapshot and blob"""
+
+    def __init__(self, path: Path):
+        self.path: Path = path
+        self.user_hash: str = path.name
+        self.history_log: HistoryLog = HistoryLog(path / HISTORY_LOG_FILENAME)
+        self.history_index: HistoryIndex = HistoryIndex(path / HISTORY_INDEX_FILENAME)
+
+    def create(self):
+        self._finish_replacement()
+        self.path.mkdir(parents=True, exist_ok=True)
+
+    def _finish_replacement(self):
+        """Finish a replacement that was interrupted after the user directory was
+        moved out of the way (see `replacement`). The staging directory was complete
+        by then, so it's moved in if it wasn't yet, and only then is the replaced
+        directory removed.
+        """
+
+        staging_path: Path = self.path.with_name(self.path.name + STAGING_SUFFIX)
+        replaced_path: Path = self.path.with_name(self.path.name + REPLACED_SUFFIX)
+        if not replaced_path.exists():
+            return
+        if staging_path.exists():
+            # A user directory made since the move (e.g. by another process) has no
+            # history, and would be in the way
+            if self.path.exists():
+                rmtree(self.path)
+            replace(staging_path, self.path)
+        rmtree(replaced_path)
+
+    def remove(self):
+        rmtree(self.path)
+
+    def transaction(self) -> ContextManager:
+        return nullcontext()
+
+    @contextmanager
+    def replacement(self) -> Iterator["DirectoryUserStorage"]:
+        # A directory can't be replaced in one rename, so the user directory is moved
+        # out of the way first, which `create` recovers from if interrupted. The
+        # user's lock (see `versioning.user_lock`) must be held throughout, so that
+        # the user directory isn't made again in between.
+        self._finish_replacement()
+        staging: DirectoryUserStorage = DirectoryUserStorage(
+            self.path.with_name(self.path.name + STAGING_SUFFIX)
+        )
+        if staging.path.exists():  # Left over from an interrupted replacement
+            staging.remove()
+        staging.create()
+        try:
+            yield staging
+        except BaseException:
+            staging.remove()
+            raise
+
+        replace(self.path, self.path.with_name(self.path.name + REPLACED_SUFFIX))
+        self._finish_replacement()
+
+    def read_blob(self, name: str) -> bytes:
+        with open(self.path / name, "rb") as blob_file:
+            return blob_file.read()
+
+    def write_blob(self, name: str, data: bytes):
+        # Written to a temporary file first so a blob is never left half written
+        temporary_path: Path = self.path / f"{name}.tmp"
+        with open(temporary_path, "wb") as blob_file:
+            blob_file.write(data)
+        replace(temporary_path, self.path / name)
+
+    def delete_blob(self, name: str):
+        (self.path / name).unlink()
+
+    def blob_exists(self, name: str) -> bool:
+        return (self.path / name).exists()
+
+    def blob_names(self) -> list[str]:
+        return [
+            path.name
+            for path in self.path.iterdir()
+            if not path.name.isdigit()
+            and path.suffix != ".tmp"
+            and path.name not in (HISTORY_LOG_FILENAME, HISTORY_INDEX_FILENAME)
+        ]
+
+    def read_snapshot(self, timestamp: int) -> bytes:
+        return self.read_blob(f"{timestamp}")
+
+    def write_snapshot(self, timestamp: int, data: bytes):
+        self.write_blob(f"{timestamp}", data)
+
+    def delete_snapshot(self, timestamp: int):
+        self.delete_blob(f"{timestamp}")
+
+    def snapshot_timestamps(self) -> list[int]:
+        return sorted(
+            int(path.name) for path in self.path.iterdir() if path.name.isdigit()
+        )
+
+
+class DirectoryStorageEngine(StorageEngine):
+    """A directory for every user (named by their hash) in a versioning directory"""
+
+    def __init__(self, path: Path):
+        self.path: Path = path
+
+    def user(self, user_hash: str) -> DirectoryUserStorage:
+        return DirectoryUserStorage(self.path / user_hash)
+
+    def user_hashes(self) -> list[str]:
+        if not self.path.exists():
+            return []
+        return [
+            path.name
+            for path in self.path.iterdir()
+            if path.is_dir() and "." not in path.name
+        ]
+
+
+### SQLite engine ###
+class SQLiteStorageEngine(StorageEngine):
+    """Every user in one SQLite database (in WAL mode), so saving a snapshot along
+    with its history records is one transaction and removing a user is one query
+    """
+
+    def __init__(self, path: Path):
+        self.path: Path = path
+        # Connections can't be shared between threads or forked processes
+        self._local: local = local()
+
+    def user(self, user_hash: str) -> "SQLiteUserStorage":
+        return SQLiteUserStorage(self, user_hash)
+
+    def user_hashes(self) -> list[str]:
+        return [
+            user_hash
+            for (user_hash,) in self.connection().execute(
+                "SELECT user_hash FROM blobs UNION SELECT user_hash FROM history"
+            )
+            if not user_hash.endswith(STAGING_SUFFIX)
+        ]
+
+    def connection(self) -> Connection:
+        """Return the connection of this thread (and process), opening it if needed"""
+
+        connection: Connection | None = getattr(self._local, "connection", None)
+        if connection is not None and self._local.pid == getpid():
+            return connection
+
+        connection = connect(self.path, timeout=SQLITE_TIMEOUT)
+        connection.execute("PRAGMA journal_mode = WAL")
+        connection.execute("PRAGMA synchronous = NORMAL")
+        with connection:
+            for statement in SQLITE_SCHEMA:
+                connection.execute(statement)
+        self._local.connection, self._local.pid = connection, getpid()
+        self._local.depth = 0
+        return connection
+
+    @contextmanager
+    def transaction(self) -> Iterator[Connection]:
+        """Commit the changes made in the context at once (or roll them back if it
+        raises). A transaction within a transaction is a part of the outer one.
+        """
+
+        connection: Connection = self.connection()
+        if self._local.depth > 0:
+            self._local.depth += 1
+            try:
+                yield connection
+            finally:
+                self._local.depth -= 1
+            return
+
+        self._local.depth = 1
+        try:
+            with connection:
+                yield connection
+        finally:
+            self._local.depth = 0
+
+
+class SQLiteUserStorage(UserStorage):
+    """The rows of a user in a :class:`SQLiteStorageEngine`"""
+
+    def __init__(self, engine: SQLiteStorageEngine, user_hash: str):
+        self.engine: SQLiteStorageEngine = engine
+        self.user_hash: str = user_hash
+        self.history_log: SQLiteHistoryLog = SQLiteHistoryLog(engine, user_hash)
+        self.history_index: SQLiteHistoryIndex = SQLiteHistoryIndex(engine, user_hash)
+
+    def create(self):
+        # Rows are made as they are written
+        ...
+
+    def remove(self):
+        with self.engine.transaction() as connection:
+            for table in SQLITE_TABLES:
+                connection.execute(
+                    f"DELETE FROM {table} WHERE user_hash = ?", (self.user_hash,)
+                )
+
+    def transaction(self) -> ContextManager:
+        return self.engine.transaction()
+
+    @contextmanager
+    def replacement(self) -> Iterator["SQLiteUserStorage"]:
+        # The staging storage is written outside of a transaction (so the write lock
+        # isn't held throughout), and then moved over the user in one
+        staging: SQLiteUserStorage = SQLiteUserStorage(
+            self.engine, self.user_hash + STAGING_SUFFIX
+        )
+        staging.remove()
+        try:
+            yield staging
+        except BaseException:
+            staging.remove()
+            raise
+
+        with self.engine.transaction() as connection:
+            self.remove()
+            for table in SQLITE_TABLES:
+                connection.execute(
+                    f"UPDATE {table} SET user_hash = ? WHERE user_hash = ?",
+                    (self.user_hash, staging.user_hash),
+                )
+
+    def read_blob(self, name: str) -> bytes:
+        row: tuple[bytes] | None = (
+            self.engine.connection()
+            .execute(
+                "SELECT data FROM blobs WHERE user_hash = ? AND name = ?",
+                (self.user_hash, name),
+            )
+            .fetchone()
+        )
+        if row is None:
+            raise FileNotFoundError(f"No blob {name} for {self.user_hash}")
+        return row[0]
+
+    def write_blob(self, name: str, data: bytes):
+        with self.engine.transaction() as connection:
+            connection.execute(
+                "INSERT OR REPLACE INTO blobs (user_hash, name, data) VALUES (?, ?, ?)",
+                (self.user_hash, name, data),
+            )
+
+    def delete_blob(self, name: str):
+        with self.engine.transaction() as connection:
+            if not connection.execute(
+                "DELETE FROM blobs WHERE user_hash = ? AND name = ?",
+                (self.user_hash, name),
+            ).rowcount:
+                raise FileNotFoundError(f"No blob {name} for {self.user_hash}")
+
+    def blob_exists(self, name: str) -> bool:
+        return (
+            self.engine.connection()
+            .execute(
+                "SELECT 1 FROM blobs WHERE user_hash = ? AND name = ?",
+                (self.user_hash, name),
+            )
+            .fetchone()
+            is not None
+        )
+
+    def blob_names(self) -> list[str]:
+        return [
+            name
+            for (name,) in self.engine.connection().execute(
+                "SELECT name FROM blobs WHERE user_hash = ?", (self.user_hash,)
+            )
+        ]
+
+    def read_snapshot(self, timestamp: int) -> bytes:
+        row: tuple[bytes] | None = (
+            self.engine.connection()
+            .execute(
+                "SELECT data FROM snapshots WHERE user_hash = ? AND timestamp = ?",
+                (self.user_hash, timestamp),
+            )
+            .fetchone()
+        )
+        if row is None:
+            raise FileNotFoundError(f"No snapshot {timestamp} for {self.user_hash}")
+        return row[0]
+
+    def write_snapshot(self, timestamp: int, data: bytes):
+        with self.engine.transaction() as connection:
+            connection.execute(
+                "INSERT OR REPLACE INTO snapshots (user_hash, timestamp, data) "
+                "VALUES (?, ?, ?)",
+                (self.user_hash, timestamp, data),
+            )
+
+    def delete_snapshot(self, timestamp: int):
+        with self.engine.transaction() as connection:
+            if not connection.execute(
+                "DELETE FROM snapshots WHERE user_hash = ? AND timestamp = ?",
+                (self.user_hash, timestamp),
+            ).rowcount:
+                raise FileNotFoundError(f"No snapshot {timestamp} for {self.user_hash}")
+
+    def snapshot_timestamps(self) -> list[int]:
+        return [
+            timestamp
+            for (timestamp,) in self.engine.connection().execute(
+                "SELECT timestamp FROM snapshots WHERE user_hash = ? "
+                "ORDER BY timestamp",
+                (self.user_hash,),
+            )
+        ]
+
+
+class SQLiteHistoryLog(HistoryLog):
+    """The history log of a user as rows. A record's offset is its sequence number,
+    and the size of the log is the highest sequence number, which only grows (even
+    when the log is rewritten), so a stale history index is still noticed.
+    """
+
+    def __init__(
+        self, engine: SQLiteStorageEngine, user_hash: str
+    ):  # pylint:disable=super-init-not-called
+        self.engine: SQLiteStorageEngine = engine
+        self.user_hash: str = user_hash
+
+    def exists(self) -> bool:
+        return (
+            self.engine.connection()
+            .execute("SELECT 1 FROM history WHERE user_hash = ?", (self.user_hash,))
+            .fetchone()
+            is not None
+        )
+
+    def append(self, records: list[LogRecord]) -> int:
+        with self.engine.transaction() as connection:
+            for record in records:
+                record.offset = connection.execute(
+                    "INSERT INTO history (user_hash, kind, timestamp, payload) "
+                    "VALUES (?, ?, ?, ?)",
+                    (self.user_hash, record.kind, record.timestamp, record.payload),
+                ).lastrowid
+            return self.size()
+
+    def read(self) -> Iterator[LogRecord]:
+        yield from self._records("ORDER BY seq")
+
+    def read_at(self, offset: int) -> LogRecord:
+        for record in self._records("AND seq = ?", (offset,)):
+            return record
+        raise FileNotFoundError(f"No history record {offset} for {self.user_hash}")
+
+    def size(self) -> int:
+        (size,) = (
+            self.engine.connection()
+            .execute(
+                "SELECT COALESCE(MAX(seq), 0) FROM history WHERE user_hash = ?",
+                (self.user_hash,),
+            )
+            .fetchone()
+        )
+        return size
+
+    def read_reverse(self) -> Iterator[LogRecord]:
+        yield from self._records("ORDER BY seq DESC")
+
+    def rewrite(self, records: list[LogRecord]) -> int:
+        with self.engine.transaction() as connection:
+            connection.execute(
+                "DELETE FROM history WHERE user_hash = ?", (self.user_hash,)
+            )
+            return self.append(records)
+
+    def _records(self, clause: str, parameters: tuple = ()) -> Iterator[LogRecord]:
+        for offset, kind, timestamp, payload in self.engine.connection().execute(
+            "SELECT seq, kind, timestamp, payload FROM history "
+            f"WHERE user_hash = ? {clause}",
+            (self.user_hash, *parameters),
+        ):
+            yield LogRecord(kind, timestamp, payload, offset)
+
+
+class SQLiteHistoryIndex(HistoryIndex):
+    """The history index of a user as rows, sorted by the table's primary key"""
+
+    def __init__(
+        self, engine: SQLiteStorageEngine, user_hash: str
+    ):  # pylint:disable=super-init-not-called
+        self.engine: SQLiteStorageEngine = engine
+        self.user_hash: str = user_hash
+
+    def log_size(self) -> int | None:
+        row: tuple[int] | None = (
+            self.engine.connection()
+            .execute(
+                "SELECT log_size FROM history_index_size WHERE user_hash = ?",
+                (self.user_hash,),
+            )
+            .fetchone()
+        )
+        return row[0] if row is not None else None
+
+    def rewrite(self, rows: list[IndexRow], log_size: int):
+        with self.engine.transaction() as connection:
+            connection.execute(
+                "DELETE FROM history_index WHERE user_hash = ?", (self.user_hash,)
+            )
+            connection.executemany(
+                "INSERT OR REPLACE INTO history_index "
+                "(user_hash, timestamp, seq, last_seen, signature) "
+                "VALUES (?, ?, ?, ?, ?)",
+                [
+                    (
+                        self.user_hash,
+                        row.timestamp,
+                        row.offset,
+                        row.last_seen,
+                        row.signature,
+                    )
+                    for row in rows
+                ],
+            )
+            self._set_log_size(connection, log_size)
+
+    def rows(self) -> list[IndexRow]:
+        return self._rows("ORDER BY timestamp")
+
+    def page(self, before: int | None, limit: int) -> tuple[list[IndexRow], bool]:
+        rows: list[IndexRow] = (
+            self._rows("ORDER BY timestamp DESC LIMIT ?", (limit + 1,))
+            if before is None
+            else self._rows(
+                "AND timestamp < ? ORDER BY timestamp DESC LIMIT ?",
+                (before, limit + 1),
+            )
+        )
+        return rows[:limit], len(rows) > limit
+
+    def put(self, row: IndexRow, log_size: int, new_log_size: int) -> bool:
+        with self.engine.transaction() as connection:
+            if self.log_size() != log_size:
+                return False
+            connection.execute(
+                "INSERT OR REPLACE INTO history_index "
+                "(user_hash, timestamp, seq, last_seen, signature) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (
+                    self.user_hash,
+                    row.timestamp,
+                    row.offset,
+                    row.last_seen,
+                    row.signature,
+                ),
+            )
+            self._set_log_size(connection, new_log_size)
+            return True
+
+    def set_last_seen(
+        self, timestamp: int, last_seen: int, log_size: int, new_log_size: int
+    ) -> bool:
+        with self.engine.transaction() as connection:
+            if self.log_size() != log_size:
+                return False
+            connection.execute(
+                "UPDATE history_index SET last_seen = ? "
+                "WHERE user_hash = ? AND timestamp = ?",
+                (last_seen, self.user_hash, timestamp),
+            )
+            self._set_log_size(connection, new_log_size)
+            return True
+
+    def remove(self, timestamp: int, log_size: int, new_log_size: int) -> bool:
+        with self.engine.transaction() as connection:
+            if self.log_size() != log_size:
+                return False
+            connection.execute(
+                "DELETE FROM history_index WHERE user_hash = ? AND timestamp = ?",
+                (self.user_hash, timestamp),
+            )
+            self._set_log_size(connection, new_log_size)
+            return True
+
+    def _set_log_size(self, connection: Connection, log_size: int):
+        connection.execute(
+            "INSERT OR REPLACE INTO history_index_size (user_hash, log_size) "
+            "VALUES (?, ?)",
+            (self.user_hash, log_size),
+        )
+
+    def _rows(self, clause: str, parameters: tuple = ()) -> list[IndexRow]:
+        return [
+            IndexRow(timestamp, offset, last_seen, signature)
+            for timestamp, offset, last_seen, signature in self.engine.connection().execute(
+                "SELECT timestamp, seq, last_seen, signature FROM history_index "
+                f"WHERE user_hash = ? {clause}",
+                (self.user_hash, *parameters),
+            )
+        ]
+
+
+### Engines ###
+def create_storage_engine(name: str, path: Path | None = None) -> StorageEngine:
+    """Return a storage engine by name ("directory" or "sqlite"). The path is the
+    versioning directory or the database respectively.
+    """
+
+    if name == "sqlite":
+        return SQLiteStorageEngine(path or DEFAULT_SQLITE_STORAGE_PATH)
+    return DirectoryStorageEngine(path or VERSIONING_PATH)
+
+
+def get_storage_engine() -> StorageEngine:
+    """Return the storage engine set in the config ("storage_engine" and
+    "storage_path")
+    """
+
+    global STORAGE_ENGINE  # pylint:disable=global-statement
+    if STORAGE_ENGINE is None:
+        config: dict = parse()
+        STORAGE_ENGINE = create_storage_engine(
+            config.get("storage_engine", DEFAULT_STORAGE_ENGINE),
+            Path(config["storage_path"]) if "storage_path" in config else None,
+        )
+    return STORAGE_ENGINE
+
+
+def copy_user(source: UserStorage, destination: UserStorage):
+    """Copy everything of a user from one storage to another (replacing what the
+    destination had). The data stays encrypted, so no password is needed.
+    """
+
+    with destination.transaction():
+        destination.create()
+        for name in source.blob_names():
+            destination.write_blob(name, source.read_blob(name))
+        for timestamp in source.snapshot_timestamps():
+            destination.write_snapshot(timestamp, source.read_snapshot(timestamp))
+
+        records: list[LogRecord] = list(source.history_log.read())
+        source_offsets: list[int] = [record.offset for record in records]
+        log_size: int = destination.history_log.rewrite(records)
+
+        # Offsets differ between engines, so the index is carried over with the new
+        # ones. A stale index is left out, to be rebuilt when it is next read.
+        if source.history_index.log_size() != source.history_log.size():
+            return
+        new_offsets: dict[int, int] = dict(
+            zip(source_offsets, (record.offset for record in records))
+        )
+        index_rows: list[IndexRow] = source.history_index.rows()
+        for row in index_rows:
+            row.offset = new_offsets[row.offset]
+        destination.history_index.rewrite(index_rows, log_size)
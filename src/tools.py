@@ -103,6 +103,10 @@ class LoadGradesException(Exception):
     """An exception occurred with loading the grades from the versioning store"""
 
 
+class ImportGradesException(Exception):
+    """An exception occurred with importing grades into the versioning store"""
+
+
 class VersioningMismatchedCredentialsException(Exception):
     """Mismatched credentials for versioning"""
 
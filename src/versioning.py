@@ -4,41 +4,214 @@ Licensed under the Unlicense (P.D.)
 2023-07-24
 """
 
-from dataclasses import dataclass, asdict
-from pathlib import Path
+from collections import deque
+from itertools import islice
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass
+from functools import wraps
+from threading import Lock, RLock
+from weakref import WeakValueDictionary
 from base64 import urlsafe_b64encode
-from shutil import rmtree
-from os import unlink
-from typing import Optional
+from os import cpu_count
+from typing import Any, Callable, Iterable, Iterator, Optional
 from json import dump, load, dumps, loads
 from hashlib import sha256
-from dacite import from_dict as dataclass_from_dict
+from hmac import new as hmac_new
 from cryptography.fernet import Fernet, InvalidToken
 from cryptography.hazmat.primitives import hashes
 from cryptography.hazmat.primitives.kdf.pbkdf2 import PBKDF2HMAC
 from config_parser import parse
 from tools import VersioningMismatchedCredentialsException, InvalidCredentialsException
-from common import VERSIONING_PATH, VERSIONS_FILENAME, HASH_FILENAME, Logger
+from common import (
+    VERSIONS_FILENAME,
+    HISTORY_LOG_FILENAME,
+    GRADE_SERIES_FILENAME,
+    CHANGES_FILENAME,
+    HASH_FILENAME,
+    Logger,
+)
+from cache import LRUCache, CacheStats
+from metrics import DECRYPT_SECONDS, ENCRYPT_SECONDS, KDF_SECONDS
+from history_log import HistoryLog, LogRecord, RecordKind, SEEN_PAYLOAD
+from history_index import HistoryIndex, IndexRow
+from storage import UserStorage, get_storage_engine
+from grade_series import (
+    GradeSeries,
+    encode as encode_grade_series,
+    decode as decode_grade_series,
+)
+from snapshot_delta import compute_delta, apply_delta
+from snapshot_diff import SnapshotDiff, diff_snapshots
+from compression import Codec, compress, decompress
+from snapshot_format import (
+    SCHEMA_VERSION,
+    encode as encode_snapshot,
+    decode as decode_snapshot,
+    is_binary as is_binary_snapshot,
+    upgrade,
+)
+
+# Constants (decided against config options for these)
+KDF_ITERATIONS: int = 480000
+KEY_CACHE_MAX_SIZE: int = 256  # Derived keys held at once
+KEY_CACHE_TTL: int = 15 * 60  # Seconds before a derived key must be derived again
+COMPACTION_MIN_DEAD_RECORDS: int = 32  # Superseded history records before compacting
+SNAPSHOT_CACHE_MAX_SIZE: int = 128  # Decoded snapshots held at once
+DEFAULT_KEYFRAME_INTERVAL: int = 16  # Snapshots per full snapshot, 1 to disable deltas
+DELTA_FORMAT: str = "delta"  # "format" of a snapshot stored as a delta
+# "format" of a snapshot stored as JSON as it can't be encoded (see `snapshot_format`)
+JSON_FORMAT: str = "json"
+DEFAULT_COMPRESSION: str = "zlib"  # See `compression.Codec.NAMES`
+ENCRYPTION_WORKERS: int = min(4, cpu_count() or 1)  # Threads encrypting at once
+IMPORT_BATCH_SIZE: int = 64  # Gradebooks imported per batch
+
+# Derived Fernet keys. Keys are (user directory name, digest of the credentials) so
+# that all of a user's keys can be dropped without knowing their password.
+DERIVED_KEY_CACHE: LRUCache = LRUCache(max_size=KEY_CACHE_MAX_SIZE, ttl=KEY_CACHE_TTL)
+# Decoded snapshots as (serialized gradebook, delta depth). Keys are the derived key
+# cache key plus the timestamp, so a snapshot is only served with the right password.
+# Cached values are shared and must never be modified.
+SNAPSHOT_CACHE: LRUCache = LRUCache(max_size=SNAPSHOT_CACHE_MAX_SIZE)
+# Locks of users' histories, by user directory name (see `user_lock`). A lock is only
+# kept while something (e.g. a `Versioning`) holds on to it.
+USER_LOCKS: WeakValueDictionary[str, RLock] = WeakValueDictionary()
+_USER_LOCKS_LOCK: Lock = Lock()  # Held while a user's lock is looked up or made
+
+
+### Auxiliary functions ###
+def _map_bounded(
+    function: Callable[[Any], Any], items: Iterable[Any], workers: int
+) -> Iterator[Any]:
+    """Like `ThreadPoolExecutor.map`, but items are only taken from `items` as workers
+    free up (instead of all at once), so only a few are held in memory at a time
+    """
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        pending: deque[Future] = deque()
+        for item in items:
+            if len(pending) >= workers * 2:
+                yield pending.popleft().result()
+            pending.append(executor.submit(function, item))
+        while pending:
+            yield pending.popleft().result()
+
+
+def user_lock(user_hash: str) -> RLock:
+    """Return the lock of a user's history (see :attr:`Versioning.lock`), which is
+    the same for everything using the user's history at the same time
+    """
+
+    with _USER_LOCKS_LOCK:
+        if (lock := USER_LOCKS.get(user_hash)) is None:
+            lock = USER_LOCKS[user_hash] = RLock()
+        return lock
+
+
+def _user_locked(method: Callable) -> Callable:
+    """Run a :class:`Versioning` method holding the user's lock (see
+    :attr:`Versioning.lock`)
+    """
+
+    @wraps(method)
+    def locked(self: "Versioning", *args, **kwargs) -> Any:
+        with self.lock:
+            return method(self, *args, **kwargs)
+
+    return locked
 
 
 ### Dataclasses ###
-@dataclass
+# Slotted with hand written codecs, like the models in `gradebook`
+
+
+@dataclass(slots=True)
 class VersioningCourseItem:
     """A course for the versioning item"""
 
     name: str
     grade: int
 
+    @classmethod
+    def from_dict(cls, data: dict) -> "VersioningCourseItem":
+        """Decode from the serialized form"""
+
+        return cls(data["name"], data["grade"])
+
+    def to_dict(self) -> dict:
+        """Encode into the serialized form"""
+
+        return {"name": self.name, "grade": self.grade}
 
-@dataclass
+
+@dataclass(slots=True)
 class VersioningItem:
     """A versioning item that is shown to the user"""
 
     courses: list[VersioningCourseItem]
     timestamp: int
+    content_hash: Optional[str] = None  # See `GradebookInformation.content_hash`
+    last_seen: Optional[int] = None  # The last time the grades were still the same
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "VersioningItem":
+        """Decode from the serialized form"""
+
+        return cls(
+            [VersioningCourseItem.from_dict(course) for course in data["courses"]],
+            data["timestamp"],
+            data.get("content_hash"),
+            data.get("last_seen"),
+        )
+
+    def to_dict(self) -> dict:
+        """Encode into the serialized form"""
+
+        return {
+            "courses": [course.to_dict() for course in self.courses],
+            "timestamp": self.timestamp,
+            "content_hash": self.content_hash,
+            "last_seen": self.last_seen,
+        }
+
+
+@dataclass(slots=True)
+class HistoryPage:
+    """A page of version items, newest first"""
+
+    items: list[VersioningItem]
+    signatures: list[str]  # Same for items with the same course names, see `items`
+    next_before: Optional[int]  # Cursor for the next (older) page, if there is one
+
+
+@dataclass(slots=True)
+class ChangeRecord:
+    """What changed from the snapshot before the newest one to the newest one"""
 
+    from_timestamp: int
+    to_timestamp: int
+    diff: SnapshotDiff
 
-@dataclass
+    @classmethod
+    def from_dict(cls, data: dict) -> "ChangeRecord":
+        """Decode from the serialized form"""
+
+        return cls(
+            data["from_timestamp"],
+            data["to_timestamp"],
+            SnapshotDiff.from_dict(data["diff"]),
+        )
+
+    def to_dict(self) -> dict:
+        """Encode into the serialized form"""
+
+        return {
+            "from_timestamp": self.from_timestamp,
+            "to_timestamp": self.to_timestamp,
+            "diff": self.diff.to_dict(),
+        }
+
+
+@dataclass(slots=True)
 class HashData:
     """Hash data"""
 
@@ -67,16 +240,31 @@ class Versioning:
         self.password: str = password
         self.serialized: Optional["GradebookInformation"] = serialized
         self.files: list[str] = []
-        self.path: Path = (
-            VERSIONING_PATH / sha256(bytes(self.username, "utf-8")).hexdigest()
+        # See `storage` for where the user's data is kept
+        self.storage: UserStorage = get_storage_engine().user(
+            sha256(bytes(self.username, "utf-8")).hexdigest()
         )
         self.master_key: str = parse()["master_key"]
+        self.keyframe_interval: int = parse().get(
+            "keyframe_interval", DEFAULT_KEYFRAME_INTERVAL
+        )
+        self.compression: int = Codec.NAMES[
+            parse().get("compression", DEFAULT_COMPRESSION)
+        ]
+        self.history_log: HistoryLog = self.storage.history_log
+        self.history_index: HistoryIndex = self.storage.history_index
+        # Held while the history is read or written, as reading can compact the
+        # history log, and retention (see `retention`) rewrites it in the background
+        self.lock: RLock = user_lock(self.storage.user_hash)
 
-        self.mkdir()
-
-        self.hash_data: HashData = self._load_hash_data()
+        # Waits for a replacement of the user's storage (see `migrate`) to finish,
+        # which the user directory mustn't be made again in the middle of
+        with self.lock:
+            self.mkdir()
+            self.hash_data: HashData = self._load_hash_data()
         self.fernet: Fernet = self._get_fernet(self.hash_data.key)
 
+    @_user_locked
     def load(self, timestamp: int):
         """Load the gradebook from the timestamp."""
 
@@ -84,132 +272,579 @@ class Versioning:
         from gradebook import GradebookInformation  # pylint:disable=import-outside-toplevel
         # fmt:on
 
-        try:
-            with open(self.path / f"{timestamp}", "rb") as gradebook_file:
-                encrypted_gradebook: bytes = gradebook_file.read()
-                decrypted = self.fernet.decrypt(encrypted_gradebook).decode("utf-8")
-                gradebook_dict: dict = loads(decrypted)
-            gradebook: GradebookInformation = dataclass_from_dict(
-                data_class=GradebookInformation, data=gradebook_dict
-            )
-        except InvalidToken as err:
-            raise InvalidCredentialsException() from err
+        gradebook_dict, _ = self._load_snapshot(timestamp)
+        gradebook: GradebookInformation = GradebookInformation.from_dict(gradebook_dict)
         return gradebook
 
+    @_user_locked
+    def diff(self, from_timestamp: int, to_timestamp: int) -> SnapshotDiff:
+        """Return what changed between the gradebooks at two timestamps. The
+        gradebooks are compared as serialized (and cached) snapshots, without being
+        decoded into a :class:`GradebookInformation`.
+        """
+
+        from_dict, _ = self._load_snapshot(from_timestamp)
+        to_dict, _ = self._load_snapshot(to_timestamp)
+        return diff_snapshots(from_dict, to_dict)
+
+    @_user_locked
     def save(self) -> None:
         """Save the gradebook into the user's versioning directory.
 
-        Two files are saved in this process:
-        "<timestamp>.json" is saved with the full serialized JSON tree, and
-        "VERSIONS.json" is "appended" to have a brief overview of the gradebook
-        state (:class:`VersioningItem`).
+        Five files are saved in this process:
+        "<timestamp>" is saved with the serialized JSON tree (in full every
+        `keyframe_interval` snapshots, otherwise as a delta against the previous
+        snapshot),
+        "VERSIONS.log" is appended with one record to have a brief overview of the
+        gradebook state (:class:`VersioningItem`),
+        "VERSIONS.idx" is added a row for that record (see :meth:`page_history`),
+        "GRADES.series" is appended with the course grades (see
+        :meth:`course_history`), and
+        "CHANGES.json" is saved with what changed since the previous snapshot (see
+        :meth:`latest_changes`), so that it's only worked out once.
+
+        With the SQLite storage engine, these are rows rather than files (see
+        :mod:`storage`), and they are saved in one transaction.
 
         All files are encrypted with the key, the hashed variant of which is found in "HASH.txt". Should the hash
         change, this will raise :class:`VersioningMismatchedCredentialsException`.
         """
 
-        self._check_credentials(self.hash_data)
-        self._save_gradebook(self.serialized)
-        versioning_list: list[VersioningItem] = self.list_history()
-        versioning_list.append(
-            VersioningItem(
+        # The snapshot, history records, and grade series are saved together (with
+        # storage engines that support transactions)
+        with self.storage.transaction():
+            self._check_credentials(self.hash_data)
+            self._migrate_versions_file()
+
+            # Nothing changed since the latest snapshot, so just note that it is current
+            content_hash: str = self.serialized.content_hash()
+            latest: VersioningItem | None = self.latest_history_item()
+            log_size: int = self.history_log.size()
+            if latest is not None and latest.content_hash == content_hash:
+                new_log_size: int = self.history_log.append(
+                    [
+                        LogRecord(
+                            kind=RecordKind.SEEN,
+                            timestamp=latest.timestamp,
+                            payload=SEEN_PAYLOAD.pack(self.serialized.last_updated),
+                        )
+                    ]
+                )
+                # A stale index is rebuilt when it is next read
+                self.history_index.set_last_seen(
+                    latest.timestamp,
+                    self.serialized.last_updated,
+                    log_size,
+                    new_log_size,
+                )
+                return
+
+            gradebook_dict: dict = self.serialized.to_dict()
+            self._save_snapshot(
+                self.serialized.last_updated,
+                gradebook_dict,
+                base_timestamp=latest.timestamp if latest is not None else None,
+            )
+            if latest is not None:
+                self._save_changes(latest.timestamp, gradebook_dict)
+            versioning_item: VersioningItem = VersioningItem(
                 timestamp=self.serialized.last_updated,
                 courses=[
                     VersioningCourseItem(course.name, course.grade)
                     for course in self.serialized.courses
                 ],
+                content_hash=content_hash,
+            )
+            record: LogRecord = self._versioning_item_record(versioning_item)
+            new_log_size: int = self.history_log.append([record])
+            self.history_index.put(
+                self._index_row(record, versioning_item), log_size, new_log_size
+            )
+            self._update_grade_series(
+                lambda series: self._add_to_grade_series(series, versioning_item)
             )
-        )
-        self._save_versioning_list(versioning_list=versioning_list)
 
-    def list_history(self) -> list[VersioningItem]:
-        """Return a list of version items"""
+    @_user_locked
+    def latest_changes(self) -> ChangeRecord | None:
+        """Return what changed in the newest snapshot (as worked out when it was
+        saved), or None if nothing was saved before it
+        """
 
-        versioning_list: list[dict]
+        latest: VersioningItem | None = self.latest_history_item()
+        if latest is None:
+            return None
         try:
-            with open(self.path / VERSIONS_FILENAME, "rb") as versions_file:
-                encrypted_versions: bytes = versions_file.read()
-                decrypted = self.fernet.decrypt(encrypted_versions).decode("utf-8")
-                versioning_list: list[dict] = loads(decrypted)
+            encrypted_changes: bytes = self.storage.read_blob(CHANGES_FILENAME)
         except FileNotFoundError:
-            versioning_list: list = []
+            return None
+        try:
+            change_record: ChangeRecord = ChangeRecord.from_dict(
+                loads(self._decrypt(encrypted_changes))
+            )
         except InvalidToken as err:
             raise InvalidCredentialsException() from err
-        for idx, version_item_dict in enumerate(versioning_list):
-            versioning_list[idx] = dataclass_from_dict(
-                data_class=VersioningItem, data=version_item_dict
+        # The newest snapshot may have been removed since
+        return change_record if change_record.to_timestamp == latest.timestamp else None
+
+    @_user_locked
+    def latest_history_item(self) -> VersioningItem | None:
+        """Return the newest version item, reading the history log from the end"""
+
+        deleted_timestamps: set[int] = set()
+        for record in self.history_log.read_reverse():
+            if record.kind == RecordKind.DELETE:
+                deleted_timestamps.add(record.timestamp)
+            elif (
+                record.kind == RecordKind.PUT
+                and record.timestamp not in deleted_timestamps
+            ):
+                return self._decrypt_versioning_item(record.payload)
+        return None
+
+    @_user_locked
+    def list_history(self) -> list[VersioningItem]:
+        """Return a list of version items.
+
+        The history log is replayed to get the items: a later record for a timestamp
+        replaces an earlier one, a tombstone removes it, and "seen" markers are
+        folded into the item's `last_seen`. If most of the log is made up of
+        superseded records, it is compacted. The history index is rebuilt if it is
+        stale, since every item is decrypted here anyway.
+        """
+
+        self._migrate_versions_file()
+
+        live_records, seen_records, record_count = self._replay_history_log()
+
+        versioning_list: list[VersioningItem] = []
+        for timestamp, record in live_records.items():
+            versioning_item: VersioningItem = self._decrypt_versioning_item(
+                record.payload
+            )
+            if seen_record := seen_records.get(timestamp):
+                (versioning_item.last_seen,) = SEEN_PAYLOAD.unpack(seen_record.payload)
+            versioning_list.append(versioning_item)
+
+        log_size: int = self.history_log.size()
+        live_record_count: int = len(live_records) + len(seen_records)
+        dead_record_count: int = record_count - live_record_count
+        compact: bool = (
+            dead_record_count >= COMPACTION_MIN_DEAD_RECORDS
+            and dead_record_count > live_record_count
+        )
+        if compact:
+            Logger.log(f"Compacting history log ({dead_record_count} dead records)")
+            # The records' offsets are updated, so the index is built from them below
+            log_size: int = self.history_log.rewrite(
+                list(live_records.values())
+                + [
+                    record
+                    for timestamp, record in seen_records.items()
+                    if timestamp in live_records
+                ]
+            )
+        if compact or self.history_index.log_size() != log_size:
+            self.history_index.rewrite(
+                [
+                    self._index_row(record, versioning_item)
+                    for record, versioning_item in zip(
+                        live_records.values(), versioning_list
+                    )
+                ],
+                log_size,
             )
+
         return versioning_list
 
-    def migrate(self, old_password: str, new_password: str):
-        """Migrate everything for a user from an old password to a new password"""
+    @_user_locked
+    def page_history(
+        self, before: Optional[int] = None, limit: int = 50
+    ) -> HistoryPage:
+        """Return a page of up to `limit` version items older than the `before`
+        timestamp (or the newest items), newest first.
 
-        def _update_encryption(password: str):
-            self.password: str = password
-            self.hash_data: HashData = self._load_hash_data(force=True)
-            self.fernet: Fernet = self._get_fernet(self.hash_data.key)
+        The items are found through the history index ("VERSIONS.idx"), which is kept
+        sorted by timestamp, so only the items on the page are read from the history
+        log and decrypted. Each item comes with a signature of its course names, so
+        items that can share a table can be grouped without comparing the names.
+        """
+
+        self._migrate_versions_file()
+        if self.history_index.log_size() != self.history_log.size():
+            Logger.log("Rebuilding stale history index")
+            self.list_history()
+
+        rows, has_more = self.history_index.page(before, limit)
+        items: list[VersioningItem] = []
+        for row in rows:
+            versioning_item: VersioningItem = self._decrypt_versioning_item(
+                self.history_log.read_at(row.offset).payload
+            )
+            versioning_item.last_seen = row.last_seen
+            items.append(versioning_item)
+
+        return HistoryPage(
+            items=items,
+            signatures=[row.signature.hex() for row in rows],
+            next_before=rows[-1].timestamp if has_more and rows else None,
+        )
+
+    @_user_locked
+    def course_history(self, course_name: str) -> GradeSeries | None:
+        """Return the grade of a course at every snapshot, or None if the course is
+        in none of them.
+
+        The grades of every course are kept in one encrypted file of packed arrays
+        ("GRADES.series"), which is updated as snapshots are saved and removed, so
+        this is one decrypt no matter how many snapshots there are. If the file does
+        not exist yet, it is built from the history log.
+        """
+
+        self._migrate_versions_file()
+        return self._load_grade_series().get(course_name)
+
+    @_user_locked
+    def migrate(
+        self,
+        old_password: str,
+        new_password: str,
+        progress: Optional[Callable[[int, int], None]] = None,
+    ):
+        """Migrate everything for a user from an old password to a new password.
+
+        Everything is re-encrypted one item at a time (across
+        :data:`ENCRYPTION_WORKERS` threads) into a staging copy of the user's storage,
+        which then replaces the user's storage at once (see
+        :meth:`UserStorage.replacement`). Memory use doesn't grow with the history, and
+        an interrupted migration changes nothing. `progress` (if given) is called with
+        the number of items migrated and the total after every item.
+        """
 
         # Set decryption to use the old password
-        _update_encryption(old_password)
+        self.password: str = old_password
+        self.hash_data: HashData = self._load_hash_data()
         self._check_credentials(self.hash_data)
-
-        # Load all files
-        gradebook_files: list = []  # In the same order as the versioning list
-        versioning_list: list[VersioningItem] = self.list_history()
-        version: VersioningItem
-        for version in versioning_list:
-            gradebook_files.append(self.load(version.timestamp))
+        self.fernet: Fernet = self._get_fernet(self.hash_data.key)
+        old_fernet: Fernet = self.fernet
+        self._migrate_versions_file()
+        live_records, seen_records, _ = self._replay_history_log()
+        blob_names: list[str] = self.storage.blob_names()
 
         # Set encryption to use the new password
-        _update_encryption(new_password)
-        self._load_hash_data()
+        self.password: str = new_password
+        self.hash_data: HashData = self._new_hash_data()
+        self.fernet: Fernet = self._get_fernet(self.hash_data.key)
 
-        # Save all files
-        self._save_versioning_list(versioning_list)
-        for gradebook in gradebook_files:
-            # Deleting is probably not needed
-            # self.remove_gradebook_entry(version.timestamp, update_versioning_list=False)
-            self._save_gradebook(gradebook)
+        total: int = 2 * len(live_records) + len(blob_names)
+        done: int = 0
+
+        def _step():
+            nonlocal done
+            done += 1
+            if progress is not None:
+                progress(done, total)
+
+        def _migrate_item(record: LogRecord) -> VersioningItem:
+            try:
+                decrypted: bytes = decompress(old_fernet.decrypt(record.payload))
+            except InvalidToken as err:
+                raise InvalidCredentialsException() from err
+            versioning_item: VersioningItem = VersioningItem.from_dict(loads(decrypted))
+            if seen_record := seen_records.get(record.timestamp):
+                (versioning_item.last_seen,) = SEEN_PAYLOAD.unpack(seen_record.payload)
+            return versioning_item
+
+        def _reencrypt(name_and_token: tuple[Any, bytes]) -> tuple[Any, bytes]:
+            # Snapshots and blobs are re-encrypted as they are, so deltas stay deltas
+            # and nothing is compressed again
+            name, token = name_and_token
+            try:
+                return name, self.fernet.encrypt(old_fernet.decrypt(token))
+            except InvalidToken as err:
+                raise InvalidCredentialsException() from err
+
+        with self.storage.replacement() as staging:
+            versioning_list: list[VersioningItem] = []
+            for versioning_item in _map_bounded(
+                _migrate_item, live_records.values(), ENCRYPTION_WORKERS
+            ):
+                versioning_list.append(versioning_item)
+                _step()
+            self._save_versioning_list(versioning_list, storage=staging)
+
+            for timestamp, token in _map_bounded(
+                _reencrypt,
+                (
+                    (timestamp, self.storage.read_snapshot(timestamp))
+                    for timestamp in live_records
+                ),
+                ENCRYPTION_WORKERS,
+            ):
+                staging.write_snapshot(timestamp, token)
+                _step()
+
+            for name, token in _map_bounded(
+                _reencrypt,
+                (
+                    (name, self.storage.read_blob(name))
+                    for name in blob_names
+                    if name != HASH_FILENAME
+                ),
+                ENCRYPTION_WORKERS,
+            ):
+                staging.write_blob(name, token)
+                _step()
+            staging.write_blob(HASH_FILENAME, bytes(self.hash_data.hash, "utf-8"))
+            if HASH_FILENAME in blob_names:
+                _step()
+
+        # The key for the old password is no longer of any use
+        old_user_hash, old_digest = self._key_cache_key(old_password)
+        DERIVED_KEY_CACHE.discard((old_user_hash, old_digest))
+        SNAPSHOT_CACHE.discard_matching(
+            lambda key: key[:2] == (old_user_hash, old_digest)
+        )
+
+    @_user_locked
+    def import_history(
+        self,
+        gradebooks: Iterable["GradebookInformation"],
+        batch_size: int = IMPORT_BATCH_SIZE,
+    ) -> int:
+        """Save many gradebooks (such as from an export, see :mod:`history_import`) in
+        the order given, returning how many snapshots were added.
+
+        Each gradebook is saved like :meth:`save` would, but `batch_size` at a time:
+        the snapshots of a batch are encrypted across :data:`ENCRYPTION_WORKERS`
+        threads and written together, with one append to the history log and one
+        update of the grade series. The history index is rewritten once at the end
+        (even if a batch fails). Gradebooks from a time already in the history are
+        skipped.
+
+        Batches are written as they're read, so gradebooks should be validated up
+        front (see `history_import.stage_gradebooks`) for an import to be all or
+        nothing.
+        """
+
+        self._check_credentials(self.hash_data)
+        self._migrate_versions_file()
+        live_records, seen_records, _ = self._replay_history_log()
+        # Including the times items were seen again, which aren't snapshots
+        known_timestamps: set[int] = set(live_records) | {
+            SEEN_PAYLOAD.unpack(record.payload)[0] for record in seen_records.values()
+        }
+        # A stale index is rebuilt when it is next read
+        index_rows: dict[int, IndexRow] | None = (
+            {row.timestamp: row for row in self.history_index.rows()}
+            if self.history_index.log_size() == self.history_log.size()
+            else None
+        )
+        previous: VersioningItem | None = self.latest_history_item()
+        grade_series: dict[str, GradeSeries] = self._load_grade_series()
+        imported: int = 0
+
+        gradebooks: Iterator["GradebookInformation"] = iter(gradebooks)
+        # The log size up to which the index rows are known to be complete
+        committed_log_size: int = self.history_log.size()
+        try:
+            while batch := list(islice(gradebooks, batch_size)):
+                records: list[LogRecord] = []
+                versioning_items: list[VersioningItem] = []
+                snapshots: list[tuple[int, bytes]] = []
+                for gradebook in batch:
+                    if gradebook.last_updated in known_timestamps:
+                        continue
+                    known_timestamps.add(gradebook.last_updated)
+
+                    # Same grades as the gradebook before, so just note that it's
+                    # current
+                    content_hash: str = gradebook.content_hash()
+                    if previous is not None and previous.content_hash == content_hash:
+                        previous.last_seen = gradebook.last_updated
+                        records.append(
+                            LogRecord(
+                                kind=RecordKind.SEEN,
+                                timestamp=previous.timestamp,
+                                payload=SEEN_PAYLOAD.pack(gradebook.last_updated),
+                            )
+                        )
+                        continue
+
+                    snapshots.append(
+                        (
+                            gradebook.last_updated,
+                            self._serialize_snapshot(
+                                gradebook.last_updated,
+                                gradebook.to_dict(),
+                                base_timestamp=(
+                                    previous.timestamp if previous is not None else None
+                                ),
+                            ),
+                        )
+                    )
+                    previous: VersioningItem = VersioningItem(
+                        timestamp=gradebook.last_updated,
+                        courses=[
+                            VersioningCourseItem(course.name, course.grade)
+                            for course in gradebook.courses
+                        ],
+                        content_hash=content_hash,
+                    )
+                    versioning_items.append(previous)
+                    records.append(self._versioning_item_record(previous))
+                if not records:
+                    continue
+
+                with self.storage.transaction():
+                    for timestamp, token in _map_bounded(
+                        lambda snapshot: (snapshot[0], self._encrypt(snapshot[1])),
+                        snapshots,
+                        ENCRYPTION_WORKERS,
+                    ):
+                        self.storage.write_snapshot(timestamp, token)
+                    self.history_log.append(records)
+                    for versioning_item in versioning_items:
+                        self._add_to_grade_series(grade_series, versioning_item)
+                    self._save_grade_series(grade_series)
+                imported += len(versioning_items)
+                committed_log_size: int = self.history_log.size()
+
+                if index_rows is not None:
+                    puts: dict[int, LogRecord] = {
+                        record.timestamp: record
+                        for record in records
+                        if record.kind == RecordKind.PUT
+                    }
+                    for versioning_item in versioning_items:
+                        index_rows[versioning_item.timestamp] = self._index_row(
+                            puts[versioning_item.timestamp], versioning_item
+                        )
+                    for record in records:
+                        if (
+                            record.kind == RecordKind.SEEN
+                            and record.timestamp in index_rows
+                        ):
+                            (index_rows[record.timestamp].last_seen,) = (
+                                SEEN_PAYLOAD.unpack(record.payload)
+                            )
+        finally:
+            # If a batch failed partway, the log is longer than what the rows cover,
+            # so the index is still seen as stale and is rebuilt when it's next read
+            if index_rows is not None:
+                self.history_index.rewrite(
+                    list(index_rows.values()), committed_log_size
+                )
+        return imported
 
     @staticmethod
     def remove_user_data(username: str):
         """Remove the user directory"""
 
-        rmtree(VERSIONING_PATH / sha256(bytes(username, "utf-8")).hexdigest())
+        user_hash: str = sha256(bytes(username, "utf-8")).hexdigest()
+        DERIVED_KEY_CACHE.discard_matching(lambda key: key[0] == user_hash)
+        SNAPSHOT_CACHE.discard_matching(lambda key: key[0] == user_hash)
+        get_storage_engine().user(user_hash).remove()
 
+    @_user_locked
     def remove_gradebook_entry(
         self, timestamp: int, update_versioning_list: bool = True
     ):
-        """Remove a gradebook entry, potentially updating the version list"""
+        """Remove a gradebook entry, potentially updating the version list (with a
+        tombstone in the history log)
+        """
 
-        unlink(self.path / f"{timestamp}")
+        with self.storage.transaction():
+            self._rebase_dependent_snapshot(timestamp)
+            self.storage.delete_snapshot(timestamp)
+            SNAPSHOT_CACHE.discard(self._snapshot_cache_key(timestamp))
 
-        if not update_versioning_list:
-            return
-        versioning_list: list[VersioningItem] = self.list_history()
-        delete_idx: int
-        for idx, version in enumerate(versioning_list):
-            if version.timestamp == timestamp:
-                delete_idx: int = idx
-                break
-        else:
-            return
-        versioning_list.pop(delete_idx)
-        self._save_versioning_list(versioning_list)
+            if not update_versioning_list:
+                return
+            self._migrate_versions_file()
+            log_size: int = self.history_log.size()
+            new_log_size: int = self.history_log.append(
+                [LogRecord(RecordKind.DELETE, timestamp)]
+            )
+            self.history_index.remove(timestamp, log_size, new_log_size)
+            self._update_grade_series(
+                lambda series: self._remove_from_grade_series(series, timestamp)
+            )
+
+    @_user_locked
+    def remove_gradebook_entries(self, timestamps: Iterable[int]) -> tuple[int, int]:
+        """Remove many gradebook entries at once (see :meth:`remove_gradebook_entry`),
+        returning how many snapshots were removed and their size in bytes.
+
+        A snapshot is stored as a delta against the item before it in the history, so
+        every kept snapshot right after a removed one is stored again against the
+        nearest kept item before it. The history log gets one append of tombstones,
+        and the history index and the grade series are rewritten once.
+        """
+
+        timestamps: set[int] = set(timestamps)
+        removed_count: int = 0
+        removed_bytes: int = 0
+        with self.storage.transaction():
+            history: list[int] = [
+                versioning_item.timestamp for versioning_item in self.list_history()
+            ]
+            timestamps &= set(history)
+            if not timestamps:
+                return 0, 0
+
+            # Rebase before anything is removed, as bases may still be needed
+            kept_timestamp: int | None = None
+            for previous_timestamp, timestamp in zip([None] + history, history):
+                if timestamp in timestamps:
+                    continue
+                if previous_timestamp in timestamps:
+                    gradebook_dict, _ = self._load_snapshot(timestamp)
+                    self._save_snapshot(
+                        timestamp, gradebook_dict, base_timestamp=kept_timestamp
+                    )
+                kept_timestamp: int = timestamp
+
+            for timestamp in timestamps:
+                try:
+                    removed_bytes += len(self.storage.read_snapshot(timestamp))
+                    self.storage.delete_snapshot(timestamp)
+                    removed_count += 1
+                except FileNotFoundError:
+                    pass
+                SNAPSHOT_CACHE.discard(self._snapshot_cache_key(timestamp))
+
+            log_size: int = self.history_log.size()
+            new_log_size: int = self.history_log.append(
+                [LogRecord(RecordKind.DELETE, timestamp) for timestamp in timestamps]
+            )
+            # A stale index is rebuilt when it is next read
+            if self.history_index.log_size() == log_size:
+                self.history_index.rewrite(
+                    [
+                        row
+                        for row in self.history_index.rows()
+                        if row.timestamp not in timestamps
+                    ],
+                    new_log_size,
+                )
+
+            def _remove_all(series: dict[str, GradeSeries]):
+                for timestamp in timestamps:
+                    self._remove_from_grade_series(series, timestamp)
+
+            self._update_grade_series(_remove_all)
+        return removed_count, removed_bytes
 
     @staticmethod
     def hash_for_user(username: str):
         """Returns the hash for a user"""
 
-        read_hash: str
-        with open(
-            VERSIONING_PATH
-            / sha256(bytes(username, "utf-8")).hexdigest()
-            / HASH_FILENAME,
-            "r",
-            encoding="utf-8",
-        ) as hash_file:
-            read_hash: str = hash_file.read()
+        read_hash: str = str(
+            get_storage_engine()
+            .user(sha256(bytes(username, "utf-8")).hexdigest())
+            .read_blob(HASH_FILENAME),
+            "utf-8",
+        )
 
         return read_hash
 
@@ -223,6 +858,20 @@ class Versioning:
     def _get_fernet(self, key: bytes) -> Fernet:
         return Fernet(key=key)
 
+    def _encrypt(self, data: bytes) -> bytes:
+        """Compress (see :mod:`compression`) and encrypt data"""
+
+        compressed: bytes = compress(data, self.compression)
+        with ENCRYPT_SECONDS.time():
+            return self.fernet.encrypt(compressed)
+
+    def _decrypt(self, token: bytes) -> bytes:
+        """Decrypt and decompress data. Raises :class:`InvalidToken` like Fernet."""
+
+        with DECRYPT_SECONDS.time():
+            decrypted: bytes = self.fernet.decrypt(token)
+        return decompress(decrypted)
+
     def _load_hash_data(self, force: bool = False) -> HashData:
         """Load hash data from the hash file, or, if unavailable, create a new file
         with the hash data. The hash data is returned as: {"key": bytes, "hash": str}
@@ -239,31 +888,333 @@ class Versioning:
         return hash_data
 
     def _save_hash_data(self, hash_data: HashData):
-        with open(self.path / HASH_FILENAME, "w", encoding="utf-8") as hash_file:
-            hash_file.seek(0)  # Pointless
-            hash_file.truncate(0)  # Also probably pointless (it never changes size)
-            hash_file.write(hash_data.hash)
-
-    def _save_gradebook(self, gradebook):
-        encrypted_serialized: bytes = self.fernet.encrypt(
-            bytes(dumps(asdict(gradebook)), "utf-8")
+        self.storage.write_blob(HASH_FILENAME, bytes(hash_data.hash, "utf-8"))
+
+    def _snapshot_cache_key(self, timestamp: int) -> tuple[str, str, int]:
+        return *self._key_cache_key(self.password), timestamp
+
+    def _read_snapshot_bytes(self, timestamp: int) -> bytes:
+        """Return the decrypted contents of a snapshot file"""
+
+        encrypted_gradebook: bytes = self.storage.read_snapshot(timestamp)
+        try:
+            return self._decrypt(encrypted_gradebook)
+        except InvalidToken as err:
+            raise InvalidCredentialsException() from err
+
+    def _write_snapshot_bytes(self, timestamp: int, gradebook_file_contents: bytes):
+        """Encrypt and write the contents of a snapshot file"""
+
+        self.storage.write_snapshot(timestamp, self._encrypt(gradebook_file_contents))
+
+    def _read_stored_snapshot(self, timestamp: int) -> dict:
+        """Return a snapshot as stored: either a delta (with a "format" of
+        :data:`DELTA_FORMAT`) or a full serialized gradebook of the current schema
+        """
+
+        stored: bytes = self._read_snapshot_bytes(timestamp)
+        if is_binary_snapshot(stored):
+            return decode_snapshot(stored)
+        stored_dict: dict = loads(stored)
+        if stored_dict.get("format") == DELTA_FORMAT:
+            return stored_dict
+        if stored_dict.get("format") == JSON_FORMAT:
+            return upgrade(stored_dict["gradebook"], stored_dict["schema"])
+        return upgrade(stored_dict, 0)  # From before the binary snapshot format
+
+    def _load_snapshot(self, timestamp: int) -> tuple[dict, int]:
+        """Return the serialized gradebook at the timestamp, along with how many deltas
+        away from a keyframe it is.
+
+        Deltas are applied starting from the nearest keyframe (or the nearest snapshot
+        in :data:`SNAPSHOT_CACHE`), and every snapshot built on the way is cached.
+        """
+
+        deltas: list[tuple[int, dict]] = []  # Newest first
+        current_timestamp: int = timestamp
+        while (
+            cached := SNAPSHOT_CACHE.get(self._snapshot_cache_key(current_timestamp))
+        ) is None:
+            stored: dict = self._read_stored_snapshot(current_timestamp)
+            if stored.get("format") != DELTA_FORMAT:
+                cached = (stored, 0)
+                SNAPSHOT_CACHE.put(self._snapshot_cache_key(current_timestamp), cached)
+                break
+            deltas.append((current_timestamp, stored))
+            current_timestamp: int = stored["base"]
+
+        gradebook_dict, depth = cached
+        for current_timestamp, stored in reversed(deltas):
+            gradebook_dict: dict = upgrade(
+                apply_delta(gradebook_dict, stored["delta"]), stored.get("schema", 0)
+            )
+            depth: int = stored["depth"]
+            SNAPSHOT_CACHE.put(
+                self._snapshot_cache_key(current_timestamp), (gradebook_dict, depth)
+            )
+        return gradebook_dict, depth
+
+    def _save_snapshot(
+        self, timestamp: int, gradebook_dict: dict, base_timestamp: int | None = None
+    ):
+        """Save a serialized gradebook (see :meth:`_serialize_snapshot`)"""
+
+        self._write_snapshot_bytes(
+            timestamp,
+            self._serialize_snapshot(timestamp, gradebook_dict, base_timestamp),
         )
-        with open(self.path / f"{gradebook.last_updated}", "wb") as grade_file:
-            grade_file.seek(0)  # Pointless
-            grade_file.truncate(0)  # May be an existing file
-            grade_file.write(encrypted_serialized)
 
-    def _save_versioning_list(self, versioning_list: list[VersioningItem]):
-        encrypted_versioning_list: bytes = self.fernet.encrypt(
-            bytes(
-                dumps([asdict(versioning_item) for versioning_item in versioning_list]),
+    def _serialize_snapshot(
+        self, timestamp: int, gradebook_dict: dict, base_timestamp: int | None = None
+    ) -> bytes:
+        """Return the contents of a snapshot file (before encryption) for a serialized
+        gradebook, caching it. If there is a base snapshot and the keyframe interval
+        has not been reached, only the delta against the base is stored. Otherwise,
+        the gradebook is stored in the binary snapshot format.
+        """
+
+        try:
+            stored: bytes = encode_snapshot(gradebook_dict)
+        except TypeError as err:
+            Logger.warn(f"Storing a snapshot as JSON as it can't be encoded ({err})")
+            stored: bytes = bytes(
+                dumps(
+                    {
+                        "format": JSON_FORMAT,
+                        "schema": SCHEMA_VERSION,
+                        "gradebook": gradebook_dict,
+                    }
+                ),
                 "utf-8",
             )
+        depth: int = 0
+        if base_timestamp is not None and base_timestamp != timestamp:
+            try:
+                base_dict, base_depth = self._load_snapshot(base_timestamp)
+            except FileNotFoundError:
+                base_dict, base_depth = None, None
+            if base_depth is not None and base_depth + 1 < self.keyframe_interval:
+                delta: bytes = bytes(
+                    dumps(
+                        {
+                            "format": DELTA_FORMAT,
+                            "schema": SCHEMA_VERSION,
+                            "base": base_timestamp,
+                            "depth": base_depth + 1,
+                            "delta": compute_delta(base_dict, gradebook_dict),
+                        }
+                    ),
+                    "utf-8",
+                )
+                # Everything changed, so the delta isn't worth it
+                if len(delta) < len(stored):
+                    stored, depth = delta, base_depth + 1
+
+        SNAPSHOT_CACHE.put(self._snapshot_cache_key(timestamp), (gradebook_dict, depth))
+        return stored
+
+    def _rebase_dependent_snapshot(self, timestamp: int):
+        """A snapshot is stored as a delta against the snapshot saved before it, so
+        before a snapshot is removed, the one saved after it (if it depends on it) is
+        stored again against the removed snapshot's own base.
+        """
+
+        timestamps: list[int] = [
+            versioning_item.timestamp for versioning_item in self.list_history()
+        ]
+        if timestamp not in timestamps:
+            return
+        following: list[int] = timestamps[timestamps.index(timestamp) + 1 :]
+        if not following:
+            return
+
+        try:
+            dependent: dict = self._read_stored_snapshot(following[0])
+            removed: dict = self._read_stored_snapshot(timestamp)
+        except FileNotFoundError:
+            return
+        if dependent.get("format") != DELTA_FORMAT or dependent["base"] != timestamp:
+            return
+
+        gradebook_dict, _ = self._load_snapshot(following[0])
+        self._save_snapshot(
+            following[0],
+            gradebook_dict,
+            base_timestamp=(
+                removed["base"] if removed.get("format") == DELTA_FORMAT else None
+            ),
+        )
+
+    def _decrypt_versioning_item(self, payload: bytes) -> VersioningItem:
+        try:
+            decrypted = self._decrypt(payload).decode("utf-8")
+        except InvalidToken as err:
+            raise InvalidCredentialsException() from err
+        return VersioningItem.from_dict(loads(decrypted))
+
+    def _versioning_item_record(self, versioning_item: VersioningItem) -> LogRecord:
+        return LogRecord(
+            kind=RecordKind.PUT,
+            timestamp=versioning_item.timestamp,
+            payload=self._encrypt(bytes(dumps(versioning_item.to_dict()), "utf-8")),
+        )
+
+    def _index_row(
+        self, record: LogRecord, versioning_item: VersioningItem
+    ) -> IndexRow:
+        """Return the history index row of an item whose record is in the log. The
+        signature is keyed with the encryption key, so the (unencrypted) index does
+        not reveal the course names.
+        """
+
+        signature: bytes = hmac_new(
+            self.hash_data.key,
+            b"\0".join(
+                bytes(course.name, "utf-8") for course in versioning_item.courses
+            ),
+            sha256,
+        ).digest()[:8]
+        return IndexRow(
+            versioning_item.timestamp,
+            record.offset,
+            versioning_item.last_seen,
+            signature,
+        )
+
+    @staticmethod
+    def _add_to_grade_series(
+        series: dict[str, GradeSeries], versioning_item: VersioningItem
+    ):
+        for course in versioning_item.courses:
+            series.setdefault(course.name, GradeSeries()).put(
+                versioning_item.timestamp, course.grade
+            )
+
+    @staticmethod
+    def _remove_from_grade_series(series: dict[str, GradeSeries], timestamp: int):
+        for name, course_series in list(series.items()):
+            course_series.remove(timestamp)
+            if not course_series.timestamps:
+                del series[name]
+
+    def _load_grade_series(self) -> dict[str, GradeSeries]:
+        """Return the grade series of every course, building (and saving) them from
+        the history log if they have not been saved yet
+        """
+
+        try:
+            encrypted_series: bytes = self.storage.read_blob(GRADE_SERIES_FILENAME)
+        except FileNotFoundError:
+            series: dict[str, GradeSeries] = {}
+            for versioning_item in self.list_history():
+                self._add_to_grade_series(series, versioning_item)
+            self._save_grade_series(series)
+            return series
+
+        try:
+            return decode_grade_series(self._decrypt(encrypted_series))
+        except InvalidToken as err:
+            raise InvalidCredentialsException() from err
+
+    def _save_changes(self, from_timestamp: int, gradebook_dict: dict):
+        """Save what changed from a snapshot to the gradebook being saved. The
+        snapshot was just loaded as the base of the new one, so it's cached.
+        """
+
+        try:
+            from_dict, _ = self._load_snapshot(from_timestamp)
+        except FileNotFoundError:  # The old record is for another snapshot, so unused
+            return
+        change_record: ChangeRecord = ChangeRecord(
+            from_timestamp,
+            self.serialized.last_updated,
+            diff_snapshots(from_dict, gradebook_dict),
+        )
+        self.storage.write_blob(
+            CHANGES_FILENAME,
+            self._encrypt(bytes(dumps(change_record.to_dict()), "utf-8")),
         )
-        with open(self.path / VERSIONS_FILENAME, "wb") as versions_file:
-            versions_file.seek(0)  # Pointless
-            versions_file.truncate(0)  # Also probably pointless, we expand size
-            versions_file.write(encrypted_versioning_list)
+
+    def _save_grade_series(self, series: dict[str, GradeSeries]):
+        self.storage.write_blob(
+            GRADE_SERIES_FILENAME, self._encrypt(encode_grade_series(series))
+        )
+
+    def _update_grade_series(self, update: Callable[[dict[str, GradeSeries]], None]):
+        """Update the saved grade series in place with a function"""
+
+        series: dict[str, GradeSeries] = self._load_grade_series()
+        update(series)
+        self._save_grade_series(series)
+
+    def _replay_history_log(
+        self,
+    ) -> tuple[dict[int, LogRecord], dict[int, LogRecord], int]:
+        """Read the history log, returning the live "put" and "seen" records by
+        timestamp, and how many records were read in total
+        """
+
+        live_records: dict[int, LogRecord] = {}
+        seen_records: dict[int, LogRecord] = {}
+        record_count: int = 0
+        for record in self.history_log.read():
+            record_count += 1
+            if record.kind == RecordKind.PUT:
+                live_records[record.timestamp] = record
+            elif record.kind == RecordKind.SEEN:
+                seen_records[record.timestamp] = record
+            else:
+                live_records.pop(record.timestamp, None)
+                seen_records.pop(record.timestamp, None)
+        return live_records, seen_records, record_count
+
+    def _save_versioning_list(
+        self,
+        versioning_list: list[VersioningItem],
+        storage: Optional[UserStorage] = None,
+    ):
+        """Rewrite the whole history log (and index) with the versioning list, in the
+        user's storage unless another one is given
+        """
+
+        storage: UserStorage = storage or self.storage
+        records: list[LogRecord] = [
+            self._versioning_item_record(versioning_item)
+            for versioning_item in versioning_list
+        ]
+        with storage.transaction():
+            log_size: int = storage.history_log.rewrite(records)
+            storage.history_index.rewrite(
+                [
+                    self._index_row(record, versioning_item)
+                    for record, versioning_item in zip(records, versioning_list)
+                ],
+                log_size,
+            )
+
+    def _migrate_versions_file(self):
+        """Move the items of a "VERSIONS.json" (from before the history log) into the
+        history log. This only does anything the first time the history is opened.
+        """
+
+        if self.history_log.exists() or not self.storage.blob_exists(VERSIONS_FILENAME):
+            return
+
+        try:
+            decrypted = self._decrypt(self.storage.read_blob(VERSIONS_FILENAME)).decode(
+                "utf-8"
+            )
+        except InvalidToken as err:
+            raise InvalidCredentialsException() from err
+        with self.storage.transaction():
+            self._save_versioning_list(
+                [
+                    VersioningItem.from_dict(version_item_dict)
+                    for version_item_dict in loads(decrypted)
+                ]
+            )
+            self.storage.delete_blob(VERSIONS_FILENAME)
+        Logger.log(f"Migrated {VERSIONS_FILENAME} to {HISTORY_LOG_FILENAME}")
 
     @property
     def hash(self) -> str:
@@ -289,22 +1240,57 @@ class Versioning:
             ),
         ).hexdigest()
 
+    def _key_cache_key(self, password: str) -> tuple[str, str]:
+        """Returns the :data:`DERIVED_KEY_CACHE` key for a password. The credentials
+        are only stored as a one-way digest.
+        """
+
+        digest: str = sha256(
+            b"\0".join(
+                bytes(part, "utf-8")
+                for part in ("derived-key", self.username, password, self.master_key)
+            )
+        ).hexdigest()
+        return self.storage.user_hash, digest
+
     def _new_hash_data(self) -> HashData:
-        """Return hash data"""
+        """Return hash data. The key derivation is expensive, so derived keys are
+        cached in :data:`DERIVED_KEY_CACHE`.
+        """
+
+        cache_key: tuple[str, str] = self._key_cache_key(self.password)
+        if (key := DERIVED_KEY_CACHE.get(cache_key)) is not None:
+            return HashData(key, hash=self.hash)
 
         salt: bytes = bytes(self.master_key, "utf-8")
         kdf: PBKDF2HMAC = PBKDF2HMAC(
             algorithm=hashes.SHA256(),
             length=32,
             salt=salt,
-            iterations=480000,
+            iterations=KDF_ITERATIONS,
         )
         key: bytes = bytes(self.key_hash(self.password), "ASCII")
-        key: bytes = urlsafe_b64encode(kdf.derive(key))
+        with KDF_SECONDS.time():
+            key: bytes = urlsafe_b64encode(kdf.derive(key))
+        DERIVED_KEY_CACHE.put(cache_key, key)
 
+        stats = DERIVED_KEY_CACHE.stats()
+        Logger.log(
+            f"Derived a versioning key (key cache: {stats.hits} hits, "
+            f"{stats.misses} misses, {stats.size}/{stats.max_size} entries)"
+        )
         return HashData(key, hash=self.hash)
 
+    @staticmethod
+    def key_cache_stats() -> CacheStats:
+        """Returns the hit / miss counters of the derived key cache"""
+
+        return DERIVED_KEY_CACHE.stats()
+
+    @_user_locked
     def mkdir(self):
-        """Make the user versioning history directory"""
+        """Make the user versioning history directory (or whatever the storage engine
+        keeps instead)
+        """
 
-        self.path.mkdir(parents=True, exist_ok=True)
+        self.storage.create()
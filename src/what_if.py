@@ -0,0 +1,269 @@
+"""
+What-if grade calculator for StudentVue Data Viewer
+Licensed under the Unlicense (P.D.)
+2026-10-16
+
+Works out course grades for hypothetical scores. A gradebook is turned into columns
+of its assignments once (see :func:`assignment_columns`), and scenarios are worked
+out together as rows of a matrix of the points earned and possible, so a sweep of
+many scenarios costs about as much as one.
+
+A course grade is the weighted average of the percentages of its categories (e.g.
+"Homework" or "Final Exam", see `Course.weights`) that have graded assignments, or
+the percentage of all of its points if it has no weights.
+"""
+
+### Setup ###
+from dataclasses import dataclass
+from typing import Optional
+import numpy as np
+from gradebook import GradebookInformation
+
+POINTS_CATEGORY: str = ""  # Category of every assignment of a course without weights
+
+
+### Dataclasses ###
+@dataclass(frozen=True, slots=True)
+class AssignmentColumns:
+    """The assignments of a gradebook as columns, with their categories"""
+
+    courses: tuple[str, ...]
+    # Index of the first assignment with a course, name, and due date
+    assignments: dict[tuple[str, str, str], int]
+    names: dict[tuple[str, str], int]  # Index of the first with a course and name
+    categories: dict[tuple[str, str], int]  # Index of a course's category
+    category: np.ndarray  # Category index of each assignment
+    earned: np.ndarray  # Of each assignment, NaN if not known
+    possible: np.ndarray
+    category_course: np.ndarray  # Course index of each category
+    category_weight: np.ndarray
+
+
+@dataclass(slots=True)
+class HypotheticalScore:
+    """A score of a scenario, either for an assignment of the gradebook (matched by
+    its name, and due date if given) or for a new one in a category
+    """
+
+    course: str
+    earned: Optional[float]  # None to leave an assignment ungraded
+    possible: Optional[float] = None  # None to keep an assignment's points possible
+    name: Optional[str] = None  # None for a new assignment
+    due_date: Optional[str] = None
+    category: Optional[str] = None  # Of a new assignment
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "HypotheticalScore":
+        """Decode from the serialized form, raising `ValueError` if it's not valid"""
+
+        if not isinstance(data, dict) or not isinstance(data.get("course"), str):
+            raise ValueError("Expected a score with a course")
+        for name in ("name", "due_date", "category"):
+            if not isinstance(data.get(name), (str, type(None))):
+                raise ValueError(f'Invalid score field "{name}"')
+        score: HypotheticalScore = cls(
+            data["course"],
+            _number_or_none(data.get("earned")),
+            _number_or_none(data.get("possible")),
+            data.get("name"),
+            data.get("due_date"),
+            data.get("category"),
+        )
+        if score.name is None and (score.category is None or score.possible is None):
+            raise ValueError("A new assignment needs a category and points possible")
+        return score
+
+
+### Auxiliary functions ###
+def _number_or_none(value) -> Optional[float]:
+    if value is None:
+        return None
+    if not isinstance(value, (int, float)) or isinstance(value, bool):
+        raise ValueError(f"Expected a number, got {value!r}")
+    return float(value)
+
+
+def _sum_by(index: np.ndarray, values: np.ndarray, count: int) -> np.ndarray:
+    """Sum each row of `values` by the column's `index` (0 to `count` - 1)"""
+
+    rows: int = values.shape[0]
+    offset_index: np.ndarray = index + count * np.arange(rows)[:, np.newaxis]
+    return np.bincount(
+        offset_index.ravel(), weights=values.ravel(), minlength=rows * count
+    ).reshape(rows, count)
+
+
+### Columns ###
+def assignment_columns(gradebook: GradebookInformation) -> AssignmentColumns:
+    """Return the columns of a gradebook's assignments. An assignment in a category
+    the course has no weight for doesn't count towards its grade.
+    """
+
+    assignments: dict[tuple[str, str, str], int] = {}
+    names: dict[tuple[str, str], int] = {}
+    categories: dict[tuple[str, str], int] = {}
+    category_course: list[int] = []
+    category_weight: list[float] = []
+    category: list[int] = []
+    earned: list[Optional[float]] = []
+    possible: list[Optional[float]] = []
+
+    def add_category(course_idx: int, name: str, weight: float) -> int:
+        categories[(gradebook.courses[course_idx].name, name)] = len(category_course)
+        category_course.append(course_idx)
+        category_weight.append(weight)
+        return len(category_course) - 1
+
+    for course_idx, course in enumerate(gradebook.courses):
+        weights: dict[str, float] = {
+            name: weight
+            for name, weight in course.weights.items()
+            if weight is not None and weight > 0
+        }
+        for name, weight in weights.items():
+            add_category(course_idx, name, weight)
+        if not weights:
+            add_category(course_idx, POINTS_CATEGORY, 1.0)
+        for assignment in course.assignments:
+            name: str = assignment.weight if weights else POINTS_CATEGORY
+            if (course.name, name) not in categories:
+                add_category(course_idx, name, 0.0)
+            assignments.setdefault(
+                (course.name, assignment.name, assignment.due_date), len(category)
+            )
+            names.setdefault((course.name, assignment.name), len(category))
+            category.append(categories[(course.name, name)])
+            earned.append(assignment.earned)
+            possible.append(assignment.possible)
+
+    return AssignmentColumns(
+        courses=tuple(course.name for course in gradebook.courses),
+        assignments=assignments,
+        names=names,
+        categories=categories,
+        category=np.array(category, dtype=np.intp),
+        earned=np.array(earned, dtype=np.float64),  # None becomes NaN
+        possible=np.array(possible, dtype=np.float64),
+        category_course=np.array(category_course, dtype=np.intp),
+        category_weight=np.array(category_weight, dtype=np.float64),
+    )
+
+
+### Grades ###
+def course_grades(
+    columns: AssignmentColumns,
+    category: np.ndarray,
+    earned: np.ndarray,
+    possible: np.ndarray,
+) -> np.ndarray:
+    """Return the grade (percent) of every course for every row of points earned and
+    possible, as (rows, courses). A grade is NaN if a course has nothing graded.
+    """
+
+    graded: np.ndarray = ~(np.isnan(earned) | np.isnan(possible))
+    category_count: int = len(columns.category_weight)
+    category_earned: np.ndarray = _sum_by(
+        category, np.where(graded, earned, 0.0), category_count
+    )
+    category_possible: np.ndarray = _sum_by(
+        category, np.where(graded, possible, 0.0), category_count
+    )
+
+    counted: np.ndarray = category_possible > 0
+    weight: np.ndarray = np.where(counted, columns.category_weight, 0.0)
+    category_percent: np.ndarray = np.divide(
+        category_earned,
+        category_possible,
+        out=np.zeros_like(category_earned),
+        where=counted,
+    )
+    index: np.ndarray = np.broadcast_to(columns.category_course, weight.shape)
+    course_count: int = len(columns.courses)
+    course_weight: np.ndarray = _sum_by(index, weight, course_count)
+    weighted: np.ndarray = _sum_by(index, weight * category_percent, course_count)
+    return np.divide(
+        weighted * 100,
+        course_weight,
+        out=np.full_like(weighted, np.nan),
+        where=course_weight > 0,
+    )
+
+
+def scenario_grades(
+    columns: AssignmentColumns, scenarios: list[list[HypotheticalScore]]
+) -> np.ndarray:
+    """Return the grade of every course in every scenario, as (scenarios, courses).
+    Raises `KeyError` if a score is for an unknown course, assignment, or category.
+
+    New assignments of every scenario are added as columns, which are ungraded in
+    the other scenarios, so that all scenarios are worked out at once.
+    """
+
+    rows: list[int] = []
+    columns_idx: list[int] = []
+    earned_values: list[float] = []
+    possible_values: list[float] = []
+    new_category: list[int] = []
+    assignment_count: int = len(columns.category)
+
+    for row, scores in enumerate(scenarios):
+        for score in scores:
+            if score.name is not None:
+                column: int = (
+                    columns.assignments[(score.course, score.name, score.due_date)]
+                    if score.due_date is not None
+                    else columns.names[(score.course, score.name)]
+                )
+            else:
+                new_category.append(
+                    columns.categories[(score.course, score.category)]
+                    if (score.course, score.category) in columns.categories
+                    else columns.categories[(score.course, POINTS_CATEGORY)]
+                )
+                column: int = assignment_count + len(new_category) - 1
+            rows.append(row)
+            columns_idx.append(column)
+            earned_values.append(np.nan if score.earned is None else score.earned)
+            possible_values.append(
+                columns.possible[column] if score.possible is None else score.possible
+            )
+
+    width: int = assignment_count + len(new_category)
+    category: np.ndarray = np.concatenate(
+        (columns.category, np.array(new_category, dtype=np.intp))
+    )
+    earned: np.ndarray = np.full((len(scenarios), width), np.nan)
+    earned[:, :assignment_count] = columns.earned
+    possible: np.ndarray = np.full((len(scenarios), width), np.nan)
+    possible[:, :assignment_count] = columns.possible
+    earned[rows, columns_idx] = earned_values
+    possible[rows, columns_idx] = possible_values
+    return course_grades(columns, category, earned, possible)
+
+
+def required_scores(
+    columns: AssignmentColumns,
+    course: str,
+    category: str,
+    possible: float,
+    targets: list[float],
+) -> np.ndarray:
+    """Return the points a new assignment (e.g. a final) in a course's category needs
+    for the course to get to each target grade (percent). A course grade is linear in
+    the points of one assignment, so it's worked out from the grades with none and
+    all of the points. NaN where no score makes a difference.
+    """
+
+    if course not in columns.courses:
+        raise KeyError(course)
+    grades: np.ndarray = scenario_grades(
+        columns,
+        [
+            [HypotheticalScore(course, 0.0, possible, category=category)],
+            [HypotheticalScore(course, possible, possible, category=category)],
+        ],
+    )[:, columns.courses.index(course)]
+    slope: np.ndarray = (grades[1] - grades[0]) / possible
+    with np.errstate(divide="ignore", invalid="ignore"):
+        required: np.ndarray = (np.array(targets, dtype=np.float64) - grades[0]) / slope
+    return np.where(np.isfinite(required), required, np.nan)
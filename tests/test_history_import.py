@@ -0,0 +1,106 @@
+"""
+History export and import tests for StudentVue Data Viewer
+Licensed under the Unlicense (P.D.)
+2026-10-16
+
+Run with `python3 -m unittest discover tests`.
+"""
+
+### Setup ###
+import sys
+import unittest
+from pathlib import Path
+from tempfile import mkdtemp
+
+# The tests import the modules in src/ the same way they import each other
+sys.path.insert(0, str(Path(__file__).parent.parent / "src"))
+
+# pylint:disable=wrong-import-position
+from config_parser import parse
+
+TEMPORARY_PATH: Path = Path(mkdtemp())
+(TEMPORARY_PATH / "config.jsonc").write_text(
+    '{"domain": "example.com", "master_key": "test", "port": 8000, '
+    f'"storage_path": "{(TEMPORARY_PATH / "versioning").as_posix()}"}}',
+    encoding="utf-8",
+)
+parse(TEMPORARY_PATH / "config.jsonc")
+
+from gradebook import Gradebook, GradebookInformation
+from history_export import export_ndjson
+from history_import import stage_gradebooks
+from tools import ImportGradesException
+from versioning import Versioning
+
+# A gradebook with values the serializer keeps as StudentVue sent them: a period
+# that isn't a number, and a weight without a percent
+GRADEBOOK_XML: str = """<Gradebook><Courses>
+<Course Period="A" Title="Intro to Sheep Shearing (1)" Room="101" Staff="S. White">
+<Marks><Mark CalculatedScoreString="95"><GradeCalculationSummary>
+<AssignmentGradeCalc Type="Homework*" Weight="20%"/>
+<AssignmentGradeCalc Type="Labs" Weight="N/A"/>
+</GradeCalculationSummary><Assignments>
+<Assignment Measure="Worksheet" Type="Homework*" DropStartDate="8/9/2022"
+    DropEndDate="8/10/2022" Score="10.50" Points="10.5 / 11.0000"/>
+<Assignment Measure="Quiz" Type="Labs" DropStartDate="8/9/2022"
+    DropEndDate="8/10/2022" Score="Not Graded" Points="10 Points Possible"/>
+</Assignments></Mark></Marks></Course>
+</Courses></Gradebook>"""
+
+
+def serialize(xml: str, last_updated: int) -> GradebookInformation:
+    """Serialize gradebook XML like a gradebook fetched from StudentVue"""
+
+    gradebook: Gradebook = Gradebook.__new__(Gradebook)
+    gradebook.unserialized_grades = xml
+    # pylint:disable-next=protected-access
+    serialized: GradebookInformation = gradebook._serialize()
+    serialized.last_updated = last_updated
+    return serialized
+
+
+### Tests ###
+class HistoryImportTest(unittest.TestCase):
+    """Exports are imported back as they were"""
+
+    def test_export_round_trip(self):
+        """A history exported from one user is imported into another as it was"""
+
+        original: GradebookInformation = serialize(GRADEBOOK_XML, 1000)
+        self.assertIsNone(original.courses[0].weights["Labs"])
+        exporter: Versioning = Versioning("exporter", "password", original)
+        exporter.save()
+        changed: GradebookInformation = serialize(
+            GRADEBOOK_XML.replace("10.5 / 11", "11 / 11"), 2000
+        )
+        exporter.serialized = changed
+        exporter.save()
+
+        exported: bytes = b"".join(export_ndjson(exporter, exporter.list_history()))
+        importer: Versioning = Versioning("importer", "password", None)
+        self.assertEqual(
+            importer.import_history(stage_gradebooks(exported.splitlines())), 2
+        )
+        self.assertEqual(importer.load(1000), original)
+        self.assertEqual(importer.load(2000), changed)
+
+    def test_invalid_line_imports_nothing(self):
+        """An invalid line anywhere in a file means nothing is imported"""
+
+        exporter: Versioning = Versioning(
+            "partial", "password", serialize(GRADEBOOK_XML, 1000)
+        )
+        exporter.save()
+        lines: list[bytes] = b"".join(
+            export_ndjson(exporter, exporter.list_history())
+        ).splitlines() + [b'{"last_updated": "yesterday"}']
+
+        importer: Versioning = Versioning("partial-importer", "password", None)
+        with self.assertRaises(ImportGradesException):
+            importer.import_history(stage_gradebooks(lines), batch_size=1)
+        self.assertEqual(importer.list_history(), [])
+
+
+### Run ###
+if __name__ == "__main__":
+    unittest.main()
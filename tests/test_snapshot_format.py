@@ -0,0 +1,196 @@
+"""
+Snapshot format tests for StudentVue Data Viewer
+Licensed under the Unlicense (P.D.)
+2026-10-16
+
+Run with `python3 -m unittest discover tests`.
+"""
+
+### Setup ###
+import sys
+import unittest
+from copy import deepcopy
+from json import dumps, loads
+from pathlib import Path
+from tempfile import mkdtemp
+
+# The tests import the modules in src/ the same way they import each other
+sys.path.insert(0, str(Path(__file__).parent.parent / "src"))
+
+# pylint:disable=wrong-import-position
+from config_parser import parse
+
+TEMPORARY_PATH: Path = Path(mkdtemp())
+(TEMPORARY_PATH / "config.jsonc").write_text(
+    '{"domain": "example.com", "master_key": "test", "port": 8000, '
+    f'"storage_path": "{(TEMPORARY_PATH / "versioning").as_posix()}"}}',
+    encoding="utf-8",
+)
+parse(TEMPORARY_PATH / "config.jsonc")
+
+from gradebook import GradebookInformation
+from snapshot_format import (
+    FLAG_WIDE_INDICES,
+    HEADER,
+    SCHEMA_VERSION,
+    decode,
+    encode,
+    upgrade,
+)
+from versioning import JSON_FORMAT, SNAPSHOT_CACHE, Versioning
+
+# A serialized gradebook of the current schema
+GRADEBOOK: dict = {
+    "last_updated": 1000,
+    "courses": [
+        {
+            "name": "Sheep Shearing",
+            "grade": 95,
+            "teacher": "S. White",
+            "period": 1,
+            "assignments": [
+                {
+                    "name": "Worksheet",
+                    "assigned_date": "8/9/2022",
+                    "due_date": "8/10/2022",
+                    "weight": "Homework",
+                    "grade": "10.5",
+                    "points": "10.5 / 11.0000",
+                    "earned": 10.5,
+                    "possible": 11.0,
+                },
+                {
+                    "name": "Quiz",
+                    "assigned_date": "8/9/2022",
+                    "due_date": "8/10/2022",
+                    "weight": "Labs",
+                    "grade": "UNKNOWN",
+                    "points": "10 Points Possible",
+                    "earned": None,
+                    "possible": 10.0,
+                },
+            ],
+            "room": "101",
+            "weights": {"Homework": 0.2, "Labs": None},
+        },
+        {
+            "name": "Wool Dyeing",
+            "grade": -100,
+            "teacher": "UNKNOWN",
+            "period": "A",
+            "assignments": [],
+            "room": "UNKNOWN",
+            "weights": {},
+        },
+    ],
+}
+# The first course of `GRADEBOOK` in schema version 1, which had no points earned or
+# possible, as it was stored
+VERSION_1_SNAPSHOT: bytes = (
+    b"SSVB\x01\x00zSheep Shearing\x00S. White\x00101\x00Homework\x00Labs\x00"
+    b"Worksheet\x008/9/2022\x008/10/2022\x0010.5\x0010.5 / 11.0000\x00Quiz\x00"
+    b"UNKNOWN\x0010 Points Possible\x01\xd0\x0f\x01\x00\x01\xbe\x01\x01\x01\x02\x02"
+    b"\x02\x03\x02\x9a\x99\x99\x99\x99\x99\xc9?\x04\x00\x02\x05\x00\x06\x00\x07\x00"
+    b"\x03\x00\x08\x00\t\x00\n\x00\x06\x00\x07\x00\x04\x00\x0b\x00\x0c\x00"
+)
+
+
+### Tests ###
+class SnapshotFormatTest(unittest.TestCase):
+    """Snapshots are decoded into the current schema as they were encoded"""
+
+    def test_round_trip(self):
+        """A gradebook is decoded as it was encoded, with points as floats"""
+
+        encoded: bytes = encode(GRADEBOOK)
+        self.assertEqual(HEADER.unpack_from(encoded)[1:], (SCHEMA_VERSION, 0))
+        decoded: dict = decode(encoded)
+        self.assertEqual(decoded, GRADEBOOK)
+        self.assertIsInstance(
+            decoded["courses"][0]["assignments"][1]["possible"], float
+        )
+
+    def test_wide_indices(self):
+        """A gradebook with more strings than 2 byte indices can hold is encoded
+        with 4 byte indices
+        """
+
+        gradebook: dict = deepcopy(GRADEBOOK)
+        template: dict = gradebook["courses"][0]["assignments"][0]
+        gradebook["courses"][0]["assignments"] = [
+            template | {"name": f"Worksheet {idx}"} for idx in range(0x10000)
+        ]
+        encoded: bytes = encode(gradebook)
+        self.assertTrue(HEADER.unpack_from(encoded)[2] & FLAG_WIDE_INDICES)
+        self.assertEqual(decode(encoded), gradebook)
+
+    def test_invalid_gradebook(self):
+        """A gradebook that doesn't fit the schema raises `TypeError`"""
+
+        gradebook: dict = deepcopy(GRADEBOOK)
+        gradebook["courses"][0]["name"] = "Sheep\0Shearing"
+        with self.assertRaises(TypeError):
+            encode(gradebook)
+
+    def test_version_1(self):
+        """A version 1 snapshot is upgraded with the points earned and possible"""
+
+        self.assertEqual(
+            decode(VERSION_1_SNAPSHOT),
+            GRADEBOOK | {"courses": GRADEBOOK["courses"][:1]},
+        )
+
+    def test_upgrade(self):
+        """Upgrading fills in what's missing, and keeps what was already upgraded"""
+
+        gradebook: dict = deepcopy(GRADEBOOK)
+        for assignment in gradebook["courses"][0]["assignments"]:
+            del assignment["earned"], assignment["possible"]
+        self.assertEqual(upgrade(gradebook, 0), GRADEBOOK)
+
+        upgraded: dict = deepcopy(GRADEBOOK)
+        upgraded["courses"][0]["assignments"][0]["earned"] = 1.0
+        self.assertEqual(upgrade(deepcopy(upgraded), 0), upgraded)
+        self.assertEqual(upgrade(deepcopy(upgraded), SCHEMA_VERSION), upgraded)
+
+
+class JSONFallbackTest(unittest.TestCase):
+    """Snapshots that can't be encoded are stored as JSON with their schema"""
+
+    def test_json_fallback(self):
+        """A gradebook with a NUL byte is stored as JSON, and loaded as it was"""
+
+        gradebook: dict = deepcopy(GRADEBOOK)
+        gradebook["courses"][0]["teacher"] = "S.\0White"
+        versioning: Versioning = Versioning(
+            "json-fallback", "password", GradebookInformation.from_dict(gradebook)
+        )
+        versioning.save()
+
+        # pylint:disable-next=protected-access
+        stored: dict = loads(versioning._read_snapshot_bytes(1000))
+        self.assertEqual(
+            (stored["format"], stored["schema"]), (JSON_FORMAT, SCHEMA_VERSION)
+        )
+        SNAPSHOT_CACHE.discard_matching(lambda _: True)
+        self.assertEqual(
+            Versioning("json-fallback", "password").load(1000),
+            GradebookInformation.from_dict(gradebook),
+        )
+
+    def test_untagged_json(self):
+        """JSON from before the binary snapshot format is upgraded from version 0"""
+
+        gradebook: dict = deepcopy(GRADEBOOK)
+        for assignment in gradebook["courses"][0]["assignments"]:
+            del assignment["earned"], assignment["possible"]
+        versioning: Versioning = Versioning("untagged-json", "password")
+        # pylint:disable-next=protected-access
+        versioning._write_snapshot_bytes(1000, bytes(dumps(gradebook), "utf-8"))
+        # pylint:disable-next=protected-access
+        self.assertEqual(versioning._read_stored_snapshot(1000), GRADEBOOK)
+
+
+### Run ###
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,319 @@
+"""
+Versioning storage tests for StudentVue Data Viewer
+Licensed under the Unlicense (P.D.)
+2026-10-16
+
+Run with `python3 -m unittest discover tests`.
+"""
+
+### Setup ###
+import sys
+import unittest
+from os import replace
+from pathlib import Path
+from shutil import copytree
+from tempfile import mkdtemp
+from threading import Event, Thread
+
+# The tests import the modules in src/ the same way they import each other
+sys.path.insert(0, str(Path(__file__).parent.parent / "src"))
+
+# pylint:disable=wrong-import-position
+from config_parser import parse
+
+TEMPORARY_PATH: Path = Path(mkdtemp())
+(TEMPORARY_PATH / "config.jsonc").write_text(
+    '{"domain": "example.com", "master_key": "test", "port": 8000, '
+    f'"storage_path": "{(TEMPORARY_PATH / "versioning").as_posix()}"}}',
+    encoding="utf-8",
+)
+parse(TEMPORARY_PATH / "config.jsonc")
+
+import storage
+from gradebook import Course, GradebookInformation
+from history_index import IndexRow
+from history_log import LogRecord, RecordKind
+from storage import (
+    REPLACED_SUFFIX,
+    STAGING_SUFFIX,
+    DirectoryStorageEngine,
+    DirectoryUserStorage,
+    SQLiteStorageEngine,
+    StorageEngine,
+    UserStorage,
+    copy_user,
+)
+from versioning import SNAPSHOT_CACHE, Versioning
+
+
+def gradebook(last_updated: int, grade: int = 90) -> GradebookInformation:
+    """Return a gradebook with one course"""
+
+    return GradebookInformation(
+        last_updated=last_updated,
+        courses=[Course("Sheep Shearing", grade, "S. White", 1, [], "101", {})],
+    )
+
+
+def save_history(username: str, password: str, count: int) -> Versioning:
+    """Save a history of gradebooks whose grade changes every time"""
+
+    versioning: Versioning = Versioning(username, password, None)
+    for idx in range(count):
+        versioning.serialized = gradebook(1000 + idx, 80 + idx)
+        versioning.save()
+    return versioning
+
+
+def check_index(user: UserStorage):
+    """Assert that a user's history index is current and points at its records"""
+
+    assert user.history_index.log_size() == user.history_log.size()
+    for row in user.history_index.rows():
+        assert user.history_log.read_at(row.offset).timestamp == row.timestamp
+
+
+### Tests ###
+class StorageTest(unittest.TestCase):
+    """Base of tests using a storage engine in their own directory"""
+
+    def setUp(self):
+        self.path: Path = Path(mkdtemp(dir=TEMPORARY_PATH))
+        self.previous_engine: StorageEngine | None = storage.STORAGE_ENGINE
+        storage.STORAGE_ENGINE = DirectoryStorageEngine(self.path / "versioning")
+
+    def tearDown(self):
+        storage.STORAGE_ENGINE = self.previous_engine
+
+
+class EngineTests:
+    """Tests every storage engine passes, mixed into a test case per engine"""
+
+    engine: StorageEngine
+
+    def make_engine(self, path: Path) -> StorageEngine:
+        """Return an engine keeping its data at a path"""
+
+        raise NotImplementedError()
+
+    def setUp(self):
+        self.engine = self.make_engine(Path(mkdtemp(dir=TEMPORARY_PATH)) / "storage")
+        self.user: UserStorage = self.engine.user("0123abcd")
+        self.user.create()
+
+    def test_blob_and_snapshot_round_trip(self):
+        """Blobs and snapshots are read back as written, until deleted"""
+
+        self.user.write_blob("HASH.txt", b"hash")
+        self.user.write_blob("HASH.txt", b"new hash")
+        self.user.write_snapshot(2000, b"second")
+        self.user.write_snapshot(1000, b"first")
+        self.assertEqual(self.user.read_blob("HASH.txt"), b"new hash")
+        self.assertEqual(self.user.blob_names(), ["HASH.txt"])
+        self.assertEqual(self.user.read_snapshot(1000), b"first")
+        self.assertEqual(self.user.snapshot_timestamps(), [1000, 2000])
+        self.assertEqual(self.engine.user_hashes(), ["0123abcd"])
+
+        self.user.delete_blob("HASH.txt")
+        self.user.delete_snapshot(1000)
+        self.assertFalse(self.user.blob_exists("HASH.txt"))
+        self.assertEqual(self.user.snapshot_timestamps(), [2000])
+        for read in (
+            lambda: self.user.read_blob("HASH.txt"),
+            lambda: self.user.read_snapshot(1000),
+            lambda: self.user.delete_snapshot(1000),
+        ):
+            with self.assertRaises(FileNotFoundError):
+                read()
+
+        self.user.remove()
+        self.assertEqual(self.engine.user_hashes(), [])
+
+    def test_history_round_trip(self):
+        """History records and index rows are read back as written"""
+
+        log_size: int = self.user.history_log.append(
+            [
+                LogRecord(RecordKind.PUT, 1000, b"first"),
+                LogRecord(RecordKind.PUT, 2000, b"second"),
+                LogRecord(RecordKind.DELETE, 1000),
+            ]
+        )
+        records: list[LogRecord] = list(self.user.history_log.read())
+        self.assertEqual(
+            [(record.kind, record.timestamp, record.payload) for record in records],
+            [
+                (RecordKind.PUT, 1000, b"first"),
+                (RecordKind.PUT, 2000, b"second"),
+                (RecordKind.DELETE, 1000, b""),
+            ],
+        )
+        self.assertEqual(self.user.history_log.size(), log_size)
+        self.assertEqual(
+            self.user.history_log.read_at(records[1].offset).payload, b"second"
+        )
+        self.assertEqual(
+            [record.timestamp for record in self.user.history_log.read_reverse()],
+            [1000, 2000, 1000],
+        )
+
+        self.user.history_index.rewrite(
+            [IndexRow(2000, records[1].offset, None, b"courses!")], log_size
+        )
+        check_index(self.user)
+        rows, has_more = self.user.history_index.page(None, 1)
+        self.assertEqual((rows[0].timestamp, has_more), (2000, False))
+
+    def test_failed_replacement_keeps_original(self):
+        """A replacement that raises leaves the user's storage as it was"""
+
+        self.user.write_blob("HASH.txt", b"hash")
+        self.user.history_log.append([LogRecord(RecordKind.PUT, 1000, b"first")])
+        with self.assertRaises(RuntimeError):
+            with self.user.replacement() as staging:
+                staging.write_blob("HASH.txt", b"staged hash")
+                raise RuntimeError()
+
+        self.assertEqual(self.user.read_blob("HASH.txt"), b"hash")
+        self.assertEqual(len(list(self.user.history_log.read())), 1)
+        self.assertEqual(self.engine.user_hashes(), ["0123abcd"])
+        staging: UserStorage = self.engine.user("0123abcd" + STAGING_SUFFIX)
+        self.assertFalse(staging.blob_exists("HASH.txt"))
+
+    def test_replacement(self):
+        """A replacement that finishes leaves only what was staged"""
+
+        self.user.write_blob("HASH.txt", b"hash")
+        self.user.write_snapshot(1000, b"first")
+        with self.user.replacement() as staging:
+            staging.write_blob("HASH.txt", b"staged hash")
+
+        self.assertEqual(self.user.read_blob("HASH.txt"), b"staged hash")
+        self.assertEqual(self.user.snapshot_timestamps(), [])
+        self.assertEqual(self.engine.user_hashes(), ["0123abcd"])
+
+
+class DirectoryEngineTest(EngineTests, unittest.TestCase):
+    """The directory storage engine"""
+
+    def make_engine(self, path: Path) -> StorageEngine:
+        return DirectoryStorageEngine(path)
+
+
+class SQLiteEngineTest(EngineTests, unittest.TestCase):
+    """The SQLite storage engine"""
+
+    def make_engine(self, path: Path) -> StorageEngine:
+        return SQLiteStorageEngine(path)
+
+    def test_transaction_rollback(self):
+        """Nothing written in a transaction that raises is kept, even in a nested
+        transaction
+        """
+
+        self.user.write_blob("HASH.txt", b"hash")
+        with self.assertRaises(RuntimeError):
+            with self.user.transaction():
+                self.user.write_blob("HASH.txt", b"new hash")
+                with self.user.transaction():
+                    self.user.write_snapshot(1000, b"first")
+                    self.user.history_log.append(
+                        [LogRecord(RecordKind.PUT, 1000, b"first")]
+                    )
+                raise RuntimeError()
+
+        self.assertEqual(self.user.read_blob("HASH.txt"), b"hash")
+        self.assertEqual(self.user.snapshot_timestamps(), [])
+        self.assertFalse(self.user.history_log.exists())
+
+
+class CopyUserTest(StorageTest):
+    """Users are copied between engines with their history index still valid"""
+
+    def test_copy_between_engines(self):
+        """A history copied from a directory to SQLite and back reads the same"""
+
+        directory: StorageEngine = storage.STORAGE_ENGINE
+        original: Versioning = save_history("copied", "password", 4)
+        original.remove_gradebook_entry(1001)  # So the log has a tombstone
+        history: list = original.list_history()
+        sqlite: SQLiteStorageEngine = SQLiteStorageEngine(self.path / "copy.sqlite3")
+        copied_back: DirectoryStorageEngine = DirectoryStorageEngine(self.path / "back")
+
+        for source, destination in ((directory, sqlite), (sqlite, copied_back)):
+            copy_user(
+                source.user(original.storage.user_hash),
+                destination.user(original.storage.user_hash),
+            )
+            check_index(destination.user(original.storage.user_hash))
+
+            storage.STORAGE_ENGINE = destination
+            SNAPSHOT_CACHE.discard_matching(lambda _: True)
+            copy: Versioning = Versioning("copied", "password")
+            self.assertEqual(copy.list_history(), history)
+            self.assertEqual(copy.load(1003), gradebook(1003, 83))
+
+
+class ReplacementTest(StorageTest):
+    """A user's storage is never lost while it's replaced"""
+
+    def test_open_during_replacement(self):
+        """Opening a user's history while a migration replaces it waits for it"""
+
+        save_history("swapping", "old", 3)
+        migrating: Event = Event()
+        resume: Event = Event()
+        opened: list[Versioning] = []
+
+        def _progress(done: int, total: int):
+            if done == total:  # Everything is staged, the swap comes next
+                migrating.set()
+                resume.wait(5)
+
+        migration: Thread = Thread(
+            target=Versioning("swapping", "old").migrate,
+            args=("old", "new"),
+            kwargs={"progress": _progress},
+        )
+        migration.start()
+        self.assertTrue(migrating.wait(5))
+        opener: Thread = Thread(
+            target=lambda: opened.append(Versioning("swapping", "new"))
+        )
+        opener.start()
+        opener.join(0.2)
+        self.assertTrue(opener.is_alive())  # Waiting for the migration
+        resume.set()
+        migration.join(5)
+        opener.join(5)
+
+        self.assertEqual(len(opened[0].list_history()), 3)
+        self.assertEqual(opened[0].load(1002), gradebook(1002, 82))
+        self.assertEqual(
+            sorted(path.name for path in (self.path / "versioning").iterdir()),
+            [opened[0].storage.user_hash],
+        )
+
+    def test_interrupted_swap_is_finished(self):
+        """A swap interrupted between its renames is finished, even if the user
+        directory was made again in between
+        """
+
+        user: DirectoryUserStorage = save_history("interrupted", "old", 3).storage
+        staging_path: Path = user.path.with_name(user.path.name + STAGING_SUFFIX)
+        copytree(user.path, staging_path)
+        replace(user.path, user.path.with_name(user.path.name + REPLACED_SUFFIX))
+        user.path.mkdir()  # As `create` did before the swap was done
+
+        versioning: Versioning = Versioning("interrupted", "old")
+        self.assertEqual(len(versioning.list_history()), 3)
+        self.assertEqual(versioning.load(1001), gradebook(1001, 81))
+        self.assertEqual(
+            [path.name for path in (self.path / "versioning").iterdir()],
+            [user.user_hash],
+        )
+
+
+### Run ###
+if __name__ == "__main__":
+    unittest.main()